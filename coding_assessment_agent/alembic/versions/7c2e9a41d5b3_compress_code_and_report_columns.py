@@ -0,0 +1,58 @@
+"""Store code snapshots and report text as (optionally compressed) bytes
+
+Revision ID: 7c2e9a41d5b3
+Revises: 44da429d7601
+Create Date: 2025-05-02 10:12:40.118204
+
+Existing rows are converted in place to raw UTF-8 bytes, which CompressedText
+reads as-is. Compress them afterwards, in batches, with:
+    python -m app.cli compress-columns
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db_types import decompress_bytes, is_compressed
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e9a41d5b3'
+down_revision: Union[str, None] = '44da429d7601'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [("code_snapshots", "code_content"), ("reports", "report_content")]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.LargeBinary(),
+            existing_type=sa.Text(),
+            postgresql_using=f"convert_to({column}, 'UTF8')",
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for table, column in COLUMNS:
+        # Compressed values can only be decoded in Python; rewrite them as raw UTF-8 first
+        rows = bind.execute(sa.text(f"SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL"))
+        for row_id, value in rows.fetchall():
+            value = bytes(value)
+            if is_compressed(value):
+                bind.execute(
+                    sa.text(f"UPDATE {table} SET {column} = :value WHERE id = :id"),
+                    {"value": decompress_bytes(value), "id": row_id},
+                )
+        op.alter_column(
+            table, column,
+            type_=sa.Text(),
+            existing_type=sa.LargeBinary(),
+            postgresql_using=f"convert_from({column}, 'UTF8')",
+        )
@@ -0,0 +1,70 @@
+"""Normalize problem statements into a problems table
+
+Revision ID: a3f6c1e8d402
+Revises: e5b8d2c4a9f1
+Create Date: 2025-05-08 14:03:27.664810
+
+Each distinct sessions.problem_statement becomes one problems row keyed by
+its sha256 content hash; sessions reference it through problem_id.
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f6c1e8d402'
+down_revision: Union[str, None] = 'e5b8d2c4a9f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('problems',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('statement', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_problems_id'), 'problems', ['id'], unique=False)
+    op.create_index(op.f('ix_problems_content_hash'), 'problems', ['content_hash'], unique=True)
+    op.add_column('sessions', sa.Column('problem_id', sa.Integer(), nullable=True))
+
+    # Deduplicate existing statements; same hash as app.services.problem_service.problem_hash
+    bind = op.get_bind()
+    statements = bind.execute(sa.text("SELECT DISTINCT problem_statement FROM sessions")).scalars().all()
+    for statement in statements:
+        problem_id = bind.execute(
+            sa.text("INSERT INTO problems (content_hash, statement) VALUES (:content_hash, :statement) RETURNING id"),
+            {"content_hash": hashlib.sha256(statement.encode("utf-8")).hexdigest(), "statement": statement},
+        ).scalar_one()
+        bind.execute(
+            sa.text("UPDATE sessions SET problem_id = :problem_id WHERE problem_statement = :statement"),
+            {"problem_id": problem_id, "statement": statement},
+        )
+
+    op.alter_column('sessions', 'problem_id', existing_type=sa.Integer(), nullable=False)
+    op.create_index(op.f('ix_sessions_problem_id'), 'sessions', ['problem_id'], unique=False)
+    op.create_foreign_key('sessions_problem_id_fkey', 'sessions', 'problems', ['problem_id'], ['id'])
+    op.drop_column('sessions', 'problem_statement')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('sessions', sa.Column('problem_statement', sa.TEXT(), autoincrement=False, nullable=True))
+    op.execute(
+        "UPDATE sessions SET problem_statement = problems.statement "
+        "FROM problems WHERE problems.id = sessions.problem_id"
+    )
+    op.alter_column('sessions', 'problem_statement', existing_type=sa.TEXT(), nullable=False)
+    op.drop_constraint('sessions_problem_id_fkey', 'sessions', type_='foreignkey')
+    op.drop_index(op.f('ix_sessions_problem_id'), table_name='sessions')
+    op.drop_column('sessions', 'problem_id')
+    op.drop_index(op.f('ix_problems_content_hash'), table_name='problems')
+    op.drop_index(op.f('ix_problems_id'), table_name='problems')
+    op.drop_table('problems')
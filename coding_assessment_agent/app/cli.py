@@ -0,0 +1,83 @@
+"""Command-line entry points for maintenance and data jobs.
+
+Usage (from coding_assessment_agent/):
+    python -m app.cli export --start 2025-04-01 --end 2025-05-01 --gzip -o april.ndjson.gz
+    python -m app.cli compress-columns --batch-size 500
+    python -m app.cli archive --retention-days 30
+    python -m app.cli restore 42
+"""
+import argparse
+import asyncio
+import datetime
+import sys
+from app.database import AsyncSessionFactory
+from app.services import export_service, compression_service, archive_service
+
+
+async def _export(args: argparse.Namespace) -> None:
+    output = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        async for chunk in export_service.iter_ndjson(
+            gzip=args.gzip,
+            start=args.start,
+            end=args.end,
+            problem=args.problem,
+            include_code=not args.no_code,
+            include_report_text=not args.no_report_text,
+        ):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+async def _compress_columns(args: argparse.Namespace) -> None:
+    rewritten = await compression_service.compress_existing_rows(batch_size=args.batch_size)
+    for table, count in rewritten.items():
+        print(f"{table}: {count} rows compressed")
+
+
+async def _archive(args: argparse.Namespace) -> None:
+    archived = await archive_service.archive_ended_sessions(retention_days=args.retention_days, limit=args.limit)
+    print(f"Archived {archived} sessions")
+
+
+async def _restore(args: argparse.Namespace) -> None:
+    async with AsyncSessionFactory() as db:
+        restored = await archive_service.restore_session(db, args.session_id)
+    print(f"Restored {restored} snapshots for session {args.session_id}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export sessions as NDJSON")
+    export_parser.add_argument("--start", type=datetime.datetime.fromisoformat, help="Sessions started at or after (ISO 8601)")
+    export_parser.add_argument("--end", type=datetime.datetime.fromisoformat, help="Sessions started before (ISO 8601)")
+    export_parser.add_argument("--problem", help="Only sessions whose problem statement contains this text")
+    export_parser.add_argument("--no-code", action="store_true", help="Omit code snapshot bodies")
+    export_parser.add_argument("--no-report-text", action="store_true", help="Omit report text")
+    export_parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+    export_parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    export_parser.set_defaults(handler=_export)
+
+    compress_parser = subparsers.add_parser("compress-columns", help="Compress existing code snapshot and report rows")
+    compress_parser.add_argument("--batch-size", type=int, default=500)
+    compress_parser.set_defaults(handler=_compress_columns)
+
+    archive_parser = subparsers.add_parser("archive", help="Compact snapshot history of ended sessions into archives")
+    archive_parser.add_argument("--retention-days", type=int, default=None, help="Defaults to ARCHIVE_RETENTION_DAYS")
+    archive_parser.add_argument("--limit", type=int, default=None, help="Max sessions to archive in this run")
+    archive_parser.set_defaults(handler=_archive)
+
+    restore_parser = subparsers.add_parser("restore", help="Move an archived session back into the hot tables")
+    restore_parser.add_argument("session_id", type=int)
+    restore_parser.set_defaults(handler=_restore)
+
+    args = parser.parse_args(argv)
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
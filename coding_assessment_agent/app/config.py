@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, Optional
 import os
 from dotenv import load_dotenv
 
@@ -9,6 +10,112 @@ class Settings(BaseSettings):
    redis_url: str
    openai_api_key: str
    chroma_persist_directory: str = "./chroma_db_store"
+
+   # Optional read replica for read-only endpoints
+   database_replica_url: Optional[str] = None
+   replica_pin_seconds: int = 10 # After a write, reads for that session stay on the primary this long
+
+   # Transparent compression of large text columns (code snapshots, reports)
+   compression_algorithm: str = "zstd" # "zstd" (falls back to zlib if zstandard is missing) or "zlib"
+   compression_level: int = 3
+   compression_threshold_bytes: int = 256 # Values smaller than this are stored uncompressed
+
+   # Cold-storage archival of ended sessions
+   archive_retention_days: int = 30 # Ended sessions older than this are compacted
+
+   # Background embedding of snapshots and answered questions into the vector store
+   embedding_indexer_enabled: bool = True
+   embedding_queue_max_size: int = 1000 # Items beyond this are dropped instead of blocking the WebSocket path
+   embedding_batch_size: int = 64 # Max items embedded per vector store call
+   embedding_flush_interval_seconds: float = 2.0 # Max wait to fill a batch
+   embedding_chunk_max_lines: int = 60
+   context_retrieval_enabled: bool = False # Add similar earlier Q&A from the vector store to question/evaluation prompts
+
+   # Vector store backend: "chroma" (LangChain Chroma) or "numpy" (in-process memmapped index, per-problem partitions)
+   vector_backend: str = "chroma"
+   vector_index_directory: str = "./vector_index" # Used by the numpy backend
+   vector_io_workers: int = 4 # Dedicated thread pool for blocking vector store calls
+   vector_io_queue_limit: int = 64 # Queued + running vector operations before new ones are rejected
+   vector_search_batch_window_ms: float = 5.0 # Concurrent similarity searches within this window share one backend call
+   vector_search_max_batch: int = 32
+
+   # Content-addressed embedding cache (keyed by sha256 of model name + chunk text)
+   embedding_cache_enabled: bool = True
+   embedding_cache_path: str = "./embedding_cache.sqlite3" # Local on-disk tier
+   embedding_cache_redis_enabled: bool = False # Shared tier in REDIS_URL, checked after the disk
+   embedding_cache_redis_ttl_seconds: int = 30 * 86400
+
+   # Question triggers and load-adaptive admission control
+   trigger_min_interval_seconds: float = 60.0 # Base time between questions (time-based trigger)
+   trigger_min_changed_statements: int = 2 # Base changed statements for the diff-based trigger
+   trigger_max_interval_seconds: float = 300.0 # Sessions waiting this long get base thresholds regardless of load
+   trigger_max_load_scale: float = 5.0 # Upper bound on how far load stretches the thresholds
+   llm_target_in_flight: int = 8 # In-flight LLM calls considered full load
+   llm_target_latency_seconds: float = 5.0 # Average LLM latency considered full load
+   llm_latency_ewma_alpha: float = 0.2
+   llm_latency_half_life_seconds: float = 30.0 # The average halves over this long without a finished call; 0 disables decay
+   llm_max_in_flight: int = 32 # Above this, non-starved triggers are shed
+
+   # Batched evaluation: responses on the same problem arriving within the window share one LLM call
+   evaluation_batch_window_ms: float = 150.0 # 0 evaluates every response with its own call
+   evaluation_batch_max_size: int = 8
+   evaluation_batch_across_sessions: bool = False # True also batches responses of different sessions on the same problem
+   evaluation_max_in_flight: int = 8 # Concurrent evaluation calls; beyond this, waiting responses are batched together
+   speculative_questions_enabled: bool = False # Trades extra LLM calls for question latency; watch codeeval_speculative_waste_ratio
+   speculative_interval_ratio: float = 0.8 # Speculate on changes made after this share of the trigger interval (also one statement short of the threshold)
+   speculative_max_divergence_statements: int = 1 # Statements beyond TRIGGER_MIN_CHANGED_STATEMENTS the code may move after speculation and still be served
+   speculative_ttl_seconds: float = 300.0 # Unserved speculations older than this are discarded
+   speculative_max_load: float = 0.75 # No speculation at or above this LLM load factor
+
+   # Opening questions pregenerated per problem at session creation
+   question_pool_enabled: bool = True
+   question_pool_size: int = 5
+   question_pool_ttl_seconds: int = 7 * 86400
+   question_pool_starter_max_lines: int = 10 # First question is served from the pool while the code has at most this many non-comment lines
+
+   # Outbound WebSocket delivery (per-connection queue drained by a writer task)
+   ws_send_queue_size: int = 32 # Queued messages per connection before dropping/closing
+   ws_send_timeout_seconds: float = 10.0 # A send taking longer counts as a failure
+   ws_max_send_failures: int = 3 # Consecutive failed sends before the connection is closed
+   ws_slow_send_seconds: float = 1.0 # Sends slower than this are logged and counted as slow
+   ws_binary_protocol_enabled: bool = True # Accept the codeeval.msgpack.v1 subprotocol when a client offers it
+   ws_compression_threshold_bytes: int = 1024 # Binary frames at least this large are zstd-compressed
+   ws_compression_level: int = 3
+   ws_max_message_bytes: int = 4 * 1024 * 1024 # Upper bound on a decompressed inbound binary frame
+   ws_journal_enabled: bool = True # Journal question/evaluation_result/report_ready frames in Redis for reconnect replay
+   ws_journal_ttl_seconds: int = 3600 # Journal expiry after the session's last journaled frame
+   ws_journal_max_len: int = 200 # Approximate cap on journaled frames per session
+   idempotency_window_seconds: int = 600 # How long a client_message_id is remembered for deduplication
+   ws_heartbeat_interval_seconds: float = 20.0 # Server ping interval; also how often idle connections are reaped
+   ws_idle_timeout_seconds: float = 60.0 # Connections with no inbound frame (pong included) for this long are closed
+   ws_inbound_queue_size: int = 16 # Received messages waiting for the connection's worker; beyond this they are rejected
+
+   # HTTP caching of immutable responses (reports, ended sessions)
+   response_cache_ttl_seconds: int = 86400 # Redis TTL of rendered responses
+   report_cache_max_age_seconds: int = 86400 # Cache-Control max-age for reports
+
+   # Database connection pool
+   db_pool_size: int = 10
+   db_max_overflow: int = 10
+   db_pool_timeout: float = 30.0 # Seconds to wait for a free connection
+   db_pool_recycle: int = 1800 # Seconds before a pooled connection is recycled
+
+   # Logging
+   log_level: str = "INFO"
+   log_levels: Dict[str, str] = {} # Per-logger overrides, e.g. {"app.services.trigger_logic": "DEBUG"}
+   log_format: str = "text" # "text" or "json"
+   log_payload_max_chars: int = 200 # Truncation limit for payloads in log lines
+   log_message_rate_per_second: float = 20.0 # Per-message log budget (token bucket, per logger)
+   log_message_sample_ratio: float = 1.0 # Fraction of per-message log lines kept
+   sql_echo: bool = False
+
+   # Tracing (OpenTelemetry)
+   tracing_enabled: bool = False
+   tracing_sample_ratio: float = 0.1 # Fraction of inbound messages traced (parent-based)
+   tracing_exporter: str = "file" # "file" or "otlp"
+   tracing_file_path: str = "./traces.jsonl"
+   tracing_otlp_endpoint: str = "http://localhost:4317"
+   tracing_service_name: str = "coding-assessment-agent"
    # Add other settings as needed
 
    class Config:
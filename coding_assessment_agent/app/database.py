@@ -1,17 +1,49 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 import redis.asyncio as redis
+import chromadb
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import Chroma
 from langchain_community.chat_message_histories import RedisChatMessageHistory
 from app.config import settings
+from app.embedding_cache import CachedEmbeddings, DiskEmbeddingStore, RedisEmbeddingStore
+from typing import Dict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 # SQLAlchemy Async Engine
-async_engine = create_async_engine(settings.database_url, echo=True) # echo=True for debugging
+# The pool is bounded by settings: WebSocket handlers borrow connections per unit of work,
+# so pool usage tracks in-flight messages rather than open sockets.
+async_engine = create_async_engine(
+   settings.database_url,
+   echo=settings.sql_echo, # SQL_ECHO=true for debugging
+   pool_size=settings.db_pool_size,
+   max_overflow=settings.db_max_overflow,
+   pool_timeout=settings.db_pool_timeout,
+   pool_recycle=settings.db_pool_recycle,
+   pool_pre_ping=True,
+)
 AsyncSessionFactory = sessionmaker(
    bind=async_engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Optional read replica. Read-only endpoints route here unless the session
+# was written recently (see pin_to_primary / get_read_db).
+replica_engine = create_async_engine(
+   settings.database_replica_url,
+   echo=settings.sql_echo,
+   pool_size=settings.db_pool_size,
+   max_overflow=settings.db_max_overflow,
+   pool_timeout=settings.db_pool_timeout,
+   pool_recycle=settings.db_pool_recycle,
+   pool_pre_ping=True,
+) if settings.database_replica_url else None
+ReplicaSessionFactory = sessionmaker(
+   bind=replica_engine, class_=AsyncSession, expire_on_commit=False
+) if replica_engine is not None else None
+
 # Base for SQLAlchemy models (will be imported in models.py)
 Base = declarative_base()
 
@@ -28,8 +60,21 @@ def get_redis_chat_history(session_id: str) -> RedisChatMessageHistory:
 
 # ChromaDB Client & Langchain Vector Store
 embeddings = OpenAIEmbeddings(openai_api_key=settings.openai_api_key)
+if settings.embedding_cache_enabled:
+   # Candidates on the same problem share most chunks; identical text is embedded once
+   embeddings = CachedEmbeddings(
+       embeddings,
+       model=embeddings.model,
+       disk=DiskEmbeddingStore(settings.embedding_cache_path),
+       redis_store=RedisEmbeddingStore(settings.redis_url, settings.embedding_cache_redis_ttl_seconds) if settings.embedding_cache_redis_enabled else None,
+   )
+# The Chroma client is created here rather than by LangChain, so multi-query searches can use
+# its public collection API (LangChain's Chroma only queries one embedding per call)
+CHROMA_COLLECTION = "langchain" # LangChain's default name, kept so existing stores load
+chroma_client = chromadb.PersistentClient(path=settings.chroma_persist_directory)
 vector_store = Chroma(
-   persist_directory=settings.chroma_persist_directory,
+   client=chroma_client,
+   collection_name=CHROMA_COLLECTION,
    embedding_function=embeddings
 )
 
@@ -41,10 +86,66 @@ async def get_redis():
    # Ensure the connection is established from the pool
    return redis.Redis(connection_pool=redis_pool)
 
+# --- Read/write routing ---
+def _primary_pin_key(session_id: int) -> str:
+   return f"primary_pin:{session_id}"
+
+# Session -> monotonic time until which the pin this process last set still covers a new write.
+# Pins are set for REPLICA_PIN_SECONDS plus this window, so writes within it skip the SET.
+_pinned_until: Dict[int, float] = {}
+_PINNED_UNTIL_PRUNE_SIZE = 1024
+
+async def pin_to_primary(session_id: int):
+   """Marks a session as recently written so its reads stay on the primary (read-your-writes).
+
+   A code update writes several rows; only the first write in each half
+   REPLICA_PIN_SECONDS window goes to Redis.
+   """
+   if ReplicaSessionFactory is None:
+       return
+   now = time.monotonic()
+   if _pinned_until.get(session_id, 0.0) > now:
+       return # Still pinned for at least REPLICA_PIN_SECONDS from now
+   window = settings.replica_pin_seconds / 2
+   try:
+       redis_client = await get_redis()
+       await redis_client.set(_primary_pin_key(session_id), 1, px=int((settings.replica_pin_seconds + window) * 1000))
+   except Exception as e:
+       logger.warning("Failed to pin session %s to primary: %s", session_id, e)
+       return
+   if len(_pinned_until) >= _PINNED_UNTIL_PRUNE_SIZE:
+       for expired in [s for s, until in _pinned_until.items() if until <= now]:
+           del _pinned_until[expired]
+   _pinned_until[session_id] = now + window
+
+async def get_read_session_factory(session_id: int) -> sessionmaker:
+   """Returns the replica session factory unless no replica is configured or the session is pinned."""
+   if ReplicaSessionFactory is None:
+       return AsyncSessionFactory
+   try:
+       redis_client = await get_redis()
+       if await redis_client.exists(_primary_pin_key(session_id)):
+           return AsyncSessionFactory
+   except Exception as e:
+       # Without pin information the primary is the only safe choice
+       logger.warning("Failed to read primary pin for session %s: %s", session_id, e)
+       return AsyncSessionFactory
+   return ReplicaSessionFactory
+
+async def get_read_db(session_id: int) -> AsyncSession:
+   """Dependency for read-only endpoints keyed by a session_id path parameter."""
+   session_factory = await get_read_session_factory(session_id)
+   async with session_factory() as session:
+       yield session
+
 def get_vector_store():
    # Chroma client might need initialization checks in a real app
    return vector_store
 
+def get_chroma_collection():
+   # Queried with precomputed embeddings only, so no embedding function is attached
+   return chroma_client.get_collection(CHROMA_COLLECTION, embedding_function=None)
+
 # --- Function to get LLM instance ---
 def get_llm():
     return llm
@@ -0,0 +1,76 @@
+import zlib
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from app.config import settings
+
+try:
+    import zstandard
+except ImportError: # Optional dependency; zlib is always available
+    zstandard = None
+
+# Stored values are raw UTF-8 unless they start with one of these headers. Text that
+# came from a former TEXT column can never start with NUL (PostgreSQL rejects NUL in
+# text), so legacy rows converted with convert_to() are unambiguous.
+ZLIB_HEADER = b"\x00z1"
+ZSTD_HEADER = b"\x00zs"
+
+
+def _resolve_algorithm(algorithm: str) -> str:
+    if algorithm == "zstd" and zstandard is None:
+        return "zlib"
+    return algorithm
+
+
+def compress_bytes(data: bytes, algorithm: str | None = None, level: int | None = None) -> bytes:
+    """Compresses bytes and prefixes the algorithm header."""
+    algorithm = _resolve_algorithm(algorithm or settings.compression_algorithm)
+    level = level if level is not None else settings.compression_level
+    if algorithm == "zstd":
+        return ZSTD_HEADER + zstandard.ZstdCompressor(level=level).compress(data)
+    return ZLIB_HEADER + zlib.compress(data, min(level, 9))
+
+
+def decompress_bytes(data: bytes) -> bytes:
+    """Reverses compress_bytes; values without a known header are returned unchanged."""
+    if data.startswith(ZSTD_HEADER):
+        if zstandard is None:
+            raise RuntimeError("Value is zstd-compressed but the 'zstandard' package is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data[len(ZSTD_HEADER):])
+    if data.startswith(ZLIB_HEADER):
+        return zlib.decompress(data[len(ZLIB_HEADER):])
+    return data
+
+
+def is_compressed(data: bytes) -> bool:
+    return data.startswith(ZSTD_HEADER) or data.startswith(ZLIB_HEADER)
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored as bytes, compressed once it exceeds a size threshold.
+
+    Short values are stored as plain UTF-8 to avoid paying compression overhead
+    on tiny snapshots. Reads transparently accept both forms.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, threshold: int | None = None, algorithm: str | None = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.algorithm = algorithm
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        data = value.encode("utf-8")
+        threshold = self.threshold if self.threshold is not None else settings.compression_threshold_bytes
+        if len(data) < threshold:
+            return data
+        return compress_bytes(data, self.algorithm)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str): # Column not migrated yet
+            return value
+        return decompress_bytes(bytes(value)).decode("utf-8")
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List, Optional
+import redis
+from langchain_core.embeddings import Embeddings
+from app.metrics import record_cache, track_stage
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "embedding_cache:"
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Content address of an embedding: identical text under the same model shares one entry."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(data: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class DiskEmbeddingStore:
+    """Local embedding store in a single SQLite file (key -> float32 vector)."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Embedding calls run in worker threads; one connection guarded by a lock is enough
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for offset in range(0, len(keys), 500):
+                part = keys[offset:offset + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part)
+                found.update(rows)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]):
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", items.items())
+
+
+class RedisEmbeddingStore:
+    """Shared embedding tier so replicas reuse each other's embeddings."""
+
+    def __init__(self, url: str, ttl_seconds: int):
+        # Binary values: this client must not decode responses (unlike the app-wide pool)
+        self._client = redis.Redis.from_url(url)
+        self._ttl_seconds = ttl_seconds
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        values = self._client.mget([REDIS_KEY_PREFIX + key for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, items: Dict[str, bytes]):
+        pipe = self._client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(REDIS_KEY_PREFIX + key, value, ex=self._ttl_seconds)
+        pipe.execute()
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed cache around an Embeddings implementation.
+
+    Lookups go disk -> Redis (optional) -> underlying model; only misses are sent
+    to the model, in one call. Hits from Redis are copied to disk. A failing cache
+    tier is logged and skipped, never fatal.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, disk: Optional[DiskEmbeddingStore], redis_store: Optional[RedisEmbeddingStore] = None):
+        self.underlying = underlying
+        self.model = model
+        self.disk = disk
+        self.redis_store = redis_store
+
+    def _lookup(self, tier_name: str, tier, keys: List[str]) -> Dict[str, bytes]:
+        if tier is None or not keys:
+            return {}
+        try:
+            found = tier.get_many(keys)
+        except Exception as e:
+            logger.warning("Embedding cache tier %s lookup failed: %s", tier_name, e)
+            return {}
+        for key in keys:
+            record_cache(tier_name, key in found)
+        return found
+
+    def _store(self, tier_name: str, tier, items: Dict[str, bytes]):
+        if tier is None or not items:
+            return
+        try:
+            tier.set_many(items)
+        except Exception as e:
+            logger.warning("Embedding cache tier %s write failed: %s", tier_name, e)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model, text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        with track_stage("embedding_cache_lookup"):
+            cached = self._lookup("embedding_disk", self.disk, unique_keys)
+            from_redis = self._lookup("embedding_redis", self.redis_store, [k for k in unique_keys if k not in cached])
+        cached.update(from_redis)
+        self._store("embedding_disk", self.disk, from_redis)
+
+        # Embed each distinct missing text once, in a single underlying call
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = {key: _pack(vector) for key, vector in zip(missing, vectors)}
+            self._store("embedding_disk", self.disk, computed)
+            self._store("embedding_redis", self.redis_store, computed)
+            cached.update(computed)
+        logger.debug("Embedded %d texts: %d cached, %d computed", len(texts), len(unique_keys) - len(missing), len(missing))
+        return [_unpack(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,134 @@
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any
+from app.config import settings
+from app.tracing import get_correlation_id
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s [%(correlation_id)s]: %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamps every record with the correlation id of the message being processed."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = get_correlation_id() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, LOG_DATEFMT),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", None),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging() -> None:
+    """Configures root logging from settings: global level, per-logger overrides and output format."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(CorrelationIdFilter())
+    if settings.log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(settings.log_level.upper())
+    for logger_name, level in settings.log_levels.items():
+        logging.getLogger(logger_name).setLevel(level.upper())
+
+
+class PayloadSummary:
+    """Lazy, truncated view of a message payload for log lines.
+
+    Nothing is formatted unless the record is actually emitted; long string
+    fields (code buffers, responses) are reduced to their length and a prefix.
+    """
+
+    __slots__ = ("payload", "max_chars")
+
+    def __init__(self, payload: Any, max_chars: int | None = None):
+        self.payload = payload
+        self.max_chars = max_chars if max_chars is not None else settings.log_payload_max_chars
+
+    def _summarize(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.max_chars:
+            return f"{value[:self.max_chars]}...<{len(value)} chars>"
+        if isinstance(value, dict):
+            return {k: self._summarize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)) and len(value) > 10:
+            return f"<{type(value).__name__} of {len(value)} items>"
+        return value
+
+    def __str__(self) -> str:
+        return str(self._summarize(self.payload))
+
+
+def summarize_payload(payload: Any, max_chars: int | None = None) -> PayloadSummary:
+    return PayloadSummary(payload, max_chars)
+
+
+class SampledLogger:
+    """Wraps a logger for per-message log lines with sampling and a rate limit.
+
+    Lines are kept with probability `sample_ratio` and then pass through a
+    token bucket of `rate_per_second`. Suppressed lines are counted and the
+    count is reported on the next line that gets through.
+    """
+
+    def __init__(self, logger: logging.Logger, rate_per_second: float | None = None, sample_ratio: float | None = None):
+        self.logger = logger
+        self.rate = rate_per_second if rate_per_second is not None else settings.log_message_rate_per_second
+        self.sample_ratio = sample_ratio if sample_ratio is not None else settings.log_message_sample_ratio
+        self._tokens = self.rate
+        self._last_refill = time.monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def _allow(self) -> int | None:
+        """Lines suppressed since the last one that got through, or None if this one is suppressed."""
+        with self._lock:
+            if self.sample_ratio < 1.0 and random.random() >= self.sample_ratio:
+                self._suppressed += 1
+                return None
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens < 1.0:
+                self._suppressed += 1
+                return None
+            self._tokens -= 1.0
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def log(self, level: int, msg: str, *args: Any, **kwargs: Any) -> None:
+        # Level check first so disabled levels cost a single comparison
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = self._allow()
+        if suppressed is None:
+            return
+        if suppressed:
+            msg = f"{msg} (+{suppressed} similar lines suppressed)"
+        kwargs.setdefault("stacklevel", 2)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg: str, *args: Any, **kwargs: Any) -> None:
+        self.log(logging.DEBUG, msg, *args, stacklevel=3, **kwargs)
+
+    def info(self, msg: str, *args: Any, **kwargs: Any) -> None:
+        self.log(logging.INFO, msg, *args, stacklevel=3, **kwargs)
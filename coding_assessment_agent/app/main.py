@@ -1,27 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 # Import routers later
-from app.routers import sessions, websocket # Import the routers
+from app.routers import sessions, websocket, metrics, exports # Import the routers
+from app.database import async_engine
+from app.tracing import setup_tracing, shutdown_tracing
+from app.logging_config import configure_logging
+from app.services.embedding_indexer import embedding_indexer
+from app.services.vector_db_client import vector_db_client
+from app.websocket_manager import manager as websocket_manager
 import logging
-import sys
 
 # enable cors
 from fastapi.middleware.cors import CORSMiddleware  
 
 
-# Basic Logging Configuration
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the logging level to DEBUG
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.StreamHandler(sys.stdout) # Log to standard output
-        # You might want to add logging.FileHandler("app.log") later
-    ]
-)
+# Logging configuration (levels, per-logger overrides and format come from settings)
+configure_logging()
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Coding Assessment Agent Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    setup_tracing(async_engine.sync_engine)
+    embedding_indexer.start()
+    websocket_manager.start()
+    yield
+    # Shutdown
+    await websocket_manager.stop()
+    await embedding_indexer.stop()
+    vector_db_client.shutdown()
+    shutdown_tracing()
+
+app = FastAPI(title="Coding Assessment Agent Backend", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -40,3 +51,5 @@ async def root():
 # Include routers later:
 app.include_router(sessions.router)
 app.include_router(websocket.router)
+app.include_router(metrics.router)
+app.include_router(exports.router)
@@ -0,0 +1,219 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# --- Prometheus metric definitions ---
+# All metrics live in the default registry so a single /metrics scrape exposes everything.
+
+# Buckets span the cheap stages (Redis/difflib, sub-millisecond) up to multi-second LLM calls
+STAGE_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "codeeval_stage_latency_seconds",
+    "Latency of individual pipeline stages (DB, Redis, diff, LLM, WebSocket send).",
+    ["stage"],
+    buckets=STAGE_LATENCY_BUCKETS,
+)
+
+MESSAGES_RECEIVED = Counter(
+    "codeeval_ws_messages_received_total",
+    "Inbound WebSocket messages by message_type.",
+    ["message_type"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "codeeval_queue_depth",
+    "Units of work currently waiting or in flight, by queue.",
+    ["queue"],
+)
+
+ACTIVE_SOCKETS = Gauge(
+    "codeeval_active_websockets",
+    "Number of currently connected WebSocket clients.",
+)
+
+LLM_TOKENS = Counter(
+    "codeeval_llm_tokens_total",
+    "LLM tokens consumed, by token kind (prompt/completion/cached_prompt, the prompt tokens served from the provider's prefix cache).",
+    ["kind"],
+)
+
+CACHE_EVENTS = Counter(
+    "codeeval_cache_events_total",
+    "Cache lookups by cache name and result (hit/miss).",
+    ["cache", "result"],
+)
+
+EMBEDDING_INDEX_ITEMS = Counter(
+    "codeeval_embedding_index_items_total",
+    "Items offered to the background embedding indexer, by outcome (queued, dropped, superseded by a newer snapshot, indexed, failed).",
+    ["result"],
+)
+
+VECTOR_IO_QUEUE_WAIT = Histogram(
+    "codeeval_vector_io_queue_wait_seconds",
+    "Time vector store operations wait for a thread in the dedicated vector I/O pool.",
+    ["operation"],
+    buckets=STAGE_LATENCY_BUCKETS,
+)
+
+TRIGGER_CALLS_AVOIDED = Counter(
+    "codeeval_trigger_llm_calls_avoided_total",
+    "Question triggers the line-based diff would have fired but syntax-aware change detection skipped, by reason (cosmetic, below_threshold).",
+    ["reason"],
+)
+
+TRIGGER_ADMISSIONS = Counter(
+    "codeeval_trigger_admissions_total",
+    "Question trigger admission decisions (admitted, admitted_starved, deferred by load-scaled thresholds, shed at the LLM in-flight cap).",
+    ["decision"],
+)
+
+TRIGGER_LOAD_FACTOR = Gauge(
+    "codeeval_trigger_load_factor",
+    "LLM load factor used to scale question trigger thresholds (1.0 = at target concurrency/latency).",
+)
+
+WS_OUTBOUND_EVENTS = Counter(
+    "codeeval_ws_outbound_events_total",
+    "Outbound WebSocket message events (sent, failed, timeout, slow, replaced, merged, dropped, overflow).",
+    ["event"],
+)
+
+WS_OUTBOUND_QUEUE_LENGTH = Histogram(
+    "codeeval_ws_outbound_queue_length",
+    "Per-connection outbound queue length observed when a message is queued.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+WS_REAPED = Counter(
+    "codeeval_ws_reaped_total",
+    "WebSocket connections closed by the server, by reason (idle_timeout, send_failures, slow_consumer).",
+    ["reason"],
+)
+
+WS_BYTES = Counter(
+    "codeeval_ws_bytes_total",
+    "WebSocket payload bytes by direction (in/out) and wire protocol (json/msgpack), before permessage-deflate.",
+    ["direction", "protocol"],
+)
+
+JOURNAL_EVENTS = Counter(
+    "codeeval_ws_journal_events_total",
+    "Outbound message journal events (appended, replayed frames, gap when a reconnect asked for trimmed frames, epoch_reset when it came from an earlier numbering, failed Redis calls).",
+    ["event"],
+)
+
+IDEMPOTENCY_EVENTS = Counter(
+    "codeeval_ws_idempotency_total",
+    "Inbound messages with a client_message_id by message_type and result (new, duplicate, duplicate_pending, error).",
+    ["message_type", "result"],
+)
+
+EVALUATION_BATCH_SIZE = Histogram(
+    "codeeval_evaluation_batch_size",
+    "Responses evaluated per LLM call by the batching evaluator.",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+)
+
+SPECULATIVE_QUESTIONS = Counter(
+    "codeeval_speculative_questions_total",
+    "Speculative question generation outcomes (started, served, diverged, stale, expired, failed, abandoned, skipped_load).",
+    ["result"],
+)
+
+SPECULATIVE_WASTE_RATIO = Gauge(
+    "codeeval_speculative_waste_ratio",
+    "Share of started speculative questions that were generated but never served.",
+)
+
+SPECULATIVE_LATENCY_SAVED = Histogram(
+    "codeeval_speculative_latency_saved_seconds",
+    "Question generation time a trigger did not wait for because a speculative question was served.",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+# Label children are resolved once and reused: labels() does a dict lookup under a lock,
+# which is measurable when called for every WebSocket frame.
+_stage_children: Dict[str, Any] = {}
+_queue_children: Dict[str, Any] = {}
+
+
+def _stage(stage: str):
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_LATENCY.labels(stage)
+    return child
+
+
+def _queue(queue: str):
+    child = _queue_children.get(queue)
+    if child is None:
+        child = _queue_children[queue] = QUEUE_DEPTH.labels(queue)
+    return child
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Records the wall-clock duration of the wrapped block under the given stage label."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage(stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_queue(queue: str):
+    """Counts the wrapped block as one in-flight unit of the given queue."""
+    gauge = _queue(queue)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def set_queue_depth(queue: str, depth: int):
+    """Sets the depth of a queue that is measured directly rather than via track_queue."""
+    _queue(queue).set(depth)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Records an externally measured duration for a stage."""
+    _stage(stage).observe(seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    """Counts a cache lookup as a hit or a miss."""
+    CACHE_EVENTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Returns the current metrics in Prometheus text exposition format and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class LLMTokenUsageCallback(BaseCallbackHandler):
+    """Langchain callback that feeds OpenAI token usage into LLM_TOKENS.
+
+    The prefix-cache hit rate is cached_prompt / prompt.
+    """
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens")
+        completion_tokens = token_usage.get("completion_tokens")
+        cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if prompt_tokens:
+            LLM_TOKENS.labels("prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels("completion").inc(completion_tokens)
+        if cached_tokens:
+            LLM_TOKENS.labels("cached_prompt").inc(cached_tokens)
+
+
+llm_token_usage_callback = LLMTokenUsageCallback()
@@ -1,20 +1,40 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base # Import Base from database.py
+from app.db_types import CompressedText
 import datetime
 
+class Problem(Base):
+    __tablename__ = "problems"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False) # sha256 of the statement
+    statement = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Link to sessions working on this problem (one-to-many)
+    sessions = relationship("Session", back_populates="problem")
+
 class Session(Base):
     __tablename__ = "sessions"
 
     id = Column(Integer, primary_key=True, index=True)
     start_time = Column(DateTime(timezone=True), server_default=func.now())
     end_time = Column(DateTime(timezone=True), nullable=True)
-    problem_statement = Column(Text, nullable=False) # Added field for the initial question
+    problem_id = Column(Integer, ForeignKey("problems.id"), nullable=False, index=True)
+    # Link to the (shared) problem statement, always loaded with the session
+    problem = relationship("Problem", back_populates="sessions", lazy="joined")
     # Link to report (one-to-one)
     report = relationship("Report", back_populates="session", uselist=False)
     # Link to interactions (one-to-many)
     interactions = relationship("Interaction", back_populates="session")
+    # Link to the cold-storage archive of its snapshot history (one-to-one, optional)
+    archive = relationship("SessionArchive", back_populates="session", uselist=False)
+
+    @property
+    def problem_statement(self) -> str:
+        return self.problem.statement
 
 class Interaction(Base):
     __tablename__ = "interactions"
@@ -36,7 +56,7 @@ class CodeSnapshot(Base):
     id = Column(Integer, primary_key=True, index=True)
     interaction_id = Column(Integer, ForeignKey("interactions.id"))
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    code_content = Column(Text)
+    code_content = Column(CompressedText()) # Stored compressed above a size threshold
     # Optionally store diff from previous snapshot
     # diff_content = Column(Text, nullable=True)
 
@@ -49,8 +69,22 @@ class Report(Base):
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("sessions.id"), unique=True) # Ensure one report per session
     generation_time = Column(DateTime(timezone=True), server_default=func.now())
-    report_content = Column(Text) # The generated report text
+    report_content = Column(CompressedText()) # The generated report text, stored compressed
     scores = Column(JSON, nullable=True) # Overall scores/metrics
 
     # Link back to session (one-to-one)
     session = relationship("Session", back_populates="report")
+
+class SessionArchive(Base):
+    __tablename__ = "session_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), unique=True) # One archive per session
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    snapshot_count = Column(Integer) # Snapshots contained in the archive
+    pruned_count = Column(Integer) # Snapshot rows removed from the hot table
+    payload = Column(LargeBinary) # Compressed JSON of the full snapshot history
+
+    # Link back to session (one-to-one)
+    session = relationship("Session", back_populates="archive")
+
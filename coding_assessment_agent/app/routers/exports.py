@@ -0,0 +1,35 @@
+import datetime
+from typing import Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from app.services import export_service
+
+router = APIRouter(
+    prefix="/exports",
+    tags=["exports"],
+)
+
+@router.get("/sessions.ndjson")
+async def export_sessions(
+    start: Optional[datetime.datetime] = Query(None, description="Only sessions started at or after this time"),
+    end: Optional[datetime.datetime] = Query(None, description="Only sessions started before this time"),
+    problem: Optional[str] = Query(None, description="Only sessions whose problem statement contains this text"),
+    include_code: bool = Query(True, description="Include code snapshot bodies"),
+    include_report_text: bool = Query(True, description="Include report text (scores are always included)"),
+    gzip: bool = Query(False, description="Stream a gzip-compressed file"),
+):
+    """Stream sessions with interactions, evaluations and scores as NDJSON (one session per line)."""
+    body = export_service.iter_ndjson(
+        gzip=gzip,
+        start=start,
+        end=end,
+        problem=problem,
+        include_code=include_code,
+        include_report_text=include_report_text,
+    )
+    filename = "sessions.ndjson.gz" if gzip else "sessions.ndjson"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from app.metrics import render_latest
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose pipeline metrics in Prometheus text format."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
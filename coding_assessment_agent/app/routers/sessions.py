@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Header, Response
+from typing import Optional, Set
+import base64
+import json
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import schemas, models
-from app.database import get_db
-from app.services import session_service
+from app.database import get_db, get_read_db
+from app.services import session_service, interaction_service, response_cache, archive_service
+from app.config import settings
 from app.services.agent_orchestrator import agent_orchestrator
+from app.services.question_pool import question_pool
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/sessions",
@@ -15,6 +23,8 @@ router = APIRouter(
 async def create_new_session(session_data: schemas.SessionCreate = Body(...), db: AsyncSession = Depends(get_db)):
     """Create a new assessment session, including the initial problem statement."""
     session = await session_service.create_session(db=db, problem_statement=session_data.problem_statement)
+    # Warm the opening question pool for this problem while the candidate reads it
+    question_pool.schedule_pregeneration(session.problem_statement)
     # Manually construct the response model to include the problem statement and empty interactions list
     # This ensures the response matches the SessionRead schema correctly
     return schemas.SessionRead(
@@ -26,13 +36,124 @@ async def create_new_session(session_data: schemas.SessionCreate = Body(...), db
         interactions=[]
     )
 
-@router.get("/{session_id}", response_model=schemas.SessionRead)
-async def read_session(session_id: int, db: AsyncSession = Depends(get_db)):
-    """Get details of a specific session, including interactions and report if available."""
-    session = await session_service.get_session(db=db, session_id=session_id)
+# Parts of a session that can be selected with the `include` query parameter
+SESSION_PARTS = {"interactions", "snapshots", "snapshot_bodies", "report"}
+INTERACTION_PARTS = {"snapshots", "snapshot_bodies"} # For /interactions pages
+DEFAULT_SESSION_INCLUDE = "interactions,snapshots,snapshot_bodies,report"
+MAX_PAGE_SIZE = 200
+
+def _parse_include(include: str, allowed: Set[str] = SESSION_PARTS) -> Set[str]:
+    """The selected parts; snapshot_bodies implies snapshots."""
+    parts = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = parts - allowed
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown include value(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}")
+    if "snapshot_bodies" in parts:
+        parts.add("snapshots")
+    return parts
+
+def _encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after_id": last_id}).encode()).decode()
+
+# Ended sessions only change when their report is created, so clients always revalidate
+ENDED_SESSION_CACHE_CONTROL = "no-cache"
+
+def _cached_json_response(body: str, etag: str, cache_control: str, if_none_match: Optional[str]) -> Response:
+    """Returns 304 if the client's ETag matches, otherwise the pre-rendered JSON body."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if response_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["after_id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/{session_id}", response_model=schemas.SessionView)
+async def read_session(
+    session_id: int,
+    include: str = Query(DEFAULT_SESSION_INCLUDE, description="Comma-separated parts to include: interactions, snapshots, snapshot_bodies (implies snapshots), report"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Get details of a specific session, including interactions and report if available.
+
+    Use `include` to trim the response, e.g. `include=interactions,snapshots,report`
+    returns snapshot metadata without code bodies. Ended sessions are served from a
+    rendered-response cache with a strong ETag.
+    """
+    parts = _parse_include(include)
+    variant = ",".join(sorted(parts))
+    cached = await response_cache.get_session(session_id, variant)
+    if cached:
+        return _cached_json_response(*cached, ENDED_SESSION_CACHE_CONTROL, if_none_match)
+
+    generation = await response_cache.generation(session_id) # Before the query; see response_cache
+    session = await session_service.get_session_view(
+        db=db,
+        session_id=session_id,
+        include_interactions="interactions" in parts,
+        include_snapshots="snapshots" in parts,
+        include_snapshot_bodies="snapshot_bodies" in parts,
+        include_report="report" in parts,
+    )
     if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session
+    if session.end_time is None:
+        return session
+
+    body = session.model_dump_json()
+    etag = await response_cache.set_session(session_id, variant, body, generation)
+    return _cached_json_response(body, etag, ENDED_SESSION_CACHE_CONTROL, if_none_match)
+
+@router.get("/{session_id}/summary", response_model=schemas.SessionSummary)
+async def read_session_summary(session_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Get a lightweight summary of a session (counts, last activity, score) without interactions."""
+    summary = await session_service.get_session_summary(db=db, session_id=session_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return summary
+
+@router.get("/{session_id}/replay", response_model=schemas.SessionReplay)
+async def read_session_replay(session_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Get the full code snapshot history of a session, restored from its archive if it was compacted."""
+    replay = await archive_service.get_replay(db=db, session_id=session_id)
+    if replay is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return replay
+
+@router.get("/{session_id}/interactions", response_model=schemas.InteractionPage)
+async def read_session_interactions(
+    session_id: int,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    include: str = Query("snapshots", description="Comma-separated: snapshots, snapshot_bodies (implies snapshots)"),
+    interaction_type: Optional[str] = Query(None, description="Only return interactions of this type"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Page through a session's interactions in chronological order."""
+    parts = _parse_include(include, INTERACTION_PARTS)
+    problem_statement = await session_service.get_problem_statement(db=db, session_id=session_id)
+    if problem_statement is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Fetch one extra row to know whether another page exists
+    items = await interaction_service.list_interactions(
+        db,
+        session_id,
+        after_id=_decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+        include_snapshots="snapshots" in parts,
+        include_snapshot_bodies="snapshot_bodies" in parts,
+        interaction_type=interaction_type,
+    )
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_cursor(items[-1].id)
+    return schemas.InteractionPage(items=items, next_cursor=next_cursor)
 
 @router.post("/{session_id}/end", response_model=schemas.SessionRead)
 async def mark_session_ended(session_id: int, db: AsyncSession = Depends(get_db)):
@@ -41,32 +162,45 @@ async def mark_session_ended(session_id: int, db: AsyncSession = Depends(get_db)
     if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    # Release this request's connection before the (slow) report LLM call;
+    # generate_report opens its own short-lived sessions.
+    await db.close()
+
     # Trigger report generation after successfully ending the session
     try:
-        await agent_orchestrator.generate_report(session_id=session_id, db=db)
+        await agent_orchestrator.generate_report(session_id=session_id)
     except Exception as e:
         # Log the error, but maybe don't fail the entire request?
         # Depending on requirements, you might want to handle this differently.
         # For now, we'll just log it and continue.
-        # Consider adding proper logging here.
-        print(f"Error during automatic report generation for session {session_id}: {e}") # Basic logging
+        logger.error("Error during automatic report generation for session %s: %s", session_id, e, exc_info=True)
         # Optionally: raise HTTPException(status_code=500, detail=f"Session ended, but failed to generate report: {e}")
 
     return session
 
 @router.get("/{session_id}/report", response_model=schemas.ReportRead)
-async def read_session_report(session_id: int, db: AsyncSession = Depends(get_db)):
-    """Get the final report for a specific session."""
-    # First check if the session exists
-    session = await session_service.get_session(db=db, session_id=session_id)
-    if session is None:
-        raise HTTPException(status_code=404, detail="Session not found")
+async def read_session_report(session_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_read_db)):
+    """Get the final report for a specific session.
+
+    Reports are immutable once generated: responses carry a strong ETag and are
+    served from Redis, so repeated views (and 304 revalidations) cost no DB queries.
+    """
+    cache_control = f"public, max-age={settings.report_cache_max_age_seconds}, immutable"
+    cached = await response_cache.get_report(session_id)
+    if cached:
+        return _cached_json_response(*cached, cache_control, if_none_match)
 
-    # Check if the report exists (get_report already handles this implicitly)
+    generation = await response_cache.generation(session_id)
     report = await session_service.get_report(db=db, session_id=session_id)
     if report is None:
+        # Distinguish a missing session from a report that is not ready yet
+        if await session_service.get_problem_statement(db=db, session_id=session_id) is None:
+            raise HTTPException(status_code=404, detail="Session not found")
         raise HTTPException(status_code=404, detail="Report not generated yet or not found")
-    return report
+
+    body = schemas.ReportRead.model_validate(report).model_dump_json()
+    etag = await response_cache.set_report(session_id, body, generation)
+    return _cached_json_response(body, etag, cache_control, if_none_match)
 
 # Note: Report creation will likely be triggered internally by the AgentOrchestrator
 # after the session ends or on demand, rather than via a direct POST endpoint.
@@ -1,79 +1,152 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app import schemas
+from app.config import settings
 from app.websocket_manager import manager
-from app.database import get_db
 from app.services.event_processor import process_websocket_message
+from app.services.embedding_indexer import embedding_indexer
+from app.services.speculative_questions import speculative_questions
+from app.services.message_journal import parse_last_seq
+from app.metrics import MESSAGES_RECEIVED
+from app.tracing import tracer, new_correlation_id
 # Import AgentOrchestrator if needed directly here, or pass via dependency
+from app.logging_config import SampledLogger, summarize_payload
 import logging
 
 logger = logging.getLogger(__name__)
+# Inbound frames arrive on every keystroke batch; keep their log lines sampled and rate limited
+message_logger = SampledLogger(logger)
 
 router = APIRouter()
 
+# Bounded label set for the inbound message counter
+KNOWN_MESSAGE_TYPES = {"code_update", "response_submitted", "pong"}
+
+# Workers finishing a message after their connection has gone (the event loop only keeps weak references)
+_workers = set()
+
+
+async def _handle_message(session_id: str, data: dict):
+    message_logger.debug("Received message from %s: %s", session_id, summarize_payload(data))
+
+    # One correlation id and root span per inbound message; everything
+    # downstream (DB, Redis, LLM, outbound frame) nests under it.
+    correlation_id = new_correlation_id()
+    with tracer.start_as_current_span("ws.message") as span:
+        span.set_attribute("session.id", session_id)
+        span.set_attribute("message.correlation_id", correlation_id)
+        span.set_attribute("message.type", str(data.get("message_type", "")))
+
+        # Basic validation / routing
+        if "message_type" not in data:
+            error_msg = "Invalid message format: Missing 'message_type' field."
+            logger.warning(f"{error_msg} from {session_id}")
+            await manager.send_personal_message(session_id, {"error": error_msg})
+            return
+
+        message_type = data["message_type"]
+        MESSAGES_RECEIVED.labels(message_type if message_type in KNOWN_MESSAGE_TYPES else "unknown").inc()
+        payload_obj = None # Initialize payload_obj
+
+        try:
+            session_id_int = int(session_id)
+            if message_type == "code_update":
+                # Ensure 'code' key exists for code_update type
+                if "code" not in data:
+                    raise ValueError("Missing 'code' field for code_update message.")
+                payload_obj = schemas.CodeUpdatePayload(**data, session_id=session_id_int)
+
+            elif message_type == "response_submitted":
+                # Ensure required keys exist for response_submitted type
+                if "response" not in data or "interaction_id" not in data:
+                    raise ValueError("Missing 'response' or 'interaction_id' field for response_submitted message.")
+                payload_obj = schemas.ResponseSubmittedPayload(**data, session_id=session_id_int)
+
+            else:
+                error_msg = f"Received unknown message_type '{message_type}' from {session_id}"
+                logger.warning(error_msg)
+                await manager.send_personal_message(session_id, {"error": error_msg})
+                return # Skip processing if message type is unknown
+
+            # If payload was successfully parsed, process it
+            if payload_obj:
+                await process_websocket_message(
+                    session_id_str=session_id,
+                    message_type=message_type,
+                    payload=payload_obj
+                )
+
+        except (ValueError, TypeError, KeyError) as validation_error: # Catch Pydantic/validation errors
+            error_msg = f"Invalid message payload for type '{message_type}': {validation_error}"
+            logger.error(f"Error processing message from {session_id}: {error_msg}", exc_info=True)
+            await manager.send_personal_message(session_id, {"error": error_msg})
+        except Exception as e: # Catch unexpected processing errors
+            error_msg = f"An unexpected error occurred processing your request: {str(e)}"
+            logger.error(f"Unexpected error processing message from {session_id}: {e}", exc_info=True)
+            await manager.send_personal_message(session_id, {"error": error_msg})
+
+
+async def _process_messages(session_id: str, inbound: asyncio.Queue):
+    """Handles a connection's messages in arrival order, off the receive loop.
+
+    Question generation and evaluation can outlast WS_IDLE_TIMEOUT_SECONDS; running
+    them here keeps the receive loop reading pongs meanwhile. A None item ends the
+    worker; a message already being handled is finished (its result is journaled
+    for replay if the client has gone).
+    """
+    while True:
+        data = await inbound.get()
+        if data is None:
+            return
+        await _handle_message(session_id, data)
+
+
 @router.websocket("/ws/session/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, db: AsyncSession = Depends(get_db)):
-    await manager.connect(session_id, websocket)
+async def websocket_endpoint(websocket: WebSocket, session_id: str):
+    # No DB session is held for the connection's lifetime; the event processor
+    # acquires short-lived sessions per unit of work.
+    codec = await manager.connect(session_id, websocket) # JSON unless the client negotiated a binary subprotocol
+    inbound: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_inbound_queue_size)
+    worker = asyncio.create_task(_process_messages(session_id, inbound))
+    _workers.add(worker)
+    worker.add_done_callback(_workers.discard)
     try:
+        # A reconnecting client passes the last seq it processed and gets what it missed
+        last_seq = parse_last_seq(websocket.query_params.get("last_seq"))
+        if last_seq is not None:
+            await manager.replay(session_id, last_seq, websocket.query_params.get("epoch"))
         while True:
-            data = await websocket.receive_json()
-            print(f"Received message from {session_id}: {data}")
-            logger.debug(f"Received message from {session_id}: {data}")
-
-            # Basic validation / routing
-            if "message_type" not in data:
-                error_msg = "Invalid message format: Missing 'message_type' field."
-                logger.warning(f"{error_msg} from {session_id}")
-                await manager.send_personal_message(session_id, {"error": error_msg})
+            data = await codec.receive(websocket)
+            manager.touch(session_id)
+            if data.get("message_type") == "pong": # Heartbeat reply; touch() was all it needed
+                MESSAGES_RECEIVED.labels("pong").inc()
                 continue
-
-            message_type = data["message_type"]
-            payload_obj = None # Initialize payload_obj
-
             try:
-                session_id_int = int(session_id)
-                if message_type == "code_update":
-                    # Ensure 'code' key exists for code_update type
-                    if "code" not in data:
-                        raise ValueError("Missing 'code' field for code_update message.")
-                    payload_obj = schemas.CodeUpdatePayload(**data, session_id=session_id_int)
-
-                elif message_type == "response_submitted":
-                    # Ensure required keys exist for response_submitted type
-                    if "response" not in data or "interaction_id" not in data:
-                        raise ValueError("Missing 'response' or 'interaction_id' field for response_submitted message.")
-                    payload_obj = schemas.ResponseSubmittedPayload(**data, session_id=session_id_int)
-
-                else:
-                    error_msg = f"Received unknown message_type '{message_type}' from {session_id}"
-                    logger.warning(error_msg)
-                    await manager.send_personal_message(session_id, {"error": error_msg})
-                    continue # Skip processing if message type is unknown
-
-                # If payload was successfully parsed, process it
-                if payload_obj:
-                    await process_websocket_message(
-                        session_id_str=session_id,
-                        message_type=message_type,
-                        payload=payload_obj,
-                        db=db
-                    )
-
-            except (ValueError, TypeError, KeyError) as validation_error: # Catch Pydantic/validation errors
-                error_msg = f"Invalid message payload for type '{message_type}': {validation_error}"
-                logger.error(f"Error processing message from {session_id}: {error_msg}", exc_info=True)
-                await manager.send_personal_message(session_id, {"error": error_msg})
-            except Exception as e: # Catch unexpected processing errors
-                error_msg = f"An unexpected error occurred processing your request: {str(e)}"
-                logger.error(f"Unexpected error processing message from {session_id}: {e}", exc_info=True)
-                await manager.send_personal_message(session_id, {"error": error_msg})
+                inbound.put_nowait(data)
+            except asyncio.QueueFull:
+                logger.warning("Inbound queue full (%d) for session %s; rejecting message", inbound.qsize(), session_id)
+                await manager.send_personal_message(session_id, {"error": "Too many messages in progress; please retry shortly."})
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected normally for session: {session_id}")
+    except asyncio.CancelledError:
+        # The manager cancels this task when it reaps an idle or unresponsive connection
+        connection = manager.active_connections.get(session_id)
+        if connection is not None and connection.websocket is websocket:
+            raise
+        logger.info(f"WebSocket reaped for session: {session_id}")
     except Exception as e:
         error_msg = f"WebSocket connection error for session {session_id}: {str(e)}"
         logger.error(error_msg, exc_info=True)
         # Note: We can't send a message if the socket is already closed/errored
     finally:
-        manager.disconnect(session_id)
+        # Messages not yet started are dropped; the one in progress is finished
+        while not inbound.empty():
+            inbound.get_nowait()
+        inbound.put_nowait(None)
+        manager.disconnect(session_id, websocket)
+        if session_id not in manager.active_connections and session_id.isdigit():
+            # No reconnect took over: drop per-session state kept for this client
+            embedding_indexer.forget_session(int(session_id))
+            speculative_questions.forget_session(int(session_id))
         logger.info(f"Cleaned up connection for session: {session_id}")
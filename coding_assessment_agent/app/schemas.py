@@ -62,6 +62,53 @@ class SessionRead(SessionBase):
     interactions: List[InteractionRead] = []
     # problem_statement is inherited from SessionBase
 
+# --- Lightweight / paginated read schemas ---
+class CodeSnapshotPartial(BaseSchema):
+    id: int
+    interaction_id: int
+    timestamp: datetime.datetime
+    code_content: Optional[str] = None # Omitted unless snapshot bodies are requested
+
+class InteractionListItem(InteractionBase):
+    id: int
+    session_id: int
+    timestamp: datetime.datetime
+    code_snapshot: Optional[CodeSnapshotPartial] = None
+
+class InteractionPage(BaseModel):
+    items: List[InteractionListItem]
+    next_cursor: Optional[str] = None # Pass back as `cursor` to fetch the next page
+
+class SessionView(SessionBase):
+    """Session read model whose nested parts are selected via the `include` parameter."""
+    id: int
+    start_time: datetime.datetime
+    end_time: Optional[datetime.datetime] = None
+    report: Optional[ReportRead] = None
+    interactions: List[InteractionListItem] = []
+
+class SessionSummary(SessionBase):
+    id: int
+    start_time: datetime.datetime
+    end_time: Optional[datetime.datetime] = None
+    interaction_counts: Dict[str, int] = {} # Count per interaction_type
+    snapshot_count: int = 0
+    last_activity: Optional[datetime.datetime] = None
+    has_report: bool = False
+    average_score: Optional[float] = None
+
+# --- Replay Schemas ---
+class ReplaySnapshot(BaseModel):
+    snapshot_id: int
+    interaction_id: int
+    timestamp: Optional[datetime.datetime] = None # CodeSnapshot.timestamp
+    code_content: str
+
+class SessionReplay(BaseModel):
+    session_id: int
+    archived: bool # True if served from the cold-storage archive
+    snapshots: List[ReplaySnapshot]
+
 # --- WebSocket Payload Schemas ---
 class CodeUpdatePayload(BaseModel):
     session_id: str | int # Using string here as it comes from WebSocket path param
@@ -72,6 +119,7 @@ class ResponseSubmittedPayload(BaseModel):
     session_id: str | int
     interaction_id: int # ID of the interaction (question) being responded to
     response: str
+    client_message_id: Optional[str] = None # Idempotency key; redeliveries with the same id are not processed again
 
 # --- API Response Schemas ---
 class QuestionResponse(BaseModel):
@@ -0,0 +1,107 @@
+import datetime
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+from app.config import settings
+from app.metrics import TRIGGER_ADMISSIONS, TRIGGER_LOAD_FACTOR
+
+logger = logging.getLogger(__name__)
+
+
+class TriggerThresholds(NamedTuple):
+    min_interval: datetime.timedelta # Time since the last interaction for the time-based trigger
+    min_statements: int # Changed statements for the diff-based trigger
+    load: float # Load factor the thresholds were scaled by (1.0 = unloaded)
+    starved: bool # Session waited past TRIGGER_MAX_INTERVAL_SECONDS and is exempt from load scaling
+
+
+class AdmissionController:
+    """Scales question-trigger thresholds with the process-wide LLM backlog.
+
+    Load is the larger of in-flight LLM calls over LLM_TARGET_IN_FLIGHT and the
+    moving average LLM latency over LLM_TARGET_LATENCY_SECONDS; the average decays
+    with LLM_LATENCY_HALF_LIFE_SECONDS between calls. Above 1.0 both
+    trigger thresholds grow proportionally (up to TRIGGER_MAX_LOAD_SCALE), so
+    busy periods produce fewer, larger-change questions. Once LLM_MAX_IN_FLIGHT
+    calls are running, triggers are shed outright.
+
+    Fairness: the scaled interval never exceeds TRIGGER_MAX_INTERVAL_SECONDS, and
+    a session that has waited that long since its last interaction gets the base
+    thresholds and is admitted even while shedding, so no session starves.
+    """
+
+    def __init__(self):
+        self._in_flight = 0
+        self._latency_ewma = 0.0
+        self._latency_updated = time.perf_counter()
+
+    @contextmanager
+    def track_llm(self):
+        """Wraps one LLM call so its concurrency and latency feed the load factor."""
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            now = time.perf_counter()
+            elapsed = now - start
+            alpha = settings.llm_latency_ewma_alpha
+            latency = self._latency(now)
+            self._latency_ewma = elapsed if latency == 0.0 else alpha * elapsed + (1 - alpha) * latency
+            self._latency_updated = now
+
+    def _latency(self, now: float) -> float:
+        # Only finished calls update the average, and deferred triggers make calls rarer; without
+        # decay one slow burst would keep thresholds inflated through a quiet period
+        half_life = settings.llm_latency_half_life_seconds
+        if half_life <= 0:
+            return self._latency_ewma
+        return self._latency_ewma * 0.5 ** ((now - self._latency_updated) / half_life)
+
+    def load_factor(self) -> float:
+        load = max(
+            self._in_flight / max(settings.llm_target_in_flight, 1),
+            self._latency(time.perf_counter()) / settings.llm_target_latency_seconds if settings.llm_target_latency_seconds > 0 else 0.0,
+        )
+        TRIGGER_LOAD_FACTOR.set(load)
+        return load
+
+    def thresholds(self, time_since_last: datetime.timedelta) -> TriggerThresholds:
+        base_interval = datetime.timedelta(seconds=settings.trigger_min_interval_seconds)
+        max_interval = datetime.timedelta(seconds=max(settings.trigger_max_interval_seconds, settings.trigger_min_interval_seconds))
+        load = self.load_factor()
+        if time_since_last >= max_interval:
+            return TriggerThresholds(base_interval, settings.trigger_min_changed_statements, load, True)
+        scale = min(max(load, 1.0), settings.trigger_max_load_scale)
+        return TriggerThresholds(
+            min(base_interval * scale, max_interval),
+            math.ceil(settings.trigger_min_changed_statements * scale),
+            load,
+            False,
+        )
+
+    def admit(self, session_id: int, thresholds: TriggerThresholds) -> bool:
+        """Final gate for a trigger that met its thresholds; False if the LLM backlog is saturated."""
+        if thresholds.starved:
+            TRIGGER_ADMISSIONS.labels("admitted_starved").inc()
+            return True
+        if self._in_flight >= settings.llm_max_in_flight:
+            TRIGGER_ADMISSIONS.labels("shed").inc()
+            logger.info("Shedding question trigger for session %s: %d LLM calls in flight", session_id, self._in_flight)
+            return False
+        TRIGGER_ADMISSIONS.labels("admitted").inc()
+        return True
+
+    def record_deferred(self, session_id: int, thresholds: TriggerThresholds):
+        """Counts a trigger that met the base thresholds but not the load-scaled ones."""
+        TRIGGER_ADMISSIONS.labels("deferred").inc()
+        logger.debug(
+            "Deferring question trigger for session %s under load %.2f (interval %s, %d statements)",
+            session_id, thresholds.load, thresholds.min_interval, thresholds.min_statements,
+        )
+
+
+admission_controller = AdmissionController()
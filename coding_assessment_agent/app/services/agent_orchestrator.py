@@ -1,19 +1,28 @@
 import json
 import logging
+from contextlib import nullcontext
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload, selectinload
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from langchain_openai import ChatOpenAI
 
 from app import schemas, models
-from app.database import get_llm
-from app.prompts import question_generation_prompt, evaluation_prompt, report_generation_prompt
+from app.config import settings
+from app.database import get_llm, AsyncSessionFactory
+from app.prompts import question_generation_prompt, evaluation_prompt, report_generation_prompt, batch_evaluation_prompt
 from app.services.context_manager import context_manager, ContextManager
 from app.services import interaction_service, session_service
+from app.services.admission_control import admission_controller
+from app.services.batch_evaluator import BatchEvaluator
+from app.services.embedding_indexer import embedding_indexer
+from app.services.question_pool import question_pool, is_starter_code
+from app.services.speculative_questions import speculative_questions
 from app.websocket_manager import manager as websocket_manager # Import the singleton manager
+from app.metrics import track_stage, track_queue, llm_token_usage_callback
+from app.tracing import tracer
+from app.logging_config import summarize_payload
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +34,8 @@ class AgentOrchestrator:
         self.question_chain = (
             RunnablePassthrough.assign(
                 history=lambda x: x.get('history', 'No history yet.'),
-                problem_statement=lambda x: x.get('problem_statement', '[Problem statement not provided]')
+                problem_statement=lambda x: x.get('problem_statement', '[Problem statement not provided]'),
+                relevant_context=lambda x: x.get('relevant_context', '')
             )
             | question_generation_prompt
             | self.llm
@@ -34,12 +44,19 @@ class AgentOrchestrator:
         self.evaluation_chain = (
              RunnablePassthrough.assign(
                 history=lambda x: x.get('history', 'No history yet.'),
-                problem_statement=lambda x: x.get('problem_statement', '[Problem statement not provided]')
+                problem_statement=lambda x: x.get('problem_statement', '[Problem statement not provided]'),
+                relevant_context=lambda x: x.get('relevant_context', '')
              )
             | evaluation_prompt
             | self.llm
             | StrOutputParser() # Output is expected JSON string
         )
+        # Queued responses on the same problem are evaluated together (see BatchEvaluator)
+        self.batch_evaluator = BatchEvaluator(
+            self._invoke_chain,
+            self.evaluation_chain,
+            batch_evaluation_prompt | self.llm | StrOutputParser(),
+        )
         self.report_chain = (
             RunnablePassthrough.assign(
                 full_history=lambda x: x.get('full_history', 'No history.'),
@@ -50,37 +67,91 @@ class AgentOrchestrator:
             | StrOutputParser()
         )
 
-    async def request_question(self, session_id: int, current_code: str, previous_code: Optional[str], db: AsyncSession):
-        """Generates a question based on code changes and sends it via WebSocket."""
-        session_id_str = str(session_id)
-        try:
-            # Fetch the session to get the problem statement
-            session = await session_service.get_session(db, session_id)
-            if not session:
-                logger.error(f"Session {session_id} not found for requesting question.")
-                # Consider sending an error via WebSocket
-                return
-            problem_statement = session.problem_statement
+    async def _invoke_chain(self, chain, context: dict, stage: str, admission_load: bool = True) -> str:
+        """Runs an LLM chain while recording latency, in-flight depth and token usage.
 
+        With admission_load=False (speculative calls) the call is left out of the
+        admission controller's load factor, so it never defers or sheds real triggers.
+        """
+        load = admission_controller.track_llm() if admission_load else nullcontext()
+        with track_queue("llm"), load, track_stage(stage), tracer.start_as_current_span(stage):
+            return await chain.ainvoke(context, config={"callbacks": [llm_token_usage_callback]})
+
+    async def _generate_question(
+        self, session_id: int, current_code: str, previous_code: Optional[str], problem_statement: str, speculative: bool = False,
+    ) -> str:
+        with tracer.start_as_current_span("context_build"):
             context = await self.context_manager.prepare_context_for_question(
-                session_id=session_id_str,
+                session_id=str(session_id),
                 current_code=current_code,
                 previous_code=previous_code,
                 problem_statement=problem_statement # Pass it here
             )
-            logger.debug(f"Prepared context for question generation (session {session_id}): {context}")
+        logger.debug("Prepared context for question generation (session %s): %s", session_id, summarize_payload(context))
+        return await self._invoke_chain(self.question_chain, context, "llm_question", admission_load=not speculative)
+
+    async def speculate_question(self, session_id: int, current_code: str, previous_code: Optional[str]):
+        """Starts generating a question in the background for a session close to its trigger thresholds.
+
+        Nothing is persisted or sent; request_question serves the result if the
+        code has not moved on by the time the trigger fires.
+        """
+        if not settings.speculative_questions_enabled:
+            return
+        async with AsyncSessionFactory() as db:
+            problem_statement = await session_service.get_problem_statement(db, session_id)
+        if problem_statement is None:
+            return
+        speculative_questions.start(
+            session_id,
+            current_code,
+            lambda: self._generate_question(session_id, current_code, previous_code, problem_statement, speculative=True),
+        )
 
-            question = await self.question_chain.ainvoke(context)
-            logger.info(f"Generated question for session {session_id}: {question}")
+    async def request_question(self, session_id: int, current_code: str, previous_code: Optional[str]):
+        """Generates a question based on code changes and sends it via WebSocket.
+
+        DB sessions are opened per unit of work and closed before the LLM call, so a
+        slow generation never pins a pooled connection.
+        """
+        session_id_str = str(session_id)
+        try:
+            # Fetch the problem statement
+            async with AsyncSessionFactory() as db:
+                with track_stage("get_session"):
+                    problem_statement = await session_service.get_problem_statement(db, session_id)
+                    first_question = problem_statement is not None and not await interaction_service.has_interaction_of_type(db, session_id, "question_asked")
+            if problem_statement is None:
+                logger.error(f"Session {session_id} not found for requesting question.")
+                # Consider sending an error via WebSocket
+                return
+
+            # The first question on (near) starter code needs no code context: serve a pregenerated one
+            question = None
+            if first_question and is_starter_code(current_code):
+                question = await question_pool.take_opening_question(problem_statement)
+                if question is not None:
+                    logger.info("Served pooled opening question for session %s", session_id)
+
+            # A question generated ahead of the trigger is served if the code hasn't moved on since
+            if question is None:
+                question = await speculative_questions.take(session_id, current_code)
+            else:
+                speculative_questions.invalidate(session_id)
+            if question is None:
+                question = await self._generate_question(session_id, current_code, previous_code, problem_statement)
+                logger.info("Generated question for session %s: %s", session_id, summarize_payload(question))
 
             # Save the interaction record *before* sending, so we have an ID
-            interaction_record = await interaction_service.create_interaction(
-                db, schemas.InteractionCreate(
-                    session_id=session_id,
-                    interaction_type="question_asked",
-                    data={"question": question}
-                )
-            )
+            with track_stage("persist_interaction"):
+                async with AsyncSessionFactory() as db:
+                    interaction_record = await interaction_service.create_interaction(
+                        db, schemas.InteractionCreate(
+                            session_id=session_id,
+                            interaction_type="question_asked",
+                            data={"question": question}
+                        )
+                    )
 
             # Send question via WebSocket
             await websocket_manager.send_personal_message(session_id_str, {
@@ -100,20 +171,32 @@ class AgentOrchestrator:
             except Exception as ws_err:
                 logger.error(f"Failed to send error message via WebSocket for session {session_id}: {ws_err}")
 
-    async def evaluate_response(self, session_id: int, response_payload: schemas.ResponseSubmittedPayload, db: AsyncSession):
-        """Evaluates a user's response, updates the interaction, and sends results via WebSocket."""
+    async def evaluate_response(self, session_id: int, response_payload: schemas.ResponseSubmittedPayload) -> Optional[dict]:
+        """Evaluates a user's response, updates the interaction, and sends results via WebSocket.
+
+        Returns the evaluation_result frame that was sent, or None if evaluation failed.
+        """
         session_id_str = str(session_id)
         try:
-            # Fetch the session to get the problem statement
-            session = await session_service.get_session(db, session_id)
-            if not session:
+            async with AsyncSessionFactory() as db:
+                # Fetch the problem statement
+                with track_stage("get_session"):
+                    problem_statement = await session_service.get_problem_statement(db, session_id)
+
+                # Retrieve the original interaction (question) to get the question text and code context
+                original_interaction = await interaction_service.get_interaction(db, response_payload.interaction_id)
+                relevant_code = None
+                if original_interaction and original_interaction.session_id == session_id:
+                    # Find the code snapshot associated with the question interaction.
+                    # --- Current Simplification ---:
+                    # Assumes the most recent snapshot *before* the question is relevant.
+                    # Future Improvement: Store the relevant snapshot_id with the question interaction.
+                    relevant_code = await interaction_service.get_latest_code_before(db, session_id, original_interaction.timestamp)
+
+            if problem_statement is None:
                 logger.error(f"Session {session_id} not found for evaluating response.")
                 await websocket_manager.send_personal_message(session_id_str, {"error": f"Session {session_id} not found."})
                 return
-            problem_statement = session.problem_statement
-
-            # Retrieve the original interaction (question) to get the question text and code context
-            original_interaction = await interaction_service.get_interaction(db, response_payload.interaction_id)
             if not original_interaction or original_interaction.session_id != session_id:
                 error_msg = f"Original interaction {response_payload.interaction_id} not found or mismatch for session {session_id}"
                 logger.warning(error_msg)
@@ -121,37 +204,26 @@ class AgentOrchestrator:
                 return
 
             question = original_interaction.data.get("question", "[Question not found]")
-            # Find the code snapshot associated with the question interaction.
-            # --- Current Simplification ---:
-            # Assumes the most recent snapshot *before* the evaluation request is relevant.
-            # This might be incorrect if multiple code updates happened before a response.
-            # Future Improvement: Store the relevant snapshot_id with the question interaction.
-            # Or, traverse interactions backward from the question to find the last snapshot.
-            latest_snapshot_interaction = await db.execute(
-                select(models.Interaction)
-                .join(models.CodeSnapshot, models.Interaction.id == models.CodeSnapshot.interaction_id)
-                .where(models.Interaction.session_id == session_id, models.Interaction.timestamp < original_interaction.timestamp)
-                .options(joinedload(models.Interaction.code_snapshot))
-                .order_by(models.Interaction.timestamp.desc())
-                .limit(1)
-            )
-            relevant_interaction_with_snapshot = latest_snapshot_interaction.scalar_one_or_none()
-            relevant_code = relevant_interaction_with_snapshot.code_snapshot.code_content if relevant_interaction_with_snapshot and relevant_interaction_with_snapshot.code_snapshot else "[Code context not available]"
+            if relevant_code is None:
+                relevant_code = "[Code context not available]"
 
             # Add user response to history *before* evaluation
             await self.context_manager.add_user_message(session_id_str, response_payload.response)
+            # A question speculated before this answer would ignore it
+            speculative_questions.invalidate(session_id)
+
+            with tracer.start_as_current_span("context_build"):
+                context = await self.context_manager.prepare_context_for_evaluation(
+                    session_id=session_id_str,
+                    question=question,
+                    response=response_payload.response,
+                    relevant_code=relevant_code,
+                    problem_statement=problem_statement # Pass it here
+                )
+            logger.debug("Prepared context for evaluation (session %s, interaction %s): %s", session_id, response_payload.interaction_id, summarize_payload(context))
 
-            context = await self.context_manager.prepare_context_for_evaluation(
-                session_id=session_id_str,
-                question=question,
-                response=response_payload.response,
-                relevant_code=relevant_code,
-                problem_statement=problem_statement # Pass it here
-            )
-            logger.debug(f"Prepared context for evaluation (session {session_id}, interaction {response_payload.interaction_id}): {context}")
-
-            evaluation_json_str = await self.evaluation_chain.ainvoke(context)
-            logger.info(f"Generated evaluation for session {session_id}, interaction {response_payload.interaction_id}: {evaluation_json_str}")
+            evaluation_json_str = await self.batch_evaluator.evaluate(session_id, context)
+            logger.info("Generated evaluation for session %s, interaction %s: %s", session_id, response_payload.interaction_id, summarize_payload(evaluation_json_str))
 
             # Clean the LLM output: remove potential markdown fences and whitespace
             cleaned_json_str = evaluation_json_str.strip()
@@ -186,10 +258,13 @@ class AgentOrchestrator:
             # Update the interaction record with evaluation data
             updated_data = original_interaction.data.copy()
             updated_data['evaluation'] = {"text": evaluation_text, "score": score}
-            await interaction_service.update_interaction(db, response_payload.interaction_id, {"data": updated_data})
+            with track_stage("persist_interaction"):
+                async with AsyncSessionFactory() as db:
+                    await interaction_service.update_interaction(db, response_payload.interaction_id, {"data": updated_data})
+            embedding_indexer.submit_answer(session_id, response_payload.interaction_id, question, response_payload.response, score)
 
             # Send evaluation result via WebSocket
-            await websocket_manager.send_personal_message(session_id_str, {
+            result_message = await websocket_manager.send_personal_message(session_id_str, {
                 "message_type": "evaluation_result",
                 "interaction_id": response_payload.interaction_id,
                 "evaluation": evaluation_text,
@@ -198,6 +273,7 @@ class AgentOrchestrator:
 
             # Add AI evaluation to history (maybe just the text part)
             await self.context_manager.add_ai_message(session_id_str, f"Evaluation: {evaluation_text} (Score: {score})")
+            return result_message
 
         except Exception as e:
             logger.error(f"Error evaluating response for session {session_id}, interaction {response_payload.interaction_id}: {e}", exc_info=True)
@@ -207,75 +283,69 @@ class AgentOrchestrator:
             except Exception as ws_err:
                  logger.error(f"Failed to send error message via WebSocket for session {session_id}: {ws_err}")
 
-    async def generate_report(self, session_id: int, db: AsyncSession):
+    async def generate_report(self, session_id: int):
         """Generates a final report for the session and saves it."""
         session_id_str = str(session_id)
         try:
-            # Fetch the session to get the problem statement
-            session = await session_service.get_session(db, session_id)
-            if not session:
+            async with AsyncSessionFactory() as db:
+                # Fetch the problem statement
+                with track_stage("get_session"):
+                    problem_statement = await session_service.get_problem_statement(db, session_id)
+                # --- Get Final Code State ---
+                last_snapshot_interaction = await interaction_service.get_last_interaction_with_snapshot(db, session_id)
+            if problem_statement is None:
                 logger.error(f"Session {session_id} not found for generating report.")
                 # Consider sending an error via WebSocket
                 return
-            problem_statement = session.problem_statement
-
-            # --- Get Final Code State ---
-            last_snapshot_interaction_result = await db.execute(
-                 select(models.Interaction)
-                 .join(models.CodeSnapshot, models.Interaction.id == models.CodeSnapshot.interaction_id)
-                .where(models.Interaction.session_id == session_id)
-                .options(joinedload(models.Interaction.code_snapshot))
-                .order_by(models.Interaction.timestamp.desc())
-                .limit(1)
-            )
-            last_snapshot_interaction = last_snapshot_interaction_result.scalar_one_or_none()
             final_code = last_snapshot_interaction.code_snapshot.code_content if last_snapshot_interaction and last_snapshot_interaction.code_snapshot else "[No final code snapshot found]"
 
             # --- Prepare Context (History + Problem Statement) ---
-            context = await self.context_manager.prepare_context_for_report(
-                session_id=session_id_str,
-                final_code=final_code,
-                problem_statement=problem_statement # Pass it here
-            )
-            logger.debug(f"Prepared context for report generation (session {session_id}): {context}")
+            with tracer.start_as_current_span("context_build"):
+                context = await self.context_manager.prepare_context_for_report(
+                    session_id=session_id_str,
+                    final_code=final_code,
+                    problem_statement=problem_statement # Pass it here
+                )
+            logger.debug("Prepared context for report generation (session %s): %s", session_id, summarize_payload(context))
 
             # --- Generate Report Content (LLM Call) ---
-            report_content = await self.report_chain.ainvoke(context)
+            report_content = await self._invoke_chain(self.report_chain, context, "llm_report")
             logger.info(f"Generated report content for session {session_id}")
 
-            # --- Calculate Average Score ---
-            interactions_result = await db.execute(
-                select(models.Interaction)
-                .where(models.Interaction.session_id == session_id)
-                .order_by(models.Interaction.timestamp.asc())
-            )
-            interactions = interactions_result.scalars().all()
-
-            scores_list = []
-            for interaction in interactions:
-                if interaction.data and isinstance(interaction.data.get("evaluation"), dict):
-                    score = interaction.data["evaluation"].get("score")
-                    if score is not None:
-                        try:
-                            scores_list.append(float(score))
-                        except (ValueError, TypeError):
-                            logger.warning(f"Could not convert score '{score}' to float for interaction {interaction.id}")
-
-            average_score = sum(scores_list) / len(scores_list) if scores_list else 0.0
-            scores_dict = {
-                "average_score": average_score,
-                "individual_scores": scores_list
-            }
-            logger.info(f"Calculated scores for session {session_id}: {scores_dict}")
-
-            # --- Save the Report ---
-            report_schema = schemas.ReportCreate(
-                session_id=session_id,
-                report_content=report_content,
-                scores=scores_dict # Use the calculated scores
-            )
-            await session_service.create_report(db, session_id, report_schema)
-            logger.info(f"Report saved for session {session_id}")
+            async with AsyncSessionFactory() as db:
+                # --- Calculate Average Score ---
+                interactions_result = await db.execute(
+                    select(models.Interaction)
+                    .where(models.Interaction.session_id == session_id)
+                    .order_by(models.Interaction.timestamp.asc())
+                )
+                interactions = interactions_result.scalars().all()
+
+                scores_list = []
+                for interaction in interactions:
+                    if interaction.data and isinstance(interaction.data.get("evaluation"), dict):
+                        score = interaction.data["evaluation"].get("score")
+                        if score is not None:
+                            try:
+                                scores_list.append(float(score))
+                            except (ValueError, TypeError):
+                                logger.warning(f"Could not convert score '{score}' to float for interaction {interaction.id}")
+
+                average_score = sum(scores_list) / len(scores_list) if scores_list else 0.0
+                scores_dict = {
+                    "average_score": average_score,
+                    "individual_scores": scores_list
+                }
+                logger.info(f"Calculated scores for session {session_id}: {scores_dict}")
+
+                # --- Save the Report ---
+                report_schema = schemas.ReportCreate(
+                    session_id=session_id,
+                    report_content=report_content,
+                    scores=scores_dict # Use the calculated scores
+                )
+                await session_service.create_report(db, session_id, report_schema)
+                logger.info(f"Report saved for session {session_id}")
 
             # Optionally mark session as ended if not already (redundant if triggered by end_session)
             # await session_service.end_session(db, session_id)
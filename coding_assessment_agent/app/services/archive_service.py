@@ -0,0 +1,175 @@
+import datetime
+import json
+import logging
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app import models, schemas
+from app.config import settings
+from app.database import AsyncSessionFactory
+from app.db_types import compress_bytes, decompress_bytes
+from app.services import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+# (owning interaction's timestamp, snapshot). The interaction time orders the history and
+# picks keyframes, as interaction_service.get_latest_code_before does; the snapshot
+# keeps its own timestamp so a restore puts back exactly what was archived.
+TimedSnapshot = Tuple[datetime.datetime, schemas.ReplaySnapshot]
+
+
+async def _load_snapshot_history(db: AsyncSession, session_id: int) -> List[TimedSnapshot]:
+    """Loads all hot-table snapshots of a session in chronological order."""
+    result = await db.execute(
+        select(
+            models.Interaction.timestamp,
+            models.CodeSnapshot.id,
+            models.CodeSnapshot.interaction_id,
+            models.CodeSnapshot.timestamp,
+            models.CodeSnapshot.code_content,
+        )
+        .join(models.Interaction, models.Interaction.id == models.CodeSnapshot.interaction_id)
+        .where(models.Interaction.session_id == session_id)
+        .order_by(models.Interaction.timestamp.asc(), models.CodeSnapshot.id.asc())
+    )
+    return [
+        (row[0], schemas.ReplaySnapshot(snapshot_id=row[1], interaction_id=row[2], timestamp=row[3], code_content=row[4] or ""))
+        for row in result
+    ]
+
+
+def _select_keyframes(history: List[TimedSnapshot], question_times: List[datetime.datetime]) -> Set[int]:
+    """Picks the snapshot ids that live queries still need after compaction.
+
+    Keeps the first and final snapshot (the report's final code) and, for every
+    question asked, the latest snapshot before it (the evaluation's code context,
+    see interaction_service.get_latest_code_before).
+    """
+    if not history:
+        return set()
+    keyframes = {history[0][1].snapshot_id, history[-1][1].snapshot_id}
+    index = 0
+    for question_time in sorted(question_times):
+        while index + 1 < len(history) and history[index + 1][0] < question_time:
+            index += 1
+        if history[index][0] < question_time:
+            keyframes.add(history[index][1].snapshot_id)
+    return keyframes
+
+
+async def find_archivable_sessions(db: AsyncSession, retention_days: int, limit: Optional[int] = None) -> List[int]:
+    """Returns ids of sessions that ended before the retention window and have no archive yet."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)
+    stmt = (
+        select(models.Session.id)
+        .outerjoin(models.SessionArchive, models.SessionArchive.session_id == models.Session.id)
+        .where(models.Session.end_time.is_not(None), models.Session.end_time < cutoff, models.SessionArchive.id.is_(None))
+        .order_by(models.Session.id.asc())
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    return list(result.scalars())
+
+
+async def archive_session(db: AsyncSession, session_id: int) -> Optional[models.SessionArchive]:
+    """Compacts a session's snapshot history into one compressed archive row.
+
+    The full history goes into session_archives; only keyframe snapshots stay in
+    code_snapshots. Runs in a single transaction.
+    """
+    history = await _load_snapshot_history(db, session_id)
+    question_times = (await db.execute(
+        select(models.Interaction.timestamp)
+        .where(models.Interaction.session_id == session_id, models.Interaction.interaction_type == "question_asked")
+    )).scalars().all()
+    keyframes = _select_keyframes(history, list(question_times))
+    snapshots = [snapshot for _, snapshot in history]
+    pruned_ids = [s.snapshot_id for s in snapshots if s.snapshot_id not in keyframes]
+
+    payload = json.dumps([s.model_dump(mode="json") for s in snapshots]).encode("utf-8")
+    archive = models.SessionArchive(
+        session_id=session_id,
+        snapshot_count=len(snapshots),
+        pruned_count=len(pruned_ids),
+        payload=compress_bytes(payload),
+    )
+    db.add(archive)
+    if pruned_ids:
+        await db.execute(delete(models.CodeSnapshot).where(models.CodeSnapshot.id.in_(pruned_ids)))
+    await db.commit()
+    await db.refresh(archive)
+    # Cached session renderings list the pruned snapshots
+    await response_cache.invalidate_session(session_id)
+    logger.info("Archived session %s: %d snapshots, %d pruned, %d bytes", session_id, len(snapshots), len(pruned_ids), len(archive.payload))
+    return archive
+
+
+async def archive_ended_sessions(retention_days: Optional[int] = None, limit: Optional[int] = None) -> int:
+    """Archival job: compacts every eligible session, one short transaction per session."""
+    retention_days = retention_days if retention_days is not None else settings.archive_retention_days
+    async with AsyncSessionFactory() as db:
+        session_ids = await find_archivable_sessions(db, retention_days, limit)
+    archived = 0
+    for session_id in session_ids:
+        try:
+            async with AsyncSessionFactory() as db:
+                await archive_session(db, session_id)
+            archived += 1
+        except Exception as e:
+            logger.error("Failed to archive session %s: %s", session_id, e, exc_info=True)
+    return archived
+
+
+def _decode_archive(archive: models.SessionArchive) -> List[schemas.ReplaySnapshot]:
+    entries = json.loads(decompress_bytes(archive.payload))
+    return [schemas.ReplaySnapshot(**entry) for entry in entries]
+
+
+async def get_replay(db: AsyncSession, session_id: int) -> Optional[schemas.SessionReplay]:
+    """Returns a session's full snapshot history, restoring it from the archive if compacted."""
+    session_exists = (await db.execute(select(models.Session.id).where(models.Session.id == session_id))).scalar_one_or_none()
+    if session_exists is None:
+        return None
+    archive = (await db.execute(
+        select(models.SessionArchive).where(models.SessionArchive.session_id == session_id)
+    )).scalar_one_or_none()
+    if archive is not None:
+        return schemas.SessionReplay(session_id=session_id, archived=True, snapshots=_decode_archive(archive))
+    history = await _load_snapshot_history(db, session_id)
+    return schemas.SessionReplay(session_id=session_id, archived=False, snapshots=[snapshot for _, snapshot in history])
+
+
+async def restore_session(db: AsyncSession, session_id: int) -> int:
+    """Moves an archived session back into the hot tables and drops its archive.
+
+    Returns the number of snapshot rows re-inserted.
+    """
+    archive = (await db.execute(
+        select(models.SessionArchive).where(models.SessionArchive.session_id == session_id)
+    )).scalar_one_or_none()
+    if archive is None:
+        return 0
+    existing_ids = set((await db.execute(
+        select(models.CodeSnapshot.id)
+        .join(models.Interaction, models.Interaction.id == models.CodeSnapshot.interaction_id)
+        .where(models.Interaction.session_id == session_id)
+    )).scalars())
+    restored = 0
+    for snapshot in _decode_archive(archive):
+        if snapshot.snapshot_id in existing_ids:
+            continue
+        db.add(models.CodeSnapshot(
+            id=snapshot.snapshot_id,
+            interaction_id=snapshot.interaction_id,
+            timestamp=snapshot.timestamp,
+            code_content=snapshot.code_content,
+        ))
+        restored += 1
+    await db.delete(archive)
+    await db.commit()
+    await response_cache.invalidate_session(session_id)
+    logger.info("Restored %d snapshots for session %s from archive", restored, session_id)
+    return restored
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import secrets
+from typing import Any, Awaitable, Callable, Dict, List
+from app.config import settings
+from app.metrics import EVALUATION_BATCH_SIZE
+from app.prompts import BATCH_EVALUATION_ITEM_TEMPLATE
+from app.services.problem_service import problem_hash
+
+logger = logging.getLogger(__name__)
+
+# (chain, context, stage) -> raw LLM output; AgentOrchestrator._invoke_chain
+ChainInvoker = Callable[[Any, Dict[str, Any], str], Awaitable[str]]
+
+
+def _parse_batch_output(output: str) -> Dict[int, dict]:
+    cleaned = output.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        parsed = json.loads(cleaned)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, list):
+        return {}
+    results = {}
+    for entry in parsed:
+        if isinstance(entry, dict) and "id" in entry and "evaluation_text" in entry and "score" in entry:
+            try:
+                results[int(entry["id"])] = {"evaluation_text": entry["evaluation_text"], "score": entry["score"]}
+            except (TypeError, ValueError):
+                continue
+    return results
+
+
+class _Pending:
+    __slots__ = ("context", "future")
+
+    def __init__(self, context: Dict[str, Any], future: asyncio.Future):
+        self.context = context
+        self.future = future
+
+
+class BatchEvaluator:
+    """Collects evaluation requests for EVALUATION_BATCH_WINDOW_MS and evaluates them together.
+
+    Requests are grouped by session and problem, so the system prompt prefix is
+    shared (with EVALUATION_BATCH_ACROSS_SESSIONS, by problem only, so responses
+    from several sessions on the same problem can ride one call). A group
+    of one goes through the normal evaluation chain; larger groups make one
+    structured call that returns an evaluation per item. At most
+    EVALUATION_MAX_IN_FLIGHT calls run at once: while they are busy, due groups
+    keep collecting requests, so batches grow exactly when the backlog does. Each caller gets back the
+    same JSON string the single-item chain would have produced, so persisting and
+    sending results stays with the caller. Items missing from a batch answer are
+    re-evaluated individually.
+    """
+
+    def __init__(self, invoke: ChainInvoker, single_chain, batch_chain):
+        self._invoke = invoke
+        self._single_chain = single_chain
+        self._batch_chain = batch_chain
+        self._pending: Dict[str, List[_Pending]] = {}
+        self._flush_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._due: Dict[str, None] = {} # Groups whose window has passed, oldest first, waiting for a free call slot
+        self._in_flight = 0
+        # Strong references to running batch tasks (the event loop only keeps weak ones)
+        self._tasks = set()
+
+    async def evaluate(self, session_id: int, context: Dict[str, Any]) -> str:
+        """Evaluation JSON string for one prepared evaluation context."""
+        if settings.evaluation_batch_window_ms <= 0:
+            return await self._invoke(self._single_chain, context, "llm_evaluation")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = problem_hash(context.get("problem_statement", ""))
+        if not settings.evaluation_batch_across_sessions:
+            key = f"{key}:{session_id}"
+        group = self._pending.setdefault(key, [])
+        group.append(_Pending(context, future))
+        if key in self._due:
+            pass # Already waiting for a call slot; this request joins that batch
+        elif len(group) >= settings.evaluation_batch_max_size:
+            self._flush(key)
+        elif key not in self._flush_handles:
+            self._flush_handles[key] = loop.call_later(settings.evaluation_batch_window_ms / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: str):
+        handle = self._flush_handles.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        self._due[key] = None
+        self._launch_due()
+
+    def _launch_due(self):
+        while self._due and self._in_flight < settings.evaluation_max_in_flight:
+            key = next(iter(self._due))
+            # Callers that gave up (cancelled while waiting) don't take a place in the batch
+            group = [pending for pending in self._pending.get(key, []) if not pending.future.done()]
+            batch, rest = group[:settings.evaluation_batch_max_size], group[settings.evaluation_batch_max_size:]
+            if rest:
+                self._pending[key] = rest # Stays due: the next free slot takes the rest
+            else:
+                self._pending.pop(key, None)
+                del self._due[key]
+            if not batch:
+                continue
+            self._in_flight += 1
+            task = asyncio.ensure_future(self._run_group(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._group_done)
+
+    def _group_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._in_flight -= 1
+        self._launch_due()
+
+    async def _run_group(self, group: List[_Pending]):
+        EVALUATION_BATCH_SIZE.observe(len(group))
+        if len(group) == 1:
+            await self._run_single(group[0])
+            return
+        try:
+            output = await self._invoke(self._batch_chain, self._batch_context(group), "llm_evaluation_batch")
+            results = _parse_batch_output(output)
+        except Exception as e:
+            logger.warning("Batch evaluation of %d responses failed, evaluating individually: %s", len(group), e)
+            results = {}
+        missing = []
+        for item_id, pending in enumerate(group, start=1):
+            if pending.future.done():
+                continue
+            if item_id in results:
+                pending.future.set_result(json.dumps(results[item_id]))
+            else:
+                missing.append(pending)
+        if missing:
+            logger.info("Batch evaluation answered %d of %d items; evaluating the rest individually", len(group) - len(missing), len(group))
+            await asyncio.gather(*(self._run_single(pending) for pending in missing))
+        else:
+            logger.info("Evaluated %d responses in one LLM call", len(group))
+
+    async def _run_single(self, pending: _Pending):
+        try:
+            result = await self._invoke(self._single_chain, pending.context, "llm_evaluation")
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+            return
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+    @staticmethod
+    def _batch_context(group: List[_Pending]) -> Dict[str, Any]:
+        # Unguessable per call, so a response cannot open a fake item for another candidate
+        batch_marker = secrets.token_hex(4)
+        items = "\n".join(
+            BATCH_EVALUATION_ITEM_TEMPLATE.format(
+                id=item_id,
+                batch_marker=batch_marker,
+                code=pending.context.get("code", "[Code context not available]"),
+                history=pending.context.get("history", "No history yet."),
+                relevant_context=pending.context.get("relevant_context", ""),
+                question=pending.context.get("question", ""),
+                response=pending.context.get("response", ""),
+            )
+            for item_id, pending in enumerate(group, start=1)
+        )
+        return {
+            "problem_statement": group[0].context.get("problem_statement", ""),
+            "items": items,
+            "count": len(group),
+            "batch_marker": batch_marker,
+        }
@@ -0,0 +1,225 @@
+import ast
+import difflib
+import io
+import re
+import tokenize
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+# Regex tokenizers for JS/TS and for Python that tokenize rejects (e.g. mid-edit code).
+# Comments and whitespace are matched only so they can be dropped.
+_COMMON_TOKENS = r"""
+  | (?P<newline>\n)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<punct>===|!==|=>|\.\.\.|\+\+|--|\*\*=?|//=?|&&=?|\|\|=?|\?\?=?|<<=?|>>>?=?|[-+*/%&|^<>!=]=?|[{}()\[\];,.:?~@])
+  | (?P<other>.)
+"""
+JS_TOKEN_RE = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>`(?:\\.|[^`\\])*`?|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)
+""" + _COMMON_TOKENS, re.S | re.X)
+PY_TOKEN_RE = re.compile(r"""
+    (?P<comment>\#[^\n]*)
+  | (?P<string>\'\'\'.*?(?:\'\'\'|\Z)|\"\"\".*?(?:\"\"\"|\Z)|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)
+""" + _COMMON_TOKENS, re.S | re.X)
+
+NEWLINE = "\n"
+# A line ending in one of these continues the statement on the next line
+CONTINUATION_TOKENS = {",", "(", "[", ".", "=", "=>", "?", ":", "&&", "||", "??", "+", "-", "*", "/", "%", "|", "&", "<", ">", "==", "===", "!=", "!=="}
+CONTROL_KEYWORDS = {"if", "for", "while", "switch", "catch", "with", "else", "do", "try", "finally", "return"}
+MODULE_SCOPE = "<module>"
+
+Statement = Tuple[str, ...]
+
+
+class ChangeSummary(NamedTuple):
+    language: str # "python" or "js"
+    cosmetic_only: bool # Token streams are identical: only whitespace, comments or formatting changed
+    statements_changed: int
+    functions_touched: Set[str] # Enclosing function names of changed statements (MODULE_SCOPE for top level)
+
+
+def detect_language(code: str) -> str:
+    """Python if the code parses as Python, otherwise JS (the editor's default language)."""
+    if not code.strip():
+        return "js"
+    try:
+        ast.parse(code)
+        return "python"
+    except (SyntaxError, ValueError):
+        # Mid-edit Python still has Python-only markers
+        if re.search(r"^\s*(def|class)\s+\w+.*:\s*$|^\s*(import|from)\s+\w+", code, re.M) and not re.search(r"[;{}]\s*$", code, re.M):
+            return "python"
+        return "js"
+
+
+def _regex_tokens(code: str, language: str) -> List[str]:
+    tokens: List[str] = []
+    for match in (PY_TOKEN_RE if language == "python" else JS_TOKEN_RE).finditer(code):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        if kind == "newline":
+            if tokens and tokens[-1] != NEWLINE:
+                tokens.append(NEWLINE)
+            continue
+        tokens.append(match.group())
+    if language != "python":
+        tokens = _semicolons_as_line_ends(tokens)
+    return tokens
+
+
+def _semicolons_as_line_ends(tokens: List[str]) -> List[str]:
+    """Treats JS statement-terminating semicolons as line ends.
+
+    With ASI they are optional, and formatters add, remove or split lines at them,
+    so keeping them as tokens would make a pure reformat look like a change.
+    Semicolons inside parentheses or brackets (for (;;)) are kept.
+    """
+    normalized: List[str] = []
+    nesting = 0
+    for token in tokens:
+        if token in ("(", "["):
+            nesting += 1
+        elif token in (")", "]"):
+            nesting = max(0, nesting - 1)
+        elif token == ";" and nesting == 0:
+            token = NEWLINE
+        if token == NEWLINE and (not normalized or normalized[-1] == NEWLINE):
+            continue
+        normalized.append(token)
+    return normalized
+
+
+def _python_statements(code: str) -> Optional[List[Tuple[Statement, str]]]:
+    """Logical lines of Python with their enclosing function, or None if tokenize fails.
+
+    Each statement starts with its indentation depth, since moving a statement
+    into or out of a block changes what it does.
+    """
+    statements: List[Tuple[Statement, str]] = []
+    functions: List[Tuple[int, str]] = [] # (indent level of the def, name)
+    indent = 0
+    current: List[str] = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in (tokenize.COMMENT, tokenize.NL, tokenize.ENDMARKER):
+                continue
+            if token.type == tokenize.INDENT:
+                indent += 1
+                continue
+            if token.type == tokenize.DEDENT:
+                indent -= 1
+                while functions and functions[-1][0] >= indent:
+                    functions.pop()
+                continue
+            if token.type == tokenize.NEWLINE:
+                if current:
+                    names = [t for t in current if t != "async"]
+                    if len(names) > 1 and names[0] == "def":
+                        functions.append((indent, names[1]))
+                    statement = (f"<indent:{indent}>", *current)
+                    statements.append((statement, functions[-1][1] if functions else MODULE_SCOPE))
+                current = []
+                continue
+            current.append(token.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    if current:
+        statements.append(((f"<indent:{indent}>", *current), functions[-1][1] if functions else MODULE_SCOPE))
+    return statements
+
+
+def _function_name(statement: Statement) -> Optional[str]:
+    """Name of the function a block-opening JS statement defines, if it defines one."""
+    words = [t for t in statement if t not in ("async", "export", "default", "static", "get", "set")]
+    if not words or words[0] in CONTROL_KEYWORDS:
+        return None
+    if "function" in words:
+        index = words.index("function")
+        following = words[index + 1] if index + 1 < len(words) else "("
+        if following not in ("(", "*"):
+            return following
+        # Anonymous function assigned to a name: const name = function () {
+        return words[index - 2] if index >= 2 and words[index - 1] in ("=", ":") else "<anonymous>"
+    if "=>" in words:
+        if words[0] in ("const", "let", "var") and len(words) > 1:
+            return words[1]
+        if len(words) > 1 and words[1] in ("=", ":"):
+            return words[0]
+        return "<anonymous>"
+    # Method shorthand: name(args) {
+    if len(words) >= 3 and re.match(r"^[A-Za-z_$][\w$]*$", words[0]) and words[1] == "(" and words[-2] == ")":
+        return words[0]
+    return None
+
+
+def _js_statements(tokens: List[str]) -> List[Tuple[Statement, str]]:
+    """Splits JS tokens into statements (at { }, line ends and top-level ;) with their enclosing function."""
+    statements: List[Tuple[Statement, str]] = []
+    functions: List[Tuple[int, str]] = [] # (brace depth outside the function body, name)
+    depth = 0
+    current: List[str] = []
+
+    def emit():
+        if current:
+            statements.append((tuple(current), functions[-1][1] if functions else MODULE_SCOPE))
+            current.clear()
+
+    for token in tokens:
+        if token == NEWLINE:
+            if current and current[-1] not in CONTINUATION_TOKENS:
+                emit()
+            continue
+        if token == "}":
+            emit()
+            depth = max(0, depth - 1)
+            while functions and functions[-1][0] >= depth:
+                functions.pop()
+            statements.append((("}",), functions[-1][1] if functions else MODULE_SCOPE))
+            continue
+        current.append(token)
+        if token == ";":
+            emit()
+        elif token == "{":
+            name = _function_name(tuple(current))
+            if name is not None:
+                functions.append((depth, name))
+            emit()
+            depth += 1
+    emit()
+    return statements
+
+
+def _statements(code: str, language: str) -> Tuple[List[str], List[Tuple[Statement, str]]]:
+    """Comment- and whitespace-free token stream plus statements of the code."""
+    if language == "python":
+        statements = _python_statements(code)
+        if statements is not None:
+            return [t for statement, _ in statements for t in statement], statements
+    tokens = _regex_tokens(code, language)
+    return [t for t in tokens if t != NEWLINE], _js_statements(tokens)
+
+
+def classify_change(old_code: str, new_code: str, language: Optional[str] = None) -> ChangeSummary:
+    """Measures the semantic size of an edit, ignoring whitespace, formatting and comments."""
+    language = language or detect_language(new_code or old_code)
+    old_tokens, old_statements = _statements(old_code, language)
+    new_tokens, new_statements = _statements(new_code, language)
+    if old_tokens == new_tokens:
+        return ChangeSummary(language, True, 0, set())
+
+    matcher = difflib.SequenceMatcher(
+        a=[s for s, _ in old_statements], b=[s for s, _ in new_statements], autojunk=False
+    )
+    statements_changed = 0
+    functions_touched: Set[str] = set()
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        statements_changed += max(i2 - i1, j2 - j1)
+        functions_touched.update(function for _, function in old_statements[i1:i2])
+        functions_touched.update(function for _, function in new_statements[j1:j2])
+    # Token streams differ but statements line up (e.g. re-indented Python block): still a real change
+    return ChangeSummary(language, False, max(statements_changed, 1), functions_touched)
@@ -0,0 +1,75 @@
+import ast
+import re
+from typing import List, NamedTuple
+
+# Top-level lines that start a new function/class block in JS/TS (and Python, for the fallback path)
+BLOCK_START_RE = re.compile(
+    r"^(export\s+(default\s+)?)?(async\s+)?(function\b|class\b|def\b)"
+    r"|^(export\s+)?(const|let|var)\s+[\w$]+\s*=\s*(async\s*)?(function\b|\(|[\w$]+\s*=>)"
+)
+
+
+class CodeChunk(NamedTuple):
+    text: str
+    start_line: int # 1-based, inclusive
+    end_line: int
+
+
+def _split_long(lines: List[str], start_line: int, max_lines: int) -> List[CodeChunk]:
+    chunks = []
+    for offset in range(0, len(lines), max_lines):
+        part = lines[offset:offset + max_lines]
+        text = "\n".join(part).strip("\n")
+        if text.strip():
+            chunks.append(CodeChunk(text, start_line + offset, start_line + offset + len(part) - 1))
+    return chunks
+
+
+def _python_boundaries(code: str) -> List[int] | None:
+    """Start lines (0-based) of top-level Python definitions, or None if the code is not valid Python."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    boundaries = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # Definitions (with their decorators) get their own chunk; the statements between them are grouped
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+            boundaries.extend((start, node.end_lineno))
+    return boundaries
+
+
+def _brace_boundaries(lines: List[str]) -> List[int]:
+    """Start lines of top-level blocks in brace-delimited code (JS/TS), tracked by brace depth."""
+    boundaries = []
+    depth = 0
+    for index, line in enumerate(lines):
+        if depth == 0 and BLOCK_START_RE.match(line):
+            boundaries.append(index)
+        # Good enough for chunking: braces inside strings/comments only shift chunk edges
+        previous_depth = depth
+        depth = max(0, depth + line.count("{") - line.count("}"))
+        if previous_depth > 0 and depth == 0:
+            boundaries.append(index + 1)
+    return boundaries
+
+
+def chunk_code(code: str, max_lines: int = 60) -> List[CodeChunk]:
+    """Splits source code into function/class-sized chunks for embedding.
+
+    Python is split on top-level definitions via ast; anything else falls back to
+    top-level block detection by brace depth. Chunks longer than max_lines are split.
+    """
+    lines = code.splitlines()
+    if not lines:
+        return []
+    boundaries = _python_boundaries(code)
+    if boundaries is None:
+        boundaries = _brace_boundaries(lines)
+    edges = sorted({0, len(lines), *[b for b in boundaries if 0 < b < len(lines)]})
+
+    chunks: List[CodeChunk] = []
+    for start, end in zip(edges, edges[1:]):
+        chunks.extend(_split_long(lines[start:end], start + 1, max_lines))
+    return chunks
@@ -0,0 +1,52 @@
+import logging
+from sqlalchemy import LargeBinary, type_coerce, update
+from sqlalchemy.future import select
+from app import models
+from app.config import settings
+from app.database import AsyncSessionFactory
+from app.db_types import is_compressed
+
+logger = logging.getLogger(__name__)
+
+# (model, primary key column, compressed text column)
+COMPRESSED_COLUMNS = [
+    (models.CodeSnapshot, models.CodeSnapshot.id, models.CodeSnapshot.code_content),
+    (models.Report, models.Report.id, models.Report.report_content),
+]
+
+
+async def compress_existing_rows(batch_size: int = 500) -> dict:
+    """Rewrites uncompressed rows above the threshold so CompressedText compresses them.
+
+    Walks each table by primary key in batches with one short transaction per batch,
+    so it can run against a live database. Returns the number of rows rewritten per table.
+    """
+    rewritten = {}
+    for model, pk_column, column in COMPRESSED_COLUMNS:
+        table_name = model.__tablename__
+        rewritten[table_name] = 0
+        after_id = 0
+        while True:
+            async with AsyncSessionFactory() as db:
+                # Read the stored bytes, bypassing CompressedText's decoding
+                result = await db.execute(
+                    select(pk_column, type_coerce(column, LargeBinary).label("raw"))
+                    .where(pk_column > after_id, column.is_not(None))
+                    .order_by(pk_column.asc())
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                after_id = rows[-1][0]
+                for row_id, raw in rows:
+                    raw = bytes(raw)
+                    if is_compressed(raw) or len(raw) < settings.compression_threshold_bytes:
+                        continue
+                    await db.execute(
+                        update(model).where(pk_column == row_id).values({column.key: raw.decode("utf-8")})
+                    )
+                    rewritten[table_name] += 1
+                await db.commit()
+        logger.info("Compressed %d existing rows in %s", rewritten[table_name], table_name)
+    return rewritten
@@ -4,6 +4,9 @@ from langchain_core.documents import Document
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from app.services.vector_db_client import vector_db_client # Import the singleton client
 from app.database import get_redis_chat_history
+from app.metrics import track_stage
+from app.config import settings
+from app.services.problem_service import problem_hash
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,6 +27,29 @@ class ContextManager:
             formatted.append(f"{role}: {msg.content}")
         return "\n".join(formatted)
 
+    async def _retrieve_relevant_context(self, session_id: str, problem_statement: str, query: str) -> str:
+        """Looks up earlier answered questions of this session similar to the query.
+
+        Returns a prompt section, or an empty string when retrieval is disabled, finds
+        nothing or fails (retrieval must never block question generation).
+        """
+        if not settings.context_retrieval_enabled or not query.strip():
+            return ""
+        try:
+            with track_stage("context_retrieval"):
+                docs: List[Document] = await vector_db_client.similarity_search(
+                    query=query,
+                    k=MAX_SIMILARITY_RESULTS,
+                    # problem_hash first: it selects the partition to scan in the numpy backend
+                    filter_metadata={"$and": [{"problem_hash": problem_hash(problem_statement)}, {"session_id": int(session_id)}, {"kind": "qa"}]},
+                )
+        except Exception as e:
+            logger.warning("Context retrieval failed for session %s: %s", session_id, e)
+            return ""
+        if not docs:
+            return ""
+        return "\nRelated earlier questions and answers in this session:\n" + "\n---\n".join(doc.page_content for doc in docs) + "\n"
+
     def _calculate_diff(self, old_code: Optional[str], new_code: str) -> str:
         """Calculates unified diff between old and new code."""
         if old_code is None:
@@ -42,20 +68,21 @@ class ContextManager:
     ) -> Dict[str, Any]:
         """Prepares context for the question generation prompt."""
         history_manager = get_redis_chat_history(session_id)
-        chat_history_messages = await history_manager.aget_messages()
+        with track_stage("history_fetch"):
+            chat_history_messages = await history_manager.aget_messages()
         formatted_history = self._format_history(chat_history_messages)
 
-        diff = self._calculate_diff(previous_code, current_code)
+        with track_stage("context_diff"):
+            diff = self._calculate_diff(previous_code, current_code)
 
-        # Potential: Add similarity search based on diff or code snippet
-        # relevant_docs = await vector_db_client.similarity_search(query=diff, k=1, filter_metadata={...})
+        relevant_context = await self._retrieve_relevant_context(session_id, problem_statement, diff or current_code)
 
         context = {
             "problem_statement": problem_statement,
             "code": current_code,
             "diff": diff if diff else "No changes detected or first submission.",
             "history": formatted_history,
-            # "relevant_docs": relevant_docs # Add if similarity search is used
+            "relevant_context": relevant_context,
         }
         return context
 
@@ -66,11 +93,11 @@ class ContextManager:
         history_manager = get_redis_chat_history(session_id)
         # Get history *before* the current question/response pair if possible
         # This might require more sophisticated history management
-        chat_history_messages = await history_manager.aget_messages()
+        with track_stage("history_fetch"):
+            chat_history_messages = await history_manager.aget_messages()
         formatted_history = self._format_history(chat_history_messages)
 
-        # Potential: Add similarity search based on question/response
-        # relevant_docs = await vector_db_client.similarity_search(query=f"{question}\n{response}", k=2)
+        relevant_context = await self._retrieve_relevant_context(session_id, problem_statement, f"{question}\n{response}")
 
         context = {
             "problem_statement": problem_statement,
@@ -78,7 +105,7 @@ class ContextManager:
             "history": formatted_history,
             "question": question,
             "response": response,
-            # "relevant_docs": relevant_docs
+            "relevant_context": relevant_context,
         }
         return context
 
@@ -88,7 +115,8 @@ class ContextManager:
         """Prepares context for the final report generation prompt."""
         history_manager = get_redis_chat_history(session_id)
         # Get the full history for the report
-        full_history_messages = await history_manager.aget_messages()
+        with track_stage("history_fetch"):
+            full_history_messages = await history_manager.aget_messages()
         # Format history including all details (maybe custom formatting needed)
         formatted_full_history = self._format_history(full_history_messages) # Use basic for now
 
@@ -102,14 +130,16 @@ class ContextManager:
     async def add_user_message(self, session_id: str, message: str):
         """Adds a user message to the chat history."""
         history_manager = get_redis_chat_history(session_id)
-        history_manager.add_user_message(message)
-        logger.debug(f"Added user message for session {session_id}")
+        with track_stage("history_append"):
+            history_manager.add_user_message(message)
+        logger.debug("Added user message for session %s", session_id)
 
     async def add_ai_message(self, session_id: str, message: str):
         """Adds an AI message to the chat history."""
         history_manager = get_redis_chat_history(session_id)
-        history_manager.add_ai_message(message)
-        logger.debug(f"Added AI message for session {session_id}")
+        with track_stage("history_append"):
+            history_manager.add_ai_message(message)
+        logger.debug("Added AI message for session %s", session_id)
 
     async def get_full_history_summary(self, session_id: str) -> str:
         # Implementation of get_full_history_summary method
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+from app.config import settings
+from app.database import AsyncSessionFactory
+from app.metrics import EMBEDDING_INDEX_ITEMS, set_queue_depth, track_stage
+from app.services import session_service, problem_service
+from app.services.code_chunker import chunk_code
+from app.services.vector_db_client import vector_db_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_NAME = "embedding_index"
+MAX_TRACKED_SESSIONS = 1024 # Per-session bookkeeping (problem hash, indexed chunks) is LRU-bounded
+
+
+class IndexItem(NamedTuple):
+    session_id: int
+    kind: str # "code" (a snapshot) or "qa" (an answered question)
+    source_id: int # Snapshot id or question interaction id
+    text: str
+    extra_metadata: Dict[str, Any]
+
+
+class EmbeddingIndexer:
+    """Background indexer feeding code snapshots and answered questions into the vector store.
+
+    Producers call submit_* from the request path; these never await and never block.
+    Snapshots are coalesced per session: while one is waiting, a newer snapshot of the
+    same session replaces it instead of taking another queue slot, so a slow embedder
+    only ever indexes the latest code. The queue is bounded and drops new items when
+    full. A single worker drains the queue in batches, one vector store call per batch.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # session_id -> (snapshot_id, code) of the snapshot waiting to be indexed
+        self._pending_snapshots: Dict[int, tuple[int, str]] = {}
+        # session_id -> (problem hash, hashes of chunks already indexed for the session)
+        self._sessions: "OrderedDict[int, tuple[str, Set[str]]]" = OrderedDict()
+
+    def start(self):
+        if not settings.embedding_indexer_enabled or self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.embedding_queue_max_size)
+        self._worker = asyncio.create_task(self._run(), name="embedding-indexer")
+        logger.info("Embedding indexer started (queue size %d, batch size %d)", settings.embedding_queue_max_size, settings.embedding_batch_size)
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        self._queue = None
+        self._pending_snapshots.clear()
+
+    def submit_snapshot(self, session_id: int, snapshot_id: int, code: str) -> bool:
+        """Queues a code snapshot for indexing. Returns False if it was dropped."""
+        if self._queue is None:
+            return False
+        if session_id in self._pending_snapshots:
+            self._pending_snapshots[session_id] = (snapshot_id, code)
+            EMBEDDING_INDEX_ITEMS.labels("superseded").inc()
+            return True
+        # The queued item is a placeholder; the latest pending snapshot is read when it is processed
+        if not self._offer(IndexItem(session_id, "code", snapshot_id, "", {})):
+            return False
+        self._pending_snapshots[session_id] = (snapshot_id, code)
+        return True
+
+    def submit_answer(self, session_id: int, interaction_id: int, question: str, response: str, score: float) -> bool:
+        """Queues an answered question (with its evaluation score) for indexing. Returns False if it was dropped."""
+        text = f"Question: {question}\nAnswer: {response}"
+        return self._offer(IndexItem(session_id, "qa", interaction_id, text, {"score": score}))
+
+    def forget_session(self, session_id: int):
+        """Releases the indexed-chunk set of a session whose client is gone (re-adding is idempotent)."""
+        if session_id not in self._pending_snapshots:
+            self._sessions.pop(session_id, None)
+
+    def _offer(self, item: IndexItem) -> bool:
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            EMBEDDING_INDEX_ITEMS.labels("dropped").inc()
+            logger.debug("Embedding queue full, dropped %s item %s of session %s", item.kind, item.source_id, item.session_id)
+            return False
+        EMBEDDING_INDEX_ITEMS.labels("queued").inc()
+        set_queue_depth(QUEUE_NAME, self._queue.qsize())
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + settings.embedding_flush_interval_seconds
+            while len(batch) < settings.embedding_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            set_queue_depth(QUEUE_NAME, self._queue.qsize())
+            try:
+                await self._index_batch(batch)
+            except Exception as e:
+                EMBEDDING_INDEX_ITEMS.labels("failed").inc(len(batch))
+                logger.error("Failed to index batch of %d items: %s", len(batch), e, exc_info=True)
+
+    async def _session_state(self, session_id: int) -> Optional[tuple[str, Set[str]]]:
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+            return state
+        async with AsyncSessionFactory() as db:
+            problem_statement = await session_service.get_problem_statement(db, session_id)
+        if problem_statement is None:
+            return None
+        state = self._sessions[session_id] = (problem_service.problem_hash(problem_statement), set())
+        if len(self._sessions) > MAX_TRACKED_SESSIONS:
+            self._sessions.popitem(last=False)
+        return state
+
+    async def _index_batch(self, batch: List[IndexItem]):
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        indexed = 0
+        for item in batch:
+            if item.kind == "code":
+                pending = self._pending_snapshots.pop(item.session_id, None)
+                if pending is None:
+                    continue
+                item = item._replace(source_id=pending[0], text=pending[1])
+            state = await self._session_state(item.session_id)
+            if state is None:
+                continue
+            problem, indexed_chunks = state
+            indexed += 1
+            if item.kind == "code":
+                chunks = chunk_code(item.text, settings.embedding_chunk_max_lines)
+            else:
+                chunks = [(item.text, None, None)]
+            for index, (text, start_line, end_line) in enumerate(chunks):
+                # Unchanged functions recur in every snapshot of a session; embed each only once
+                chunk_id = hashlib.sha256(f"{item.session_id}:{item.kind}:{text}".encode("utf-8")).hexdigest()
+                if chunk_id in indexed_chunks or chunk_id in ids:
+                    continue
+                metadata = {
+                    "session_id": item.session_id,
+                    "problem_hash": problem,
+                    "kind": item.kind,
+                    "source_id": item.source_id,
+                    "chunk_index": index,
+                    **item.extra_metadata,
+                }
+                if start_line is not None:
+                    metadata.update(start_line=start_line, end_line=end_line)
+                texts.append(text)
+                metadatas.append(metadata)
+                ids.append(chunk_id)
+        if texts:
+            with track_stage("embedding_index_batch"):
+                await vector_db_client.add_documents(texts, metadatas, ids=ids)
+            for metadata, chunk_id in zip(metadatas, ids):
+                state = self._sessions.get(metadata["session_id"])
+                if state is not None:
+                    state[1].add(chunk_id)
+        EMBEDDING_INDEX_ITEMS.labels("indexed").inc(indexed)
+        logger.debug("Indexed %d items as %d chunks", indexed, len(texts))
+
+
+embedding_indexer = EmbeddingIndexer()
@@ -1,8 +1,13 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionFactory
 from app import schemas, models
-from app.services import interaction_service, trigger_logic
+from app.services import interaction_service, session_service, trigger_logic
+from app.services.embedding_indexer import embedding_indexer
+from app.services.idempotency import idempotency_store
 from app.services.agent_orchestrator import agent_orchestrator # Import the singleton orchestrator
 from app.websocket_manager import manager # Import the singleton manager
+from app.metrics import track_stage, track_queue
+from app.tracing import tracer
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,10 +16,13 @@ async def process_websocket_message(
     session_id_str: str, # From WebSocket path
     message_type: str,
     payload: schemas.CodeUpdatePayload | schemas.ResponseSubmittedPayload,
-    db: AsyncSession,
     # agent_orchestrator: AgentOrchestrator # Pass orchestrator instance
 ):
-    """Processes incoming messages from the WebSocket connection."""
+    """Processes incoming messages from the WebSocket connection.
+
+    Each unit of work opens its own short-lived DB session from AsyncSessionFactory
+    and closes it before handing off to the orchestrator's LLM calls.
+    """
     try:
         session_id = int(session_id_str) # Convert session_id from path param to int
     except ValueError:
@@ -22,100 +30,149 @@ async def process_websocket_message(
         await manager.send_personal_message(session_id_str, {"error": "Invalid session ID format"})
         return
 
+    # Client retries after a reconnect resend a response with the same client_message_id; don't
+    # evaluate it twice. Code updates carry the whole editor state, so a redelivered one is harmless.
+    client_message_id = payload.client_message_id if isinstance(payload, schemas.ResponseSubmittedPayload) else None
+    claim = await idempotency_store.claim(session_id, message_type, client_message_id)
+    if claim.duplicate:
+        logger.info("Ignoring duplicate %s %s for session %s", message_type, client_message_id, session_id)
+        if claim.result is not None:
+            # Same frame (and seq) as the first delivery produced
+            await manager.send_personal_message(session_id_str, claim.result, journal=False)
+        return
+
     try: # Add top-level try-except for processing logic
-        if message_type == "code_update":
-            if not isinstance(payload, schemas.CodeUpdatePayload):
-                 logger.error("Payload type mismatch for code_update") # Should not happen if routing is correct
-                 return
+        with track_queue("ws_messages"), track_stage(f"process_{message_type}"), \
+                tracer.start_as_current_span(f"event_processor.{message_type}"):
+            result = await _dispatch_message(session_id, session_id_str, message_type, payload)
+        if result is None:
+            await idempotency_store.release(session_id, client_message_id)
+        else:
+            await idempotency_store.complete(session_id, client_message_id, result)
+    except Exception as e:
+        await idempotency_store.release(session_id, client_message_id)
+        logger.error(f"Unhandled exception during processing message for session {session_id_str}: {e}", exc_info=True)
+        # Notify the client about the unexpected error
+        try:
+            await manager.send_personal_message(session_id_str, {
+                "error": f"An unexpected internal error occurred while processing your '{message_type}' request. Please try again or contact support if the issue persists."
+            })
+        except Exception as ws_err:
+            logger.error(f"Failed to send internal error notification via WebSocket for session {session_id_str}: {ws_err}")
+
+async def _dispatch_message(
+    session_id: int,
+    session_id_str: str,
+    message_type: str,
+    payload: schemas.CodeUpdatePayload | schemas.ResponseSubmittedPayload,
+) -> Optional[dict]:
+    """Routes a validated message to its handler; errors propagate to process_websocket_message.
 
-            logger.info(f"Processing code_update for session {session_id}")
-            current_code = payload.code
+    Returns the frame to resend for duplicates of this message ({} if there is none),
+    or None if it was not handled and a retry should be processed again.
+    """
+    if message_type == "code_update":
+        if not isinstance(payload, schemas.CodeUpdatePayload):
+             logger.error("Payload type mismatch for code_update") # Should not happen if routing is correct
+             return
 
+        logger.debug("Processing code_update for session %s", session_id)
+        current_code = payload.code
+
+        async with AsyncSessionFactory() as db:
             # 1. Get the *previous* interaction with a snapshot (before saving the current one)
             # This interaction holds the 'old_code' for comparison.
-            previous_interaction_with_snapshot = await interaction_service.get_last_interaction_with_snapshot(db, session_id)
-            logger.debug(f"Previous interaction with snapshot found: ID {previous_interaction_with_snapshot.id if previous_interaction_with_snapshot else 'None'}")
+            with track_stage("load_previous_snapshot"):
+                previous_interaction_with_snapshot = await interaction_service.get_last_interaction_with_snapshot(db, session_id)
+                # Before the first interaction, trigger timing (and starvation) counts from the session start
+                session_started_at = None
+                if previous_interaction_with_snapshot is None:
+                    session_started_at = await session_service.get_start_time(db, session_id)
 
             # 2. Save the new interaction and snapshot for the current update
-            interaction_record = await interaction_service.create_interaction(
-                db,
-                schemas.InteractionCreate(
-                    session_id=session_id,
-                    interaction_type="code_snapshot",
-                    data={"message": "Code update received"} # Store minimal data for now
+            with track_stage("persist_snapshot"):
+                interaction_record = await interaction_service.create_interaction(
+                    db,
+                    schemas.InteractionCreate(
+                        session_id=session_id,
+                        interaction_type="code_snapshot",
+                        data={"message": "Code update received"} # Store minimal data for now
+                    )
                 )
-            )
-            await interaction_service.create_code_snapshot(
-                db,
-                schemas.CodeSnapshotCreate(
-                    interaction_id=interaction_record.id,
-                    code_content=current_code
+                snapshot = await interaction_service.create_code_snapshot(
+                    db,
+                    schemas.CodeSnapshotCreate(
+                        interaction_id=interaction_record.id,
+                        code_content=current_code
+                    )
                 )
-            )
 
-            # 3. Check trigger logic using the previous interaction state
-            # Find the code content associated with the last_interaction (if it has a snapshot)
-            # previous_code_content = None # No longer needed here
-            # if last_interaction and last_interaction.code_snapshot:
-            #      previous_code_content = last_interaction.code_snapshot.code_content
+        # Indexing happens in the background; this only enqueues (or drops under backpressure)
+        embedding_indexer.submit_snapshot(session_id, snapshot.id, current_code)
+
+        # 3. Check trigger logic using the previous interaction state
+        # Find the code content associated with the last_interaction (if it has a snapshot)
+        # previous_code_content = None # No longer needed here
+        # if last_interaction and last_interaction.code_snapshot:
+        #      previous_code_content = last_interaction.code_snapshot.code_content
 
-            should_prompt = await trigger_logic.should_trigger_interaction(
+        with track_stage("trigger_decision"), tracer.start_as_current_span("trigger_decision") as span:
+            decision = await trigger_logic.should_trigger_interaction(
+                session_id=session_id,
                 current_code=current_code,
-                last_interaction=previous_interaction_with_snapshot # Pass the *previous* interaction
+                last_interaction=previous_interaction_with_snapshot, # Pass the *previous* interaction
+                session_started_at=session_started_at,
             )
+            span.set_attribute("trigger.fired", decision.fire)
+            span.set_attribute("trigger.speculate", decision.speculate)
 
-            if should_prompt:
-                logger.info(f"Triggering interaction for session {session_id}")
-                # 4. Call AgentOrchestrator
-                # Pass the previous code content (if available) for diff calculation inside orchestrator
-                previous_code = previous_interaction_with_snapshot.code_snapshot.code_content if previous_interaction_with_snapshot and previous_interaction_with_snapshot.code_snapshot else ""
-                await agent_orchestrator.request_question(
-                    session_id=session_id,
-                    current_code=current_code,
-                    previous_code=previous_code,
-                    db=db
-                )
-            else:
-                logger.info(f"Interaction trigger condition not met for session {session_id}")
-                # Optionally send an ack back?
-                # await manager.send_personal_message(session_id_str, {"status": "code_update_processed"})
+        # Pass the previous code content (if available) for diff calculation inside orchestrator
+        previous_code = previous_interaction_with_snapshot.code_snapshot.code_content if previous_interaction_with_snapshot and previous_interaction_with_snapshot.code_snapshot else ""
+        if decision.fire:
+            logger.info("Triggering interaction for session %s", session_id)
+            # 4. Call AgentOrchestrator
+            await agent_orchestrator.request_question(
+                session_id=session_id,
+                current_code=current_code,
+                previous_code=previous_code
+            )
+        elif decision.speculate:
+            logger.debug("Session %s is close to the trigger thresholds; speculating a question", session_id)
+            await agent_orchestrator.speculate_question(session_id, current_code, previous_code)
+        else:
+            logger.debug("Interaction trigger condition not met for session %s", session_id)
+            # Optionally send an ack back?
+            # await manager.send_personal_message(session_id_str, {"status": "code_update_processed"})
+        # Any question went out through the journal, so a duplicate needs nothing resent
+        return {}
 
-        elif message_type == "response_submitted":
-            if not isinstance(payload, schemas.ResponseSubmittedPayload):
-                 logger.error("Payload type mismatch for response_submitted")
-                 return
+    elif message_type == "response_submitted":
+        if not isinstance(payload, schemas.ResponseSubmittedPayload):
+             logger.error("Payload type mismatch for response_submitted")
+             return
 
-            logger.info(f"Processing response_submitted for session {session_id}")
-            response_payload: schemas.ResponseSubmittedPayload = payload # Type assertion
+        logger.info("Processing response_submitted for session %s", session_id)
+        response_payload: schemas.ResponseSubmittedPayload = payload # Type assertion
 
+        async with AsyncSessionFactory() as db:
             # 1. Save the response interaction
-            await interaction_service.create_interaction(
-                db,
-                schemas.InteractionCreate(
-                    session_id=session_id,
-                    interaction_type="response_received",
-                    data={"response": response_payload.response, "original_interaction_id": response_payload.interaction_id}
+            with track_stage("persist_response"):
+                await interaction_service.create_interaction(
+                    db,
+                    schemas.InteractionCreate(
+                        session_id=session_id,
+                        interaction_type="response_received",
+                        data={"response": response_payload.response, "original_interaction_id": response_payload.interaction_id}
+                    )
                 )
-            )
 
-            # 2. Call AgentOrchestrator for evaluation (Phase 5)
-            await agent_orchestrator.evaluate_response(
-                session_id=session_id,
-                response_payload=response_payload,
-                db=db
-            )
+        # 2. Call AgentOrchestrator for evaluation (Phase 5)
+        return await agent_orchestrator.evaluate_response(
+            session_id=session_id,
+            response_payload=response_payload
+        )
 
-        else:
-            # This case should ideally be handled in the websocket router already
-            logger.warning(f"process_websocket_message called with unknown message_type: {message_type}")
-            await manager.send_personal_message(session_id_str, {"error": f"Internal error: Unknown message type '{message_type}' reached processor."})
-
-    except Exception as e:
-        logger.error(f"Unhandled exception during processing message for session {session_id_str}: {e}", exc_info=True)
-        # Notify the client about the unexpected error
-        try:
-            await manager.send_personal_message(session_id_str, {
-                "error": f"An unexpected internal error occurred while processing your '{message_type}' request. Please try again or contact support if the issue persists."
-            })
-        except Exception as ws_err:
-            logger.error(f"Failed to send internal error notification via WebSocket for session {session_id_str}: {ws_err}") 
\ No newline at end of file
+    else:
+        # This case should ideally be handled in the websocket router already
+        logger.warning(f"process_websocket_message called with unknown message_type: {message_type}")
+        await manager.send_personal_message(session_id_str, {"error": f"Internal error: Unknown message type '{message_type}' reached processor."})
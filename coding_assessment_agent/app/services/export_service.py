@@ -0,0 +1,164 @@
+import datetime
+import json
+import logging
+import zlib
+from typing import AsyncIterator, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app import models
+from app.database import AsyncSessionFactory, ReplicaSessionFactory
+
+logger = logging.getLogger(__name__)
+
+# Sessions are exported in keyset-paginated batches; within a batch, interaction rows
+# are streamed from a server-side cursor. Memory is bounded by one batch of session
+# headers plus the interactions of the session currently being assembled.
+SESSION_BATCH_SIZE = 100
+INTERACTION_YIELD_PER = 500
+
+
+def _export_session_factory():
+    # Bulk reads belong on the replica when one is configured
+    return ReplicaSessionFactory or AsyncSessionFactory
+
+
+def _iso(value: Optional[datetime.datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+async def _session_batch(
+    db: AsyncSession,
+    after_id: int,
+    start: Optional[datetime.datetime],
+    end: Optional[datetime.datetime],
+    problem: Optional[str],
+):
+    stmt = select(
+        models.Session.id, models.Session.start_time, models.Session.end_time,
+        models.Problem.statement.label("problem_statement"), models.Problem.content_hash.label("problem_hash"),
+    ).join(models.Problem, models.Problem.id == models.Session.problem_id).where(models.Session.id > after_id)
+    if start is not None:
+        stmt = stmt.where(models.Session.start_time >= start)
+    if end is not None:
+        stmt = stmt.where(models.Session.start_time < end)
+    if problem:
+        # Escape LIKE wildcards so the filter is a plain substring match
+        escaped = problem.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        stmt = stmt.where(models.Problem.statement.ilike(f"%{escaped}%", escape="\\"))
+    result = await db.execute(stmt.order_by(models.Session.id.asc()).limit(SESSION_BATCH_SIZE))
+    return result.all()
+
+
+async def _reports_for(db: AsyncSession, session_ids: List[int], include_report_text: bool) -> dict:
+    columns = [models.Report.session_id, models.Report.generation_time, models.Report.scores]
+    if include_report_text:
+        columns.append(models.Report.report_content)
+    result = await db.execute(select(*columns).where(models.Report.session_id.in_(session_ids)))
+    reports = {}
+    for row in result:
+        report = {"generation_time": _iso(row.generation_time), "scores": row.scores}
+        if include_report_text:
+            report["report_content"] = row.report_content
+        reports[row.session_id] = report
+    return reports
+
+
+def _session_record(session_row, report: Optional[dict]) -> dict:
+    return {
+        "session_id": session_row.id,
+        "start_time": _iso(session_row.start_time),
+        "end_time": _iso(session_row.end_time),
+        "problem_statement": session_row.problem_statement,
+        "problem_hash": session_row.problem_hash,
+        "interactions": [],
+        "evaluations": [],
+        "report": report,
+    }
+
+
+async def iter_session_records(
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    problem: Optional[str] = None,
+    include_code: bool = True,
+    include_report_text: bool = True,
+) -> AsyncIterator[dict]:
+    """Yields one dict per session (with interactions, evaluations and report scores) in id order."""
+    async with _export_session_factory()() as db:
+        after_id = 0
+        while True:
+            sessions = await _session_batch(db, after_id, start, end, problem)
+            if not sessions:
+                return
+            after_id = sessions[-1].id
+            session_ids = [row.id for row in sessions]
+            reports = await _reports_for(db, session_ids, include_report_text)
+            records = {row.id: _session_record(row, reports.get(row.id)) for row in sessions}
+
+            columns = [
+                models.Interaction.id,
+                models.Interaction.session_id,
+                models.Interaction.timestamp,
+                models.Interaction.interaction_type,
+                models.Interaction.data,
+            ]
+            if include_code:
+                columns.append(models.CodeSnapshot.code_content)
+            stmt = (
+                select(*columns)
+                .where(models.Interaction.session_id.in_(session_ids))
+                .order_by(models.Interaction.session_id.asc(), models.Interaction.id.asc())
+                .execution_options(yield_per=INTERACTION_YIELD_PER)
+            )
+            if include_code:
+                stmt = stmt.outerjoin(models.CodeSnapshot, models.CodeSnapshot.interaction_id == models.Interaction.id)
+
+            # Records are emitted as soon as the stream moves past their session
+            pending = iter(session_ids)
+            current_id = next(pending)
+            stream = await db.stream(stmt)
+            async for row in stream:
+                while row.session_id != current_id:
+                    yield records.pop(current_id)
+                    current_id = next(pending)
+                record = records[current_id]
+                data = row.data or {}
+                interaction = {
+                    "interaction_id": row.id,
+                    "timestamp": _iso(row.timestamp),
+                    "interaction_type": row.interaction_type,
+                    "data": data,
+                }
+                if include_code and row.code_content is not None:
+                    interaction["code"] = row.code_content
+                record["interactions"].append(interaction)
+                evaluation = data.get("evaluation")
+                if isinstance(evaluation, dict):
+                    record["evaluations"].append({
+                        "interaction_id": row.id,
+                        "question": data.get("question"),
+                        "evaluation_text": evaluation.get("text"),
+                        "score": evaluation.get("score"),
+                    })
+            # Sessions after the last streamed row (including those without interactions)
+            yield records.pop(current_id)
+            for session_id in pending:
+                yield records.pop(session_id)
+
+
+async def iter_ndjson(gzip: bool = False, **filters) -> AsyncIterator[bytes]:
+    """Serializes iter_session_records as NDJSON, optionally as an incremental gzip stream."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None # wbits=31 -> gzip container
+    exported = 0
+    async for record in iter_session_records(**filters):
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        exported += 1
+        if compressor is None:
+            yield line
+        else:
+            chunk = compressor.compress(line)
+            if chunk:
+                yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+    logger.info("Exported %d sessions", exported)
@@ -0,0 +1,71 @@
+import json
+import logging
+from typing import NamedTuple, Optional
+from app.config import settings
+from app.database import get_redis
+from app.metrics import IDEMPOTENCY_EVENTS
+
+logger = logging.getLogger(__name__)
+
+KEY = "ws_message:{session_id}:{client_message_id}"
+PENDING = "pending" # Stored while the first delivery is still being processed
+
+
+class Claim(NamedTuple):
+    duplicate: bool
+    result: Optional[dict] # Frame the first delivery produced, if it has finished and produced one
+
+
+class IdempotencyStore:
+    """Deduplicates inbound WebSocket messages by their client_message_id.
+
+    The first delivery claims the id with SET NX for IDEMPOTENCY_WINDOW_SECONDS;
+    when it finishes it stores the frame it sent back (if any) under the same key.
+    Redelivery within the window is reported as a duplicate together with that
+    frame. Redis errors fail open: the message is processed.
+    """
+
+    async def claim(self, session_id: int, message_type: str, client_message_id: Optional[str]) -> Claim:
+        if not client_message_id:
+            return Claim(False, None)
+        key = KEY.format(session_id=session_id, client_message_id=client_message_id)
+        try:
+            redis_client = await get_redis()
+            if await redis_client.set(key, PENDING, nx=True, ex=settings.idempotency_window_seconds):
+                IDEMPOTENCY_EVENTS.labels(message_type, "new").inc()
+                return Claim(False, None)
+            stored = await redis_client.get(key)
+        except Exception as e:
+            IDEMPOTENCY_EVENTS.labels(message_type, "error").inc()
+            logger.warning("Idempotency check failed for session %s, message %s: %s", session_id, client_message_id, e)
+            return Claim(False, None)
+        if stored is None:
+            # Expired between SET and GET; treat as a duplicate of a delivery that finished long ago
+            IDEMPOTENCY_EVENTS.labels(message_type, "duplicate").inc()
+            return Claim(True, None)
+        IDEMPOTENCY_EVENTS.labels(message_type, "duplicate_pending" if stored == PENDING else "duplicate").inc()
+        return Claim(True, None if stored == PENDING else json.loads(stored) or None)
+
+    async def complete(self, session_id: int, client_message_id: Optional[str], result: Optional[dict]):
+        """Stores the outcome of a claimed message for later duplicates."""
+        if not client_message_id:
+            return
+        key = KEY.format(session_id=session_id, client_message_id=client_message_id)
+        try:
+            redis_client = await get_redis()
+            await redis_client.set(key, json.dumps(result or {}), xx=True, keepttl=True)
+        except Exception as e:
+            logger.warning("Could not store result of message %s for session %s: %s", client_message_id, session_id, e)
+
+    async def release(self, session_id: int, client_message_id: Optional[str]):
+        """Forgets a claim whose processing failed, so a client retry is processed again."""
+        if not client_message_id:
+            return
+        try:
+            redis_client = await get_redis()
+            await redis_client.delete(KEY.format(session_id=session_id, client_message_id=client_message_id))
+        except Exception as e:
+            logger.warning("Could not release message %s for session %s: %s", client_message_id, session_id, e)
+
+
+idempotency_store = IdempotencyStore()
@@ -1,7 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from typing import List, Optional
 from sqlalchemy.orm import selectinload, joinedload
 from app import models, schemas
+from app.database import pin_to_primary
+import datetime
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +18,7 @@ async def create_interaction(
     db.add(new_interaction)
     await db.commit()
     await db.refresh(new_interaction)
+    await pin_to_primary(new_interaction.session_id)
     return new_interaction
 
 async def get_interaction(db: AsyncSession, interaction_id: int) -> models.Interaction | None:
@@ -36,6 +40,7 @@ async def update_interaction(
             setattr(interaction, key, value)
         await db.commit()
         await db.refresh(interaction)
+        await pin_to_primary(interaction.session_id)
     return interaction
 
 async def create_code_snapshot(
@@ -52,6 +57,7 @@ async def create_code_snapshot(
     db.add(new_snapshot)
     await db.commit()
     await db.refresh(new_snapshot)
+    await pin_to_primary(interaction.session_id)
     return new_snapshot
 
 async def get_code_snapshot(db: AsyncSession, snapshot_id: int) -> models.CodeSnapshot | None:
@@ -63,7 +69,7 @@ async def get_code_snapshot(db: AsyncSession, snapshot_id: int) -> models.CodeSn
 
 async def get_last_interaction(db: AsyncSession, session_id: int) -> models.Interaction | None:
     """Retrieves the most recent interaction for a given session, eager loading snapshot."""
-    logger.debug(f"Fetching last interaction for session {session_id}")
+    logger.debug("Fetching last interaction for session %s", session_id)
     result = await db.execute(
         select(models.Interaction)
         .where(models.Interaction.session_id == session_id)
@@ -72,12 +78,12 @@ async def get_last_interaction(db: AsyncSession, session_id: int) -> models.Inte
         .limit(1)
     )
     interaction = result.scalar_one_or_none()
-    logger.debug(f"Found last interaction: {interaction.id if interaction else 'None'}")
+    logger.debug("Found last interaction: %s", interaction.id if interaction else None)
     return interaction
 
 async def get_last_interaction_with_snapshot(db: AsyncSession, session_id: int) -> models.Interaction | None:
     """Retrieves the most recent interaction FOR A GIVEN SESSION that has an associated code snapshot."""
-    logger.debug(f"Fetching last interaction with snapshot for session {session_id}")
+    logger.debug("Fetching last interaction with snapshot for session %s", session_id)
     result = await db.execute(
         select(models.Interaction)
         .join(models.Interaction.code_snapshot)
@@ -87,5 +93,84 @@ async def get_last_interaction_with_snapshot(db: AsyncSession, session_id: int)
         .limit(1)
     )
     interaction = result.scalar_one_or_none()
-    logger.debug(f"Found last interaction with snapshot: {interaction.id if interaction else 'None'}")
+    logger.debug("Found last interaction with snapshot: %s", interaction.id if interaction else None)
     return interaction
+
+async def get_latest_code_before(db: AsyncSession, session_id: int, before: datetime.datetime) -> str | None:
+    """Retrieves the content of the most recent code snapshot of a session taken before the given time."""
+    result = await db.execute(
+        select(models.CodeSnapshot.code_content)
+        .join(models.Interaction, models.Interaction.id == models.CodeSnapshot.interaction_id)
+        .where(models.Interaction.session_id == session_id, models.Interaction.timestamp < before)
+        .order_by(models.Interaction.timestamp.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+async def has_interaction_of_type(db: AsyncSession, session_id: int, interaction_type: str) -> bool:
+    """Checks whether a session has at least one interaction of the given type."""
+    result = await db.execute(
+        select(models.Interaction.id)
+        .where(models.Interaction.session_id == session_id, models.Interaction.interaction_type == interaction_type)
+        .limit(1)
+    )
+    return result.scalar_one_or_none() is not None
+
+async def list_interactions(
+    db: AsyncSession,
+    session_id: int,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    include_snapshots: bool = True,
+    include_snapshot_bodies: bool = True,
+    interaction_type: Optional[str] = None,
+) -> List[schemas.InteractionListItem]:
+    """Lists a session's interactions in id order using a flat column query (no ORM objects).
+
+    Keyset pagination: pass the last seen id as `after_id`. Snapshot bodies are only
+    selected when requested, so listing a long session does not transfer its code text.
+    """
+    columns = [
+        models.Interaction.id,
+        models.Interaction.session_id,
+        models.Interaction.timestamp,
+        models.Interaction.interaction_type,
+        models.Interaction.data,
+    ]
+    if include_snapshots:
+        columns += [models.CodeSnapshot.id.label("snapshot_id"), models.CodeSnapshot.timestamp.label("snapshot_timestamp")]
+        if include_snapshot_bodies:
+            columns.append(models.CodeSnapshot.code_content)
+
+    stmt = select(*columns).where(models.Interaction.session_id == session_id)
+    if include_snapshots:
+        stmt = stmt.outerjoin(models.CodeSnapshot, models.CodeSnapshot.interaction_id == models.Interaction.id)
+    if after_id is not None:
+        stmt = stmt.where(models.Interaction.id > after_id)
+    if interaction_type is not None:
+        stmt = stmt.where(models.Interaction.interaction_type == interaction_type)
+    stmt = stmt.order_by(models.Interaction.id.asc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+
+    result = await db.execute(stmt)
+    items = []
+    for row in result:
+        code_snapshot = None
+        if include_snapshots and row.snapshot_id is not None:
+            code_snapshot = schemas.CodeSnapshotPartial(
+                id=row.snapshot_id,
+                interaction_id=row.id,
+                timestamp=row.snapshot_timestamp,
+                code_content=row.code_content if include_snapshot_bodies else None,
+            )
+        items.append(schemas.InteractionListItem(
+            id=row.id,
+            session_id=row.session_id,
+            timestamp=row.timestamp,
+            interaction_type=row.interaction_type,
+            data=row.data or {},
+            code_snapshot=code_snapshot,
+        ))
+    return items
+
@@ -0,0 +1,112 @@
+import json
+import logging
+import secrets
+from typing import List, NamedTuple, Optional
+from app.config import settings
+from app.database import get_redis
+from app.metrics import JOURNAL_EVENTS, track_stage
+
+logger = logging.getLogger(__name__)
+
+# Per-session Redis stream of outbound frames, plus the counter that numbers them
+STREAM_KEY = "ws_journal:{session_id}"
+SEQ_KEY = "ws_journal_seq:{session_id}"
+# Identifies one run of the counter: when it expires or Redis is flushed, seq restarts
+# at 1 under a new epoch, and clients holding a last_seq from the old one reset it
+EPOCH_KEY = "ws_journal_epoch:{session_id}"
+
+# Frames a client must not miss; heartbeats and errors are not journaled
+JOURNALED_TYPES = {"question", "evaluation_result", "report_ready"}
+
+
+class Replay(NamedTuple):
+    messages: List[dict] # Journaled frames to resend, oldest first
+    after_seq: int # The client's last_seq, or 0 if it was from an earlier epoch
+
+
+class MessageJournal:
+    """Numbers and persists outbound frames so a reconnecting client can catch up.
+
+    Each journaled frame gets a per-session "seq" (Redis INCR) and is appended to
+    a capped stream that expires WS_JOURNAL_TTL_SECONDS after the last append.
+    A client reconnects with the last seq it processed and is sent everything
+    after it, so nothing has to be regenerated.
+
+    Frames also carry the journal "epoch", which changes whenever the counter
+    restarts (expiry, Redis flush). A client seeing a new epoch must reset its
+    last seq, otherwise it would drop the renumbered frames as already seen.
+    """
+
+    async def append(self, session_id: str, message: dict) -> dict:
+        """Returns the message with its seq added, or unchanged if it is not journaled or Redis fails."""
+        if not settings.ws_journal_enabled or message.get("message_type") not in JOURNALED_TYPES:
+            return message
+        try:
+            with track_stage("journal_append"):
+                redis_client = await get_redis()
+                seq = await redis_client.incr(SEQ_KEY.format(session_id=session_id))
+                epoch_key = EPOCH_KEY.format(session_id=session_id)
+                if seq == 1:
+                    epoch = secrets.token_hex(4)
+                    await redis_client.set(epoch_key, epoch)
+                else:
+                    epoch = await redis_client.get(epoch_key)
+                    if epoch is None: # Epoch key lost on its own; start one without renumbering
+                        epoch = secrets.token_hex(4)
+                        await redis_client.set(epoch_key, epoch)
+                message = {**message, "seq": seq, "epoch": epoch}
+                stream_key = STREAM_KEY.format(session_id=session_id)
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.xadd(stream_key, {"seq": seq, "message": json.dumps(message)}, maxlen=settings.ws_journal_max_len, approximate=True)
+                    pipe.expire(stream_key, settings.ws_journal_ttl_seconds)
+                    pipe.expire(SEQ_KEY.format(session_id=session_id), settings.ws_journal_ttl_seconds)
+                    pipe.expire(epoch_key, settings.ws_journal_ttl_seconds)
+                    await pipe.execute()
+            JOURNAL_EVENTS.labels("appended").inc()
+        except Exception as e:
+            # Delivery still goes ahead; the frame just can't be replayed
+            JOURNAL_EVENTS.labels("failed").inc()
+            logger.warning("Could not journal %s for session %s: %s", message.get("message_type"), session_id, e)
+        return message
+
+    async def read_after(self, session_id: str, last_seq: int, epoch: Optional[str] = None) -> Replay:
+        """Journaled frames with seq > last_seq, oldest first.
+
+        If the client's epoch is not the journal's current one, its last_seq belongs to
+        an earlier numbering and the whole journal is returned.
+        """
+        try:
+            with track_stage("journal_replay"):
+                redis_client = await get_redis()
+                entries = await redis_client.xrange(STREAM_KEY.format(session_id=session_id))
+                current_epoch = await redis_client.get(EPOCH_KEY.format(session_id=session_id)) if epoch else None
+        except Exception as e:
+            JOURNAL_EVENTS.labels("failed").inc()
+            logger.warning("Could not read journal for session %s: %s", session_id, e)
+            return Replay([], last_seq)
+        if epoch and epoch != current_epoch:
+            JOURNAL_EVENTS.labels("epoch_reset").inc()
+            logger.info("Session %s reconnected with journal epoch %s, current is %s; replaying from the start", session_id, epoch, current_epoch)
+            last_seq = 0
+        messages = sorted(
+            (json.loads(fields["message"]) for _, fields in entries if int(fields["seq"]) > last_seq),
+            key=lambda message: message["seq"],
+        )
+        if messages and messages[0]["seq"] > last_seq + 1:
+            # Older frames were trimmed (WS_JOURNAL_MAX_LEN) or expired
+            JOURNAL_EVENTS.labels("gap").inc()
+            logger.warning(
+                "Journal gap for session %s: client at seq %d, oldest available %d", session_id, last_seq, messages[0]["seq"]
+            )
+        JOURNAL_EVENTS.labels("replayed").inc(len(messages))
+        return Replay(messages, last_seq)
+
+
+def parse_last_seq(value: Optional[str]) -> Optional[int]:
+    """The last_seq query parameter of a reconnect; None if absent or malformed."""
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
+message_journal = MessageJournal()
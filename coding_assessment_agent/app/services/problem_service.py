@@ -0,0 +1,34 @@
+import hashlib
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app import models
+
+
+def problem_hash(problem_statement: str) -> str:
+    """Stable content hash identifying a problem across sessions (problems.content_hash, cache keys, metadata)."""
+    return hashlib.sha256(problem_statement.encode("utf-8")).hexdigest()
+
+
+async def get_problem_by_hash(db: AsyncSession, content_hash: str) -> models.Problem | None:
+    result = await db.execute(select(models.Problem).where(models.Problem.content_hash == content_hash))
+    return result.scalar_one_or_none()
+
+
+async def get_or_create_problem(db: AsyncSession, problem_statement: str) -> models.Problem:
+    """Returns the problem with this statement, creating it if needed. Does not commit.
+
+    The insert runs in a savepoint so a concurrent insert of the same problem
+    (unique content_hash) falls back to the existing row.
+    """
+    content_hash = problem_hash(problem_statement)
+    problem = await get_problem_by_hash(db, content_hash)
+    if problem is not None:
+        return problem
+    try:
+        async with db.begin_nested():
+            problem = models.Problem(content_hash=content_hash, statement=problem_statement)
+            db.add(problem)
+    except IntegrityError:
+        problem = await get_problem_by_hash(db, content_hash)
+    return problem
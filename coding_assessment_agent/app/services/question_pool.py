@@ -0,0 +1,98 @@
+import asyncio
+import json
+import logging
+import re
+from typing import List, Optional, Set
+from langchain_core.output_parsers import StrOutputParser
+from app.config import settings
+from app.database import get_llm, get_redis
+from app.metrics import llm_token_usage_callback, record_cache, track_queue, track_stage
+from app.prompts import opening_questions_prompt
+from app.services.admission_control import admission_controller
+from app.services.problem_service import problem_hash
+
+logger = logging.getLogger(__name__)
+
+# Opening questions are problem-level, so every session on the same problem shares one pool
+POOL_KEY = "question_pool:{problem_hash}"
+LOCK_KEY = "question_pool_lock:{problem_hash}"
+LOCK_SECONDS = 120 # One pregeneration per problem at a time, even across workers
+
+COMMENT_LINE_RE = re.compile(r"^\s*(//|#|/\*|\*|\*/)")
+
+
+def is_starter_code(code: str) -> bool:
+    """True if the code has at most a few substantive lines (e.g. still the editor's starter template)."""
+    substantive = [line for line in code.splitlines() if line.strip() and not COMMENT_LINE_RE.match(line)]
+    return len(substantive) <= settings.question_pool_starter_max_lines
+
+
+def _parse_questions(output: str) -> List[str]:
+    cleaned = output.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        parsed = json.loads(cleaned)
+    except json.JSONDecodeError:
+        # Fall back to one question per non-empty line
+        parsed = [line.strip(" -*0123456789.").strip() for line in cleaned.splitlines()]
+    if not isinstance(parsed, list):
+        return []
+    return [q.strip() for q in parsed if isinstance(q, str) and q.strip()]
+
+
+class QuestionPool:
+    """Pregenerated opening questions, cached in Redis per problem hash."""
+
+    def __init__(self):
+        self._chain = opening_questions_prompt | get_llm() | StrOutputParser()
+        # Strong references to running pregeneration tasks (the event loop only keeps weak ones)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule_pregeneration(self, problem_statement: str):
+        """Starts filling the pool for a problem in the background; returns immediately."""
+        if not settings.question_pool_enabled:
+            return
+        task = asyncio.create_task(self.pregenerate(problem_statement))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def pregenerate(self, problem_statement: str):
+        digest = problem_hash(problem_statement)
+        pool_key = POOL_KEY.format(problem_hash=digest)
+        try:
+            redis_client = await get_redis()
+            if await redis_client.scard(pool_key) >= settings.question_pool_size:
+                return
+            if not await redis_client.set(LOCK_KEY.format(problem_hash=digest), 1, nx=True, ex=LOCK_SECONDS):
+                return
+            with track_queue("llm"), admission_controller.track_llm(), track_stage("llm_opening_questions"):
+                output = await self._chain.ainvoke(
+                    {"problem_statement": problem_statement, "count": settings.question_pool_size},
+                    config={"callbacks": [llm_token_usage_callback]},
+                )
+            questions = _parse_questions(output)
+            if not questions:
+                logger.warning("Opening question pregeneration for problem %s returned no questions", digest[:12])
+                return
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.sadd(pool_key, *questions)
+                pipe.expire(pool_key, settings.question_pool_ttl_seconds)
+                await pipe.execute()
+            logger.info("Pregenerated %d opening questions for problem %s", len(questions), digest[:12])
+        except Exception as e:
+            logger.error("Opening question pregeneration failed for problem %s: %s", digest[:12], e, exc_info=True)
+
+    async def take_opening_question(self, problem_statement: str) -> Optional[str]:
+        """Returns a random pooled opening question for the problem, or None if the pool is empty."""
+        if not settings.question_pool_enabled:
+            return None
+        try:
+            redis_client = await get_redis()
+            question = await redis_client.srandmember(POOL_KEY.format(problem_hash=problem_hash(problem_statement)))
+        except Exception as e:
+            logger.warning("Question pool lookup failed: %s", e)
+            return None
+        record_cache("question_pool", question is not None)
+        return question
+
+
+question_pool = QuestionPool()
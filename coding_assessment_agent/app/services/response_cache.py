@@ -0,0 +1,114 @@
+import hashlib
+import logging
+from typing import Optional, Tuple
+from redis.exceptions import WatchError
+from app.config import settings
+from app.database import get_redis
+from app.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Rendered JSON bodies of immutable responses (reports, ended sessions), keyed per session.
+# Each session has one Redis hash so a single DEL invalidates every cached variant.
+REPORT_CACHE_KEY = "response_cache:report:{session_id}"
+SESSION_CACHE_KEY = "response_cache:session:{session_id}"
+# Bumped by every invalidation. A rendering is only stored if the generation is still the one
+# read before its DB query, so a slow request can't cache data an invalidation already replaced.
+GENERATION_KEY = "response_cache:generation:{session_id}"
+
+
+def compute_etag(body: str) -> str:
+    """Strong ETag derived from the rendered body."""
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluates an If-None-Match header against an ETag (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+async def _get(key: str, variant: str, cache_name: str) -> Optional[Tuple[str, str]]:
+    try:
+        redis_client = await get_redis()
+        body, etag = await redis_client.hmget(key, f"{variant}:body", f"{variant}:etag")
+    except Exception as e:
+        logger.warning("Response cache read failed for %s: %s", key, e)
+        return None
+    hit = body is not None and etag is not None
+    record_cache(cache_name, hit)
+    return (body, etag) if hit else None
+
+
+async def _set(session_id: int, key: str, variant: str, body: str, generation: Optional[str]) -> str:
+    etag = compute_etag(body)
+    if generation is None:
+        return etag
+    try:
+        redis_client = await get_redis()
+        async with redis_client.pipeline(transaction=True) as pipe:
+            generation_key = GENERATION_KEY.format(session_id=session_id)
+            await pipe.watch(generation_key)
+            if (await pipe.get(generation_key) or "0") != generation:
+                logger.debug("Not caching %s: invalidated while it was rendered", key)
+                return etag
+            pipe.multi()
+            pipe.hset(key, mapping={f"{variant}:body": body, f"{variant}:etag": etag})
+            pipe.expire(key, settings.response_cache_ttl_seconds)
+            await pipe.execute()
+    except WatchError:
+        logger.debug("Not caching %s: invalidated while it was stored", key)
+    except Exception as e:
+        logger.warning("Response cache write failed for %s: %s", key, e)
+    return etag
+
+
+async def generation(session_id: int) -> Optional[str]:
+    """The session's cache generation; read it before querying what will be cached. None if Redis fails."""
+    try:
+        redis_client = await get_redis()
+        return await redis_client.get(GENERATION_KEY.format(session_id=session_id)) or "0"
+    except Exception as e:
+        logger.warning("Response cache generation read failed for session %s: %s", session_id, e)
+        return None
+
+
+async def get_report(session_id: int) -> Optional[Tuple[str, str]]:
+    """Returns (body, etag) of the cached rendered report, if present."""
+    return await _get(REPORT_CACHE_KEY.format(session_id=session_id), "report", "report_response")
+
+
+async def set_report(session_id: int, body: str, generation: Optional[str]) -> str:
+    """Caches a rendered report body (unless invalidated since `generation`) and returns its ETag."""
+    return await _set(session_id, REPORT_CACHE_KEY.format(session_id=session_id), "report", body, generation)
+
+
+async def get_session(session_id: int, variant: str) -> Optional[Tuple[str, str]]:
+    """Returns (body, etag) of a cached rendered ended-session view for the given include variant."""
+    return await _get(SESSION_CACHE_KEY.format(session_id=session_id), variant, "session_response")
+
+
+async def set_session(session_id: int, variant: str, body: str, generation: Optional[str]) -> str:
+    """Caches a rendered ended-session body for an include variant (unless invalidated since
+    `generation`) and returns its ETag."""
+    return await _set(session_id, SESSION_CACHE_KEY.format(session_id=session_id), variant, body, generation)
+
+
+async def invalidate_session(session_id: int):
+    """Drops every cached rendering for a session (report and all session views)."""
+    try:
+        redis_client = await get_redis()
+        generation_key = GENERATION_KEY.format(session_id=session_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(generation_key)
+            # Outlives any rendering cached under an earlier generation
+            pipe.expire(generation_key, settings.response_cache_ttl_seconds)
+            pipe.delete(REPORT_CACHE_KEY.format(session_id=session_id), SESSION_CACHE_KEY.format(session_id=session_id))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning("Response cache invalidation failed for session %s: %s", session_id, e)
@@ -1,15 +1,28 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import func
 from sqlalchemy.orm import selectinload
 from app import models, schemas
+from app.database import pin_to_primary
+from app.services import interaction_service, response_cache, problem_service
 import datetime
 
+# Session columns plus the problem statement, for flat column queries
+SESSION_COLUMNS = (
+    models.Session.id,
+    models.Session.start_time,
+    models.Session.end_time,
+    models.Problem.statement.label("problem_statement"),
+)
+
 async def create_session(db: AsyncSession, problem_statement: str) -> models.Session:
-    """Creates a new session in the database with the given problem statement."""
-    new_session = models.Session(problem_statement=problem_statement)
+    """Creates a new session for the given problem statement, reusing its problem row if it exists."""
+    problem = await problem_service.get_or_create_problem(db, problem_statement)
+    new_session = models.Session(problem=problem)
     db.add(new_session)
     await db.commit()
     await db.refresh(new_session)
+    await pin_to_primary(new_session.id)
     return new_session
 
 async def get_session(db: AsyncSession, session_id: int) -> models.Session | None:
@@ -24,6 +37,20 @@ async def get_session(db: AsyncSession, session_id: int) -> models.Session | Non
     )
     return result.scalar_one_or_none()
 
+async def get_problem_statement(db: AsyncSession, session_id: int) -> str | None:
+    """Retrieves only the problem statement of a session, without loading interactions."""
+    result = await db.execute(
+        select(models.Problem.statement)
+        .join(models.Session, models.Session.problem_id == models.Problem.id)
+        .where(models.Session.id == session_id)
+    )
+    return result.scalar_one_or_none()
+
+async def get_start_time(db: AsyncSession, session_id: int) -> datetime.datetime | None:
+    """Retrieves only the start time of a session."""
+    result = await db.execute(select(models.Session.start_time).where(models.Session.id == session_id))
+    return result.scalar_one_or_none()
+
 async def end_session(db: AsyncSession, session_id: int) -> models.Session | None:
     """Marks a session as ended by setting the end_time."""
     session = await get_session(db, session_id) # Use get_session to potentially pre-load data if needed later
@@ -31,6 +58,8 @@ async def end_session(db: AsyncSession, session_id: int) -> models.Session | Non
         session.end_time = datetime.datetime.now(datetime.timezone.utc)
         await db.commit()
         await db.refresh(session)
+        await pin_to_primary(session_id)
+        await response_cache.invalidate_session(session_id)
     return session
 
 async def create_report(db: AsyncSession, session_id: int, report_data: schemas.ReportCreate) -> models.Report:
@@ -50,6 +79,9 @@ async def create_report(db: AsyncSession, session_id: int, report_data: schemas.
     db.add(new_report)
     await db.commit()
     await db.refresh(new_report)
+    await pin_to_primary(session_id)
+    # Cached ended-session views embed the report; drop them (and any stale report rendering)
+    await response_cache.invalidate_session(session_id)
     return new_report
 
 async def get_report(db: AsyncSession, session_id: int) -> models.Report | None:
@@ -58,3 +90,91 @@ async def get_report(db: AsyncSession, session_id: int) -> models.Report | None:
         select(models.Report).where(models.Report.session_id == session_id)
     )
     return result.scalar_one_or_none()
+
+async def get_session_summary(db: AsyncSession, session_id: int) -> schemas.SessionSummary | None:
+    """Builds a session summary from aggregate queries, without loading interactions or snapshots."""
+    session_row = (await db.execute(
+        select(*SESSION_COLUMNS)
+        .join(models.Problem, models.Problem.id == models.Session.problem_id)
+        .where(models.Session.id == session_id)
+    )).one_or_none()
+    if session_row is None:
+        return None
+
+    type_counts = await db.execute(
+        select(models.Interaction.interaction_type, func.count(), func.max(models.Interaction.timestamp))
+        .where(models.Interaction.session_id == session_id)
+        .group_by(models.Interaction.interaction_type)
+    )
+    interaction_counts = {}
+    last_activity = None
+    for interaction_type, count, latest in type_counts:
+        interaction_counts[interaction_type or "unknown"] = count
+        if latest is not None and (last_activity is None or latest > last_activity):
+            last_activity = latest
+
+    snapshot_count = (await db.execute(
+        select(func.count(models.CodeSnapshot.id))
+        .join(models.Interaction, models.Interaction.id == models.CodeSnapshot.interaction_id)
+        .where(models.Interaction.session_id == session_id)
+    )).scalar_one()
+
+    report_scores = (await db.execute(
+        select(models.Report.id, models.Report.scores).where(models.Report.session_id == session_id)
+    )).one_or_none()
+    average_score = None
+    if report_scores is not None and report_scores.scores:
+        average_score = report_scores.scores.get("average_score")
+
+    return schemas.SessionSummary(
+        id=session_row.id,
+        start_time=session_row.start_time,
+        end_time=session_row.end_time,
+        problem_statement=session_row.problem_statement,
+        interaction_counts=interaction_counts,
+        snapshot_count=snapshot_count,
+        last_activity=last_activity,
+        has_report=report_scores is not None,
+        average_score=average_score,
+    )
+
+async def get_session_view(
+    db: AsyncSession,
+    session_id: int,
+    include_interactions: bool = True,
+    include_snapshots: bool = True,
+    include_snapshot_bodies: bool = True,
+    include_report: bool = True,
+) -> schemas.SessionView | None:
+    """Builds a SessionView with only the requested parts, using flat column queries."""
+    session_row = (await db.execute(
+        select(*SESSION_COLUMNS)
+        .join(models.Problem, models.Problem.id == models.Session.problem_id)
+        .where(models.Session.id == session_id)
+    )).one_or_none()
+    if session_row is None:
+        return None
+
+    report = None
+    if include_report:
+        report_model = await get_report(db, session_id)
+        if report_model is not None:
+            report = schemas.ReportRead.model_validate(report_model)
+
+    interactions = []
+    if include_interactions:
+        interactions = await interaction_service.list_interactions(
+            db, session_id,
+            include_snapshots=include_snapshots,
+            include_snapshot_bodies=include_snapshot_bodies,
+        )
+
+    return schemas.SessionView(
+        id=session_row.id,
+        start_time=session_row.start_time,
+        end_time=session_row.end_time,
+        problem_statement=session_row.problem_statement,
+        report=report,
+        interactions=interactions,
+    )
+
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from app.config import settings
+from app.metrics import SPECULATIVE_LATENCY_SAVED, SPECULATIVE_QUESTIONS, SPECULATIVE_WASTE_RATIO
+from app.services.admission_control import admission_controller
+from app.services.change_classifier import classify_change
+
+logger = logging.getLogger(__name__)
+
+# () -> question text; AgentOrchestrator generates it against the code the speculation was started for
+QuestionGenerator = Callable[[], Awaitable[str]]
+
+
+class _Speculation:
+    __slots__ = ("code", "task", "started_at", "finished_at")
+
+    def __init__(self, code: str, task: asyncio.Task):
+        self.code = code
+        self.task = task
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+
+class SpeculativeQuestions:
+    """Generates a candidate question while a session is close to the trigger thresholds.
+
+    At most one speculation runs per session, against the code it was started
+    for. When the trigger fires, take() serves it if the code has moved by at
+    most TRIGGER_MIN_CHANGED_STATEMENTS + SPECULATIVE_MAX_DIVERGENCE_STATEMENTS
+    since (waiting for it if it is still running); otherwise it is discarded and
+    the question is generated as usual. The budget includes the threshold
+    because the update that fires the trigger has itself usually changed that
+    many statements. A new interaction (a question asked some other way, a
+    response) also discards it, since its prompt no longer reflects the
+    conversation. Speculations are only started while the LLM load factor is
+    below SPECULATIVE_MAX_LOAD, so they never compete with real work under load,
+    and their calls are not counted in the load themselves.
+    """
+
+    def __init__(self):
+        self._speculations: Dict[int, _Speculation] = {}
+        self._started = 0
+        self._wasted = 0
+
+    def start(self, session_id: int, code: str, generate: QuestionGenerator) -> bool:
+        """Starts generating a question for code in the background; False if none was started."""
+        if not settings.speculative_questions_enabled:
+            return False
+        current = self._speculations.get(session_id)
+        if current is not None:
+            if self._usable(current, code):
+                return False # The running or finished candidate still fits this code
+            self._discard(session_id, "diverged")
+        if admission_controller.load_factor() >= settings.speculative_max_load:
+            SPECULATIVE_QUESTIONS.labels("skipped_load").inc()
+            return False
+
+        task = asyncio.ensure_future(generate())
+        speculation = _Speculation(code, task)
+        task.add_done_callback(lambda _: self._finished(speculation))
+        self._speculations[session_id] = speculation
+        self._started += 1
+        SPECULATIVE_QUESTIONS.labels("started").inc()
+        SPECULATIVE_WASTE_RATIO.set(self._wasted / self._started)
+        logger.debug("Started speculative question for session %s", session_id)
+        return True
+
+    async def take(self, session_id: int, code: str) -> Optional[str]:
+        """The speculative question for this session if it still fits code, else None.
+
+        Any speculation for the session is consumed either way.
+        """
+        speculation = self._speculations.get(session_id)
+        if speculation is None:
+            return None
+        if not self._usable(speculation, code):
+            self._discard(session_id, "expired" if self._expired(speculation) else "diverged")
+            return None
+        del self._speculations[session_id]
+
+        # Time the trigger would otherwise spend generating: all of it if the
+        # candidate is ready, the part already done if it is still running
+        saved = (speculation.finished_at or time.perf_counter()) - speculation.started_at
+        try:
+            question = await speculation.task
+        except Exception as e:
+            self._record_waste("failed")
+            logger.warning("Speculative question for session %s failed: %s", session_id, e)
+            return None
+        SPECULATIVE_QUESTIONS.labels("served").inc()
+        SPECULATIVE_LATENCY_SAVED.observe(saved)
+        logger.info("Serving speculative question for session %s (%.2fs of generation saved)", session_id, saved)
+        return question
+
+    def invalidate(self, session_id: int):
+        """Drops the session's speculation because a new interaction changed the history it was built on."""
+        if session_id in self._speculations:
+            self._discard(session_id, "stale")
+
+    def forget_session(self, session_id: int):
+        """Drops a speculation for a session whose client went away."""
+        if session_id in self._speculations:
+            self._discard(session_id, "abandoned")
+
+    @staticmethod
+    def _finished(speculation: _Speculation):
+        speculation.finished_at = time.perf_counter()
+        if not speculation.task.cancelled():
+            speculation.task.exception() # Retrieved here so a discarded failure isn't reported as unhandled
+
+    def _usable(self, speculation: _Speculation, code: str) -> bool:
+        if self._expired(speculation):
+            return False
+        if speculation.code == code:
+            return True
+        change = classify_change(speculation.code, code)
+        budget = settings.trigger_min_changed_statements + settings.speculative_max_divergence_statements
+        return change.cosmetic_only or change.statements_changed <= budget
+
+    @staticmethod
+    def _expired(speculation: _Speculation) -> bool:
+        return time.perf_counter() - speculation.started_at > settings.speculative_ttl_seconds
+
+    def _discard(self, session_id: int, reason: str):
+        speculation = self._speculations.pop(session_id)
+        speculation.task.cancel()
+        self._record_waste(reason)
+        logger.debug("Discarded speculative question for session %s: %s", session_id, reason)
+
+    def _record_waste(self, reason: str):
+        self._wasted += 1
+        SPECULATIVE_QUESTIONS.labels(reason).inc()
+        SPECULATIVE_WASTE_RATIO.set(self._wasted / max(self._started, 1))
+
+
+speculative_questions = SpeculativeQuestions()
@@ -1,95 +1,143 @@
 import difflib
 import datetime
 import logging # Add logging import
-from typing import Optional
+from typing import NamedTuple, Optional
 from app import models
+from app.config import settings
+from app.metrics import TRIGGER_CALLS_AVOIDED
+from app.services.admission_control import TriggerThresholds, admission_controller
+from app.services.change_classifier import ChangeSummary, classify_change
 
-# Configuration for trigger logic
-MIN_TIME_BETWEEN_INTERACTIONS = datetime.timedelta(seconds=60) # Minimum time before asking again
-MIN_CODE_CHANGE_LINES = 2 # Minimum number of lines changed to trigger based on diff
+# Thresholds are settings (TRIGGER_MIN_INTERVAL_SECONDS, TRIGGER_MIN_CHANGED_STATEMENTS),
+# stretched under LLM load by the admission controller
+MIN_CODE_CHANGE_LINES = 2 # Previous raw line threshold; only used to count the LLM calls the statement check avoids
 
 logger = logging.getLogger(__name__) # Get logger instance
 
+_calls_avoided = 0 # Running total for the log line; the Prometheus counter has the per-reason breakdown
+
+
+class TriggerDecision(NamedTuple):
+    fire: bool # Ask a question now
+    speculate: bool = False # Not yet, but close enough to the thresholds to generate one ahead of time
+
 def calculate_diff_lines(old_code: str, new_code: str) -> int:
     """Calculates the number of added/deleted lines between two code strings."""
     old_lines = old_code.splitlines()
     new_lines = new_code.splitlines()
-    logger.debug(f"Calculating diff. Old lines count: {len(old_lines)}, New lines count: {len(new_lines)}")
-    # logger.debug(f"Old lines for diff: {old_lines}") # Can be verbose
-    # logger.debug(f"New lines for diff: {new_lines}") # Can be verbose
-
-    diff_generator = difflib.unified_diff(old_lines, new_lines, lineterm='')
-    diff = list(diff_generator) # Convert generator to list for inspection
-    logger.debug(f"Raw diff output (length {len(diff)}): {diff}")
 
     change_count = 0
-    for i, line in enumerate(diff):
-        # Detailed check for each line
-        is_add = line.startswith('+')
-        is_remove = line.startswith('-')
-        is_header = line.startswith('+++') or line.startswith('---')
-        is_change = (is_add or is_remove) and not is_header
-
-        logger.debug(f"  Diff line {i}: '{line}' | Add: {is_add} | Remove: {is_remove} | Header: {is_header} | Counted: {is_change}")
-
-        if is_change:
+    for line in difflib.unified_diff(old_lines, new_lines, lineterm=''):
+        # Count added/removed lines, skipping the '+++'/'---' file headers
+        if (line.startswith('+') and not line.startswith('+++')) or (line.startswith('-') and not line.startswith('---')):
             change_count += 1
 
-    logger.debug(f"Final calculated change_count: {change_count}")
+    logger.debug("Diff: %d old lines, %d new lines, %d changed", len(old_lines), len(new_lines), change_count)
     return change_count
 
+def _record_avoided(old_code: str, new_code: str, change: ChangeSummary, time_met: bool):
+    """Counts a skipped trigger if the line-based rules would have asked a question."""
+    global _calls_avoided
+    if not ((time_met and old_code != new_code) or calculate_diff_lines(old_code, new_code) >= MIN_CODE_CHANGE_LINES):
+        return
+    reason = "cosmetic" if change.cosmetic_only else "below_threshold"
+    TRIGGER_CALLS_AVOIDED.labels(reason).inc()
+    _calls_avoided += 1
+    logger.info(
+        "Skipped %s %s change (%d statements, functions %s); %d LLM calls avoided so far.",
+        reason, change.language, change.statements_changed, sorted(change.functions_touched), _calls_avoided,
+    )
+
+def _meets(change: ChangeSummary, time_since_last: Optional[datetime.timedelta], min_interval: datetime.timedelta, min_statements: int) -> bool:
+    if time_since_last is not None and time_since_last >= min_interval and not change.cosmetic_only:
+        return True
+    return change.statements_changed >= min_statements
+
+def _decide(
+    session_id: int,
+    old_code: str,
+    new_code: str,
+    change: ChangeSummary,
+    time_since_last: Optional[datetime.timedelta],
+    base_interval: datetime.timedelta,
+    thresholds: TriggerThresholds,
+) -> TriggerDecision:
+    """Applies the load-scaled thresholds, then admission control; records deferred and avoided triggers."""
+    if _meets(change, time_since_last, thresholds.min_interval, thresholds.min_statements):
+        logger.debug(
+            "Trigger candidate: %d statements in %s, %s since last interaction (thresholds %s / %d, load %.2f).",
+            change.statements_changed, sorted(change.functions_touched), time_since_last,
+            thresholds.min_interval, thresholds.min_statements, thresholds.load,
+        )
+        return TriggerDecision(admission_controller.admit(session_id, thresholds))
+
+    if _meets(change, time_since_last, base_interval, settings.trigger_min_changed_statements):
+        admission_controller.record_deferred(session_id, thresholds)
+        return TriggerDecision(False)
+
+    logger.debug("Not triggering: %d statements changed, %s since last interaction.", change.statements_changed, time_since_last)
+    time_met = time_since_last is not None and time_since_last >= base_interval
+    _record_avoided(old_code, new_code, change, time_met)
+    return TriggerDecision(False, speculate=_near(change, time_since_last, thresholds))
+
+def _near(change: ChangeSummary, time_since_last: Optional[datetime.timedelta], thresholds: TriggerThresholds) -> bool:
+    """Whether a change that did not trigger is one statement short of the threshold, or
+    made in the last stretch (SPECULATIVE_INTERVAL_RATIO onwards) of the interval."""
+    if change.statements_changed == 0:
+        return False
+    if thresholds.min_statements > 1 and change.statements_changed >= thresholds.min_statements - 1:
+        return True
+    return time_since_last is not None and time_since_last >= thresholds.min_interval * settings.speculative_interval_ratio
+
 async def should_trigger_interaction(
+    session_id: int,
     current_code: str,
-    last_interaction: Optional[models.Interaction]
-) -> bool:
-    """Decides whether a new interaction (e.g., asking a question) should be triggered."""
-    logger.debug("Evaluating trigger conditions...")
-    logger.debug(f"Current code length: {len(current_code)}")
+    last_interaction: Optional[models.Interaction],
+    session_started_at: Optional[datetime.datetime] = None,
+) -> TriggerDecision:
+    """Decides whether a new interaction (e.g., asking a question) should be triggered.
+
+    Changes are measured in statements rather than raw lines, so formatting and
+    comment-only edits never trigger a question. Under LLM load the thresholds
+    grow and triggers pass through the admission controller. Just below the
+    thresholds (see _near), the decision asks for a speculative question instead.
+
+    Before the first interaction, time is measured from session_started_at, so a
+    session still waiting for its first question is also exempt from load
+    scaling after TRIGGER_MAX_INTERVAL_SECONDS.
+    """
     now = datetime.datetime.now(datetime.timezone.utc)
+    base_interval = datetime.timedelta(seconds=settings.trigger_min_interval_seconds)
 
     if last_interaction is None:
-        logger.debug("No previous interaction found.")
-        initial_diff = calculate_diff_lines("", current_code)
-        logger.debug(f"Initial code change lines: {initial_diff}")
-        if initial_diff >= MIN_CODE_CHANGE_LINES:
-            logger.debug(f"Triggering: Initial change ({initial_diff}) meets threshold ({MIN_CODE_CHANGE_LINES}).")
-            return True
-        logger.debug(f"Not triggering: Initial change ({initial_diff}) below threshold ({MIN_CODE_CHANGE_LINES}).")
-        return False
+        change = classify_change("", current_code)
+        time_since_start = None
+        if session_started_at is not None:
+            if session_started_at.tzinfo is None: # Backends without timezone support (SQLite) return naive UTC
+                session_started_at = session_started_at.replace(tzinfo=datetime.timezone.utc)
+            time_since_start = now - session_started_at
+        thresholds = admission_controller.thresholds(time_since_start or datetime.timedelta(0))
+        return _decide(session_id, "", current_code, change, time_since_start, base_interval, thresholds)
 
-    logger.debug(f"Last interaction ID: {last_interaction.id}, Timestamp: {last_interaction.timestamp}")
     last_snapshot = last_interaction.code_snapshot # Assumes eager loaded
 
     # 1. Time-based trigger
     time_since_last = now - last_interaction.timestamp
-    logger.debug(f"Time since last interaction: {time_since_last}, Required: {MIN_TIME_BETWEEN_INTERACTIONS}")
-    if time_since_last >= MIN_TIME_BETWEEN_INTERACTIONS:
-        logger.debug("Time threshold met.")
-        if not last_snapshot:
-            logger.warning(f"Last interaction {last_interaction.id} has no associated code snapshot for time check.")
-            # Decide behavior: trigger anyway, or require snapshot? Assuming trigger if time met.
-            logger.debug("Triggering: Time threshold met, even without snapshot to compare.")
-            return True
-        if last_snapshot.code_content != current_code:
-            logger.debug("Code has changed since last snapshot.")
-            logger.debug("Triggering: Time threshold met and code changed.")
-            return True
-        else:
-            logger.debug("Code has NOT changed since last snapshot.")
-    else:
-        logger.debug("Time threshold NOT met.")
-
-    # 2. Diff-based trigger (only if time threshold not met)
+    thresholds = admission_controller.thresholds(time_since_last)
+    if time_since_last >= thresholds.min_interval and not last_snapshot:
+        logger.warning("Last interaction %s has no associated code snapshot for time check.", last_interaction.id)
+        # Decide behavior: trigger anyway, or require snapshot? Assuming trigger if time met.
+        logger.debug("Triggering: time threshold met, even without snapshot to compare.")
+        return TriggerDecision(True)
+
+    # 2. Statement-based diff trigger
     if not last_snapshot:
-        logger.warning(f"Last interaction {last_interaction.id} has no associated code snapshot for diff check. Cannot trigger based on diff.")
-        logger.debug("Not triggering: No snapshot to calculate diff.")
-        return False
+        logger.warning("Last interaction %s has no associated code snapshot for diff check. Cannot trigger based on diff.", last_interaction.id)
+        return TriggerDecision(False)
 
-    lines_changed = calculate_diff_lines(last_snapshot.code_content, current_code)
-    logger.debug(f"Lines changed since last snapshot: {lines_changed}, Required: {MIN_CODE_CHANGE_LINES}")
-    if lines_changed >= MIN_CODE_CHANGE_LINES:
-        logger.debug(f"Triggering: Significant change ({lines_changed}) meets threshold ({MIN_CODE_CHANGE_LINES}).")
-        return True
+    if last_snapshot.code_content == current_code:
+        logger.debug("Not triggering: code unchanged, %s since last interaction.", time_since_last)
+        return TriggerDecision(False)
 
-    logger.debug("Not triggering: No conditions met.")
-    return False
+    change = classify_change(last_snapshot.code_content, current_code)
+    return _decide(session_id, last_snapshot.code_content, current_code, change, time_since_last, base_interval, thresholds)
@@ -0,0 +1,313 @@
+import json
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.config import settings
+from app.database import embeddings, get_chroma_collection, get_vector_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "_default"
+PARTITION_KEY = "problem_hash" # Metadata key that selects the per-problem partition
+
+
+class SearchRequest(NamedTuple):
+    query: str
+    k: int
+    filter: Optional[Dict[str, Any]]
+
+
+class VectorBackend(ABC):
+    """Blocking vector store interface used by VectorDBClient (which runs it off the event loop)."""
+
+    @abstractmethod
+    def add_texts(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None) -> List[str]:
+        """Embeds and stores texts. Existing ids are overwritten."""
+
+    @abstractmethod
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Returns the k documents most similar to the query that match the metadata filter."""
+
+    def similarity_search_batch(self, requests: List[SearchRequest]) -> List[List[Document]]:
+        """Answers several searches in one call. Backends override this to embed and query in bulk."""
+        return [self.similarity_search(r.query, k=r.k, filter=r.filter) for r in requests]
+
+
+class ChromaBackend(VectorBackend):
+    """Backend over the LangChain Chroma store configured in app.database.
+
+    Batched searches go to the underlying Chroma collection (public chromadb API)
+    with embeddings computed by the store's embedding function.
+    """
+
+    def __init__(self, vector_store, collection):
+        self._vector_store = vector_store
+        self._collection = collection
+
+    def add_texts(self, texts, metadatas, ids=None):
+        return self._vector_store.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+
+    def similarity_search(self, query, k=4, filter=None):
+        return self._vector_store.similarity_search(query=query, k=k, filter=filter)
+
+    def similarity_search_batch(self, requests):
+        # One embedding call for all queries, then one multi-query collection call per (k, filter)
+        vectors = self._vector_store.embeddings.embed_documents([r.query for r in requests])
+        groups: Dict[str, List[int]] = {}
+        for index, request in enumerate(requests):
+            groups.setdefault(json.dumps([request.k, request.filter], sort_keys=True), []).append(index)
+        results: List[List[Document]] = [[] for _ in requests]
+        for indexes in groups.values():
+            request = requests[indexes[0]]
+            response = self._collection.query(
+                query_embeddings=[vectors[i] for i in indexes],
+                n_results=request.k,
+                where=request.filter or None,
+                include=["documents", "metadatas"],
+            )
+            for position, index in enumerate(indexes):
+                results[index] = [
+                    Document(page_content=text, metadata=metadata or {})
+                    for text, metadata in zip(response["documents"][position], response["metadatas"][position])
+                ]
+        return results
+
+
+def matches_filter(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates the subset of Chroma's `where` syntax the app uses ($and/$or, $eq/$ne/$in/$nin)."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op not in ("$eq", "$ne", "$in", "$nin"):
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _partition_from_filter(where: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The partition a filter pins via problem_hash equality, if any (top-level or inside $and)."""
+    if not where:
+        return None
+    condition = where.get(PARTITION_KEY)
+    if isinstance(condition, str):
+        return condition
+    if isinstance(condition, dict) and isinstance(condition.get("$eq"), str):
+        return condition["$eq"]
+    for sub in where.get("$and", []):
+        partition = _partition_from_filter(sub)
+        if partition is not None:
+            return partition
+    return None
+
+
+class _Partition:
+    """One problem's vectors: an (n, dim) float32 memmap of unit vectors plus a JSONL record log."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.records_path = os.path.join(directory, "records.jsonl")
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.rows: Dict[str, int] = {}
+        self.matrix: Optional[np.ndarray] = None
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.records_path):
+            with open(self.records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    # Overwrites are appended; the later record for a row wins
+                    self._set_record(record["row"], record["id"], record["text"], record["metadata"])
+
+    def _set_record(self, row: int, doc_id: str, text: str, metadata: Dict[str, Any]):
+        if row == len(self.ids):
+            self.ids.append(doc_id)
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+        else:
+            self.ids[row], self.texts[row], self.metadatas[row] = doc_id, text, metadata
+        self.rows[doc_id] = row
+
+    def load_matrix(self, dim: int):
+        if self.ids and os.path.exists(self.vectors_path):
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.ids), dim))
+        else:
+            self.matrix = np.empty((0, dim), dtype=np.float32)
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], vectors: np.ndarray):
+        dim = vectors.shape[1]
+        if self.matrix is None:
+            self.load_matrix(dim)
+        overwrite_rows = [self.rows.get(doc_id) for doc_id in ids]
+        new_mask = np.array([row is None for row in overwrite_rows], dtype=bool)
+        records = []
+        # Drop the read-only view before touching the file
+        self.matrix = None
+        if (~new_mask).any():
+            existing = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(len(self.ids), dim))
+            for index in np.flatnonzero(~new_mask):
+                existing[overwrite_rows[index]] = vectors[index]
+            existing.flush()
+            del existing
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors[new_mask]).tobytes())
+        for index, doc_id in enumerate(ids):
+            row = overwrite_rows[index]
+            if row is None:
+                row = len(self.ids)
+            self._set_record(row, doc_id, texts[index], metadatas[index])
+            records.append(json.dumps({"row": row, "id": doc_id, "text": texts[index], "metadata": metadatas[index]}))
+        with open(self.records_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(records) + "\n")
+        self.load_matrix(dim)
+
+    def filter_mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        return np.fromiter((matches_filter(m, where) for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+
+    def top_k(self, queries: np.ndarray, ks: List[int], masks: List[Optional[np.ndarray]]) -> List[List[tuple[float, int]]]:
+        """Top-k rows for each query (one row of `queries`), scored in a single matrix product."""
+        if self.matrix is None or not len(self.ids):
+            return [[] for _ in ks]
+        all_scores = self.matrix @ queries.T
+        results = []
+        for column, (k, mask) in enumerate(zip(ks, masks)):
+            scores = all_scores[:, column]
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            k = min(k, len(scores))
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            results.append([(float(scores[row]), int(row)) for row in candidates if scores[row] != -np.inf])
+        return results
+
+
+class NumpyBackend(VectorBackend):
+    """Exact cosine search over memory-mapped float32 matrices, one partition per problem.
+
+    Vectors are normalized on insert, so cosine similarity is a single matrix-vector
+    product. Filters pinning problem_hash only scan that partition.
+    """
+
+    def __init__(self, directory: str, embeddings: Embeddings):
+        self._directory = directory
+        self._embeddings = embeddings
+        self._partitions: Dict[str, _Partition] = {}
+        self._dim: Optional[int] = None
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if os.path.isdir(os.path.join(directory, name)):
+                self._partitions[name] = _Partition(os.path.join(directory, name))
+        dim_path = os.path.join(directory, "dim")
+        if os.path.exists(dim_path):
+            with open(dim_path) as f:
+                self._dim = int(f.read())
+            for partition in self._partitions.values():
+                partition.load_matrix(self._dim)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def _partition(self, name: str) -> _Partition:
+        partition = self._partitions.get(name)
+        if partition is None:
+            partition = self._partitions[name] = _Partition(os.path.join(self._directory, name))
+        return partition
+
+    def add_texts(self, texts, metadatas, ids=None):
+        if not texts:
+            return []
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._normalize(np.asarray(self._embeddings.embed_documents(texts), dtype=np.float32))
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                with open(os.path.join(self._directory, "dim"), "w") as f:
+                    f.write(str(self._dim))
+            groups: Dict[str, List[int]] = {}
+            for index, metadata in enumerate(metadatas):
+                groups.setdefault(str(metadata.get(PARTITION_KEY) or DEFAULT_PARTITION), []).append(index)
+            for name, indexes in groups.items():
+                self._partition(name).upsert(
+                    [ids[i] for i in indexes], [texts[i] for i in indexes], [metadatas[i] for i in indexes], vectors[indexes]
+                )
+        return ids
+
+    def similarity_search(self, query, k=4, filter=None):
+        return self.similarity_search_batch([SearchRequest(query, k, filter)])[0]
+
+    def similarity_search_batch(self, requests):
+        if len(requests) == 1:
+            vectors = [self._embeddings.embed_query(requests[0].query)]
+        else:
+            vectors = self._embeddings.embed_documents([r.query for r in requests])
+        query_vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        hits: List[List[tuple[float, str, int]]] = [[] for _ in requests]
+        with self._lock:
+            # Route each request to its partitions, then score each partition's queries together
+            by_partition: Dict[str, List[int]] = {}
+            for index, request in enumerate(requests):
+                pinned = _partition_from_filter(request.filter)
+                names = [pinned] if pinned is not None else list(self._partitions)
+                for name in names:
+                    if name in self._partitions:
+                        by_partition.setdefault(name, []).append(index)
+            for name, indexes in by_partition.items():
+                partition = self._partitions[name]
+                masks: Dict[str, Optional[np.ndarray]] = {}
+                for index in indexes:
+                    key = json.dumps(requests[index].filter, sort_keys=True)
+                    if key not in masks:
+                        masks[key] = partition.filter_mask(requests[index].filter)
+                partition_hits = partition.top_k(
+                    query_vectors[indexes],
+                    [requests[i].k for i in indexes],
+                    [masks[json.dumps(requests[i].filter, sort_keys=True)] for i in indexes],
+                )
+                for index, found in zip(indexes, partition_hits):
+                    hits[index].extend((score, name, row) for score, row in found)
+            results = []
+            for request, request_hits in zip(requests, hits):
+                request_hits.sort(key=lambda hit: hit[0], reverse=True)
+                results.append([
+                    Document(page_content=self._partitions[name].texts[row], metadata=self._partitions[name].metadatas[row])
+                    for _, name, row in request_hits[:request.k]
+                ])
+            return results
+
+
+def create_vector_backend(name: str) -> VectorBackend:
+    """Builds the backend selected by settings.vector_backend ("chroma" or "numpy")."""
+    if name == "chroma":
+        return ChromaBackend(get_vector_store(), get_chroma_collection())
+    if name == "numpy":
+        return NumpyBackend(settings.vector_index_directory, embeddings)
+    raise ValueError(f"Unknown vector backend: {name}")
@@ -1,52 +1,119 @@
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
-from app.database import get_vector_store # Import the function that returns the Chroma instance
+from app.config import settings
+from app.metrics import VECTOR_IO_QUEUE_WAIT, set_queue_depth, track_stage
+from app.services.vector_backends import SearchRequest, VectorBackend, create_vector_backend
 import logging
 
 logger = logging.getLogger(__name__)
 
+QUEUE_NAME = "vector_io"
+
+
+class VectorStoreBusyError(RuntimeError):
+    """Raised when the vector I/O queue is full; callers should skip or retry later."""
+
+
 class VectorDBClient:
+    """Async facade over the vector backend.
+
+    Blocking backend calls run on a dedicated, bounded thread pool so a burst of
+    embedding writes cannot starve the default executor. Work beyond
+    VECTOR_IO_QUEUE_LIMIT (queued + running) is rejected with VectorStoreBusyError.
+    Concurrent similarity searches are collected for VECTOR_SEARCH_BATCH_WINDOW_MS
+    and answered by one multi-query backend call.
+    """
+
     def __init__(self):
-        # Get the pre-initialized Chroma instance from database.py
-        self._vector_store: Chroma = get_vector_store()
+        # Chroma or the in-process NumPy index, per settings.vector_backend
+        self._vector_store: VectorBackend = create_vector_backend(settings.vector_backend)
+        self._executor = ThreadPoolExecutor(max_workers=settings.vector_io_workers, thread_name_prefix="vector-io")
+        self._in_flight = 0
+        self._pending_searches: List[tuple[SearchRequest, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Strong references to running search batches (the event loop only keeps weak ones)
+        self._tasks = set()
+
+    async def _run(self, operation: str, fn, *args):
+        """Runs a blocking backend call on the vector I/O pool, recording its queue wait."""
+        if self._in_flight >= settings.vector_io_queue_limit:
+            raise VectorStoreBusyError(f"Vector I/O queue full ({self._in_flight} operations in flight)")
+        self._in_flight += 1
+        set_queue_depth(QUEUE_NAME, self._in_flight)
+        submitted = time.perf_counter()
+
+        def call():
+            VECTOR_IO_QUEUE_WAIT.labels(operation).observe(time.perf_counter() - submitted)
+            return fn(*args)
 
-    async def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
-        """Adds documents to the Chroma vector store asynchronously."""
+        try:
+            with track_stage(f"vector_{operation}"):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self._in_flight -= 1
+            set_queue_depth(QUEUE_NAME, self._in_flight)
+
+    async def add_documents(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None) -> List[str]:
+        """Adds documents to the vector store asynchronously. Existing ids are overwritten."""
         if not texts:
             return []
         if len(texts) != len(metadatas):
             raise ValueError("Number of texts and metadatas must be the same.")
         try:
-            # Chroma's add_texts might be sync, run in thread pool
-            doc_ids = await asyncio.to_thread(
-                self._vector_store.add_texts,
-                texts=texts,
-                metadatas=metadatas
-            )
-            logger.info(f"Added {len(doc_ids)} documents to vector store.")
+            doc_ids = await self._run("add", self._vector_store.add_texts, texts, metadatas, ids)
+            logger.info("Added %d documents to vector store.", len(doc_ids))
             return doc_ids
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {e}", exc_info=True)
             raise
 
     async def similarity_search(self, query: str, k: int = 4, filter_metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
-        """Performs similarity search on the vector store asynchronously."""
+        """Performs similarity search on the vector store asynchronously (batched with concurrent searches)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_searches.append((SearchRequest(query, k, filter_metadata), future))
+        if len(self._pending_searches) >= settings.vector_search_max_batch:
+            self._flush_searches()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(settings.vector_search_batch_window_ms / 1000, self._flush_searches)
         try:
-            # Chroma's similarity_search might be sync, run in thread pool
-            results = await asyncio.to_thread(
-                self._vector_store.similarity_search,
-                query=query,
-                k=k,
-                filter=filter_metadata
-            )
-            logger.debug(f"Similarity search for '{query}' returned {len(results)} results.")
+            results = await future
+            logger.debug("Similarity search returned %d results.", len(results))
             return results
         except Exception as e:
             logger.error(f"Error performing similarity search: {e}", exc_info=True)
             raise
 
+    def _flush_searches(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending_searches = self._pending_searches, []
+        if batch:
+            task = asyncio.ensure_future(self._search_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _search_batch(self, batch: List[tuple[SearchRequest, asyncio.Future]]):
+        requests = [request for request, _ in batch]
+        try:
+            results = await self._run("search", self._vector_store.similarity_search_batch, requests)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        logger.debug("Answered %d similarity searches in one backend call.", len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 # You might want to instantiate this client once and use it across the application
 # For example, using FastAPI's dependency injection or a simple singleton pattern.
 vector_db_client = VectorDBClient()
@@ -0,0 +1,70 @@
+import contextvars
+import logging
+import uuid
+from typing import Optional
+from opentelemetry import trace
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Correlation id of the inbound WebSocket message currently being processed.
+# Set once per message in the router; readable from any coroutine spawned while handling it.
+correlation_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("correlation_id", default=None)
+
+# Module-level tracer. Without setup_tracing() this is the OpenTelemetry no-op tracer,
+# so spans in the hot path cost next to nothing when tracing is disabled.
+tracer = trace.get_tracer("app")
+
+
+def new_correlation_id() -> str:
+    """Generates a correlation id and binds it to the current context."""
+    correlation_id = uuid.uuid4().hex
+    correlation_id_var.set(correlation_id)
+    return correlation_id
+
+
+def get_correlation_id() -> Optional[str]:
+    return correlation_id_var.get()
+
+
+def _build_exporter():
+    if settings.tracing_exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    # One JSON document per span, appended to a local file
+    trace_file = open(settings.tracing_file_path, "a", buffering=1)
+    return ConsoleSpanExporter(out=trace_file, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+
+def setup_tracing(sync_engine=None) -> None:
+    """Installs the SDK tracer provider and instruments SQLAlchemy and Redis if tracing is enabled."""
+    if not settings.tracing_enabled:
+        logger.info("Tracing disabled")
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.tracing_service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_build_exporter()))
+    trace.set_tracer_provider(provider)
+
+    if sync_engine is not None:
+        SQLAlchemyInstrumentor().instrument(engine=sync_engine)
+    RedisInstrumentor().instrument()
+    logger.info(f"Tracing enabled (exporter={settings.tracing_exporter}, sample_ratio={settings.tracing_sample_ratio})")
+
+
+def shutdown_tracing() -> None:
+    """Flushes pending spans on application shutdown."""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
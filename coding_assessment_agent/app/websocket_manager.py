@@ -1,51 +1,321 @@
 from fastapi import WebSocket
-from typing import Dict, List
-import json
+from typing import Deque, Dict, List, Optional
+from collections import deque
+import time
+from opentelemetry import context as otel_context
+from app.config import settings
+from app.logging_config import SampledLogger, summarize_payload
 import logging
 import asyncio
+from app.metrics import ACTIVE_SOCKETS, WS_OUTBOUND_EVENTS, WS_OUTBOUND_QUEUE_LENGTH, WS_REAPED, observe_stage, set_queue_depth, track_stage
+from app.tracing import tracer
+from app.ws_protocol import JsonCodec, negotiate
+from app.services.message_journal import message_journal
 
 logger = logging.getLogger(__name__)
+message_logger = SampledLogger(logger)
+
+QUEUE_NAME = "ws_outbound"
+
+# What happens to a queued, not yet sent message when another one arrives:
+#   replace - a newer message of the same type removes it and joins the back of the queue
+#             (the client only shows the latest, and must see it after anything queued before it)
+#   drop    - first to be discarded when the queue is full; identical queued errors are merged
+#   keep    - always delivered in order; if the queue is full of these, the client is a slow consumer
+MESSAGE_POLICIES = {
+    "ping": "replace",
+    "question": "replace",
+    "report_ready": "replace",
+    "evaluation_result": "keep",
+    "error": "drop",
+}
+
+
+def _message_type(message: dict) -> str:
+    # Error frames are sent without a message_type
+    return message.get("message_type", "error" if "error" in message else "unknown")
+
+
+def compact_replay(messages: List[dict]) -> List[dict]:
+    """Drops replayed frames a later question supersedes (the client only shows the current question
+    and its evaluation); report_ready is always kept."""
+    last_question = max((i for i, m in enumerate(messages) if m.get("message_type") == "question"), default=0)
+    return [m for i, m in enumerate(messages) if i >= last_question or m.get("message_type") == "report_ready"]
+
+
+class _Outbound:
+    __slots__ = ("message", "message_type", "policy", "enqueued_at", "context")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self.message_type = _message_type(message)
+        self.policy = MESSAGE_POLICIES.get(self.message_type, "keep")
+        self.enqueued_at = time.perf_counter()
+        # Trace context of the producer, so the send span nests under the message that caused it
+        self.context = otel_context.get_current()
+
+
+class _Connection:
+    """One client socket with its bounded outbound queue and writer task."""
+
+    def __init__(self, session_id: str, websocket: WebSocket, codec: JsonCodec):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.codec = codec # Wire protocol negotiated at connect time
+        self.queue: Deque[_Outbound] = deque()
+        self.ready = asyncio.Event()
+        self.failures = 0 # Consecutive failed or timed-out sends
+        self.closing = False
+        self.writer: Optional[asyncio.Task] = None
+        self.reader: Optional[asyncio.Task] = None # The router task receiving from this socket
+        self.last_seen = time.monotonic() # Last inbound frame, pongs included
+        self.replaying = False
+        self.held: list[_Outbound] = [] # Live journaled frames that arrived during a replay
+
 
 class WebSocketManager:
+    """Tracks client sockets and delivers outbound messages without blocking producers.
+
+    send_personal_message only enqueues; a writer task per connection drains the
+    queue with a send timeout. WS_SEND_QUEUE_SIZE bounds each queue (see
+    MESSAGE_POLICIES for what is replaced or dropped), and a connection is closed
+    after WS_MAX_SEND_FAILURES consecutive failed sends or when its queue overflows
+    with undeliverable messages.
+
+    A heartbeat task pings every client each WS_HEARTBEAT_INTERVAL_SECONDS and
+    reaps connections with no inbound frame for WS_IDLE_TIMEOUT_SECONDS, so
+    half-open sockets (closed laptops) do not linger.
+
+    Frames the client must not miss are numbered and journaled in Redis first
+    (see message_journal), even while the client is disconnected; replay()
+    resends them after a reconnect.
+    """
+
     def __init__(self):
         # Simple in-memory store. Replace with Redis/other for scalability.
-        self.active_connections: Dict[str, WebSocket] = {}
+        self.active_connections: Dict[str, _Connection] = {}
+        self._queued = 0 # Messages waiting across all connections
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Strong references to close tasks started from sync code (the event loop only keeps weak ones)
+        self._tasks = set()
+
+    def start(self):
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop(), name="websocket-heartbeat")
 
-    async def connect(self, session_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[session_id] = websocket
-        logger.info(f"WebSocket connected for session: {session_id}")
+    async def stop(self):
+        if self._heartbeat is None:
+            return
+        self._heartbeat.cancel()
+        try:
+            await self._heartbeat
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat = None
 
-    def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
+    async def connect(self, session_id: str, websocket: WebSocket) -> JsonCodec:
+        """Accepts the socket with the best wire protocol the client offered and returns its codec."""
+        codec = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=codec.subprotocol)
+        previous = self.active_connections.get(session_id)
+        if previous is not None:
+            # A reconnect replaces the old socket; its queue goes with it
+            self._release(previous)
+        connection = _Connection(session_id, websocket, codec)
+        connection.reader = asyncio.current_task()
+        connection.writer = asyncio.create_task(self._write_loop(connection))
+        self.active_connections[session_id] = connection
+        ACTIVE_SOCKETS.set(len(self.active_connections))
+        logger.info(f"WebSocket connected for session: {session_id} ({codec.name})")
+        return codec
+
+    def disconnect(self, session_id: str, websocket: Optional[WebSocket] = None):
+        """Forgets the session's connection; with websocket given, only if it is still that socket."""
+        connection = self.active_connections.get(session_id)
+        if connection is not None and (websocket is None or connection.websocket is websocket):
+            self._release(connection)
             del self.active_connections[session_id]
+            ACTIVE_SOCKETS.set(len(self.active_connections))
             logger.info(f"WebSocket disconnected for session: {session_id}")
-        else:
+        elif connection is None:
             logger.warning(f"Attempted to disconnect non-existent WebSocket for session: {session_id}")
 
-    async def send_personal_message(self, session_id: str, message: dict):
-        websocket = self.active_connections.get(session_id)
-        if websocket:
+    def touch(self, session_id: str):
+        """Records an inbound frame from the session's client."""
+        connection = self.active_connections.get(session_id)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def _release(self, connection: _Connection):
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        self._queued -= len(connection.queue)
+        connection.queue.clear()
+        set_queue_depth(QUEUE_NAME, self._queued)
+
+    async def send_personal_message(self, session_id: str, message: dict, journal: bool = True) -> dict:
+        """Journals and queues a message for the session's client; returns without waiting for the send.
+
+        Returns the message as queued (with its seq if journaled). Pass journal=False to
+        resend a frame that already has its seq.
+        """
+        if journal:
+            message = await message_journal.append(session_id, message)
+        connection = self.active_connections.get(session_id)
+        if connection is None:
+            if "seq" in message:
+                logger.info("Session %s is offline; %s kept for replay (seq %d)", session_id, message["message_type"], message["seq"])
+            else:
+                logger.warning(f"Attempted to send message to inactive session: {session_id}")
+            return message
+        self._enqueue(connection, _Outbound(message))
+        return message
+
+    async def replay(self, session_id: str, last_seq: int, epoch: Optional[str] = None):
+        """Resends the journaled frames a reconnecting client has not seen (seq > last_seq in its epoch)."""
+        connection = self.active_connections.get(session_id)
+        if connection is None:
+            return
+        connection.replaying = True
+        try:
+            journal = await message_journal.read_after(session_id, last_seq, epoch)
+        finally:
+            connection.replaying = False
+        missed = compact_replay(journal.messages)
+        for message in missed:
+            self._enqueue(connection, _Outbound(message))
+        replayed_up_to = missed[-1]["seq"] if missed else journal.after_seq
+        held, connection.held = connection.held, []
+        for item in held:
+            if item.message["seq"] > replayed_up_to:
+                self._enqueue(connection, item)
+        if missed:
+            logger.info("Replayed %d frames to session %s after seq %d", len(missed), session_id, last_seq)
+
+    def _enqueue(self, connection: _Connection, item: _Outbound):
+        if connection.closing:
+            return
+        queue = connection.queue
+        if connection.replaying and "seq" in item.message:
+            # Held back until the missed frames have been queued, so seq order is preserved
+            connection.held.append(item)
+            return
+        if item.policy == "replace":
+            superseded = next((queued for queued in queue if queued.message_type == item.message_type), None)
+            if superseded is not None:
+                queue.remove(superseded)
+                self._queued -= 1
+                WS_OUTBOUND_EVENTS.labels("replaced").inc()
+        elif item.policy == "drop":
+            if any(queued.message == item.message for queued in queue):
+                WS_OUTBOUND_EVENTS.labels("merged").inc()
+                return
+
+        if len(queue) >= settings.ws_send_queue_size:
+            victim = next((queued for queued in queue if queued.policy == "drop"), None)
+            if victim is not None:
+                queue.remove(victim)
+                self._queued -= 1
+                WS_OUTBOUND_EVENTS.labels("dropped").inc()
+            elif item.policy == "drop":
+                WS_OUTBOUND_EVENTS.labels("dropped").inc()
+                return
+            else:
+                WS_OUTBOUND_EVENTS.labels("overflow").inc()
+                logger.warning(
+                    "Outbound queue full (%d) for session %s; closing slow consumer", len(queue), connection.session_id
+                )
+                if self._begin_close(connection, "slow_consumer"):
+                    task = asyncio.create_task(self._finish_close(connection, "slow_consumer"))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                return
+
+        queue.append(item)
+        self._queued += 1
+        WS_OUTBOUND_QUEUE_LENGTH.observe(len(queue))
+        set_queue_depth(QUEUE_NAME, self._queued)
+        connection.ready.set()
+
+    async def _write_loop(self, connection: _Connection):
+        while True:
+            await connection.ready.wait()
+            if not connection.queue:
+                connection.ready.clear()
+                continue
+            item = connection.queue.popleft()
+            self._queued -= 1
+            set_queue_depth(QUEUE_NAME, self._queued)
+            observe_stage("ws_outbound_wait", time.perf_counter() - item.enqueued_at)
+            started = time.perf_counter()
             try:
-                await websocket.send_json(message)
-                logger.debug(f"Sent message to session {session_id}: {message}")
+                with track_stage("ws_send"), tracer.start_as_current_span("ws.send", context=item.context) as span:
+                    span.set_attribute("message.type", item.message_type)
+                    await asyncio.wait_for(connection.codec.send(connection.websocket, item.message), settings.ws_send_timeout_seconds)
+                connection.failures = 0
+                WS_OUTBOUND_EVENTS.labels("sent").inc()
+                message_logger.debug("Sent message to session %s: %s", connection.session_id, summarize_payload(item.message))
             except Exception as e:
-                logger.error(f"Error sending message to session {session_id}: {e}")
-                # Consider disconnecting if send fails repeatedly
-                # self.disconnect(session_id)
-        else:
-            logger.warning(f"Attempted to send message to inactive session: {session_id}")
+                connection.failures += 1
+                WS_OUTBOUND_EVENTS.labels("timeout" if isinstance(e, asyncio.TimeoutError) else "failed").inc()
+                logger.error(
+                    "Error sending message to session %s (%d consecutive): %r",
+                    connection.session_id, connection.failures, e,
+                )
+                if connection.failures >= settings.ws_max_send_failures:
+                    await self._close(connection, "send_failures")
+                    return
+                continue
+            elapsed = time.perf_counter() - started
+            if elapsed >= settings.ws_slow_send_seconds:
+                WS_OUTBOUND_EVENTS.labels("slow").inc()
+                logger.warning("Slow consumer: send to session %s took %.2fs", connection.session_id, elapsed)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.ws_heartbeat_interval_seconds)
+            now = time.monotonic()
+            idle = []
+            for connection in list(self.active_connections.values()):
+                if now - connection.last_seen >= settings.ws_idle_timeout_seconds:
+                    idle.append(connection)
+                else:
+                    self._enqueue(connection, _Outbound({"message_type": "ping"}))
+            # Concurrently: each close of a half-open socket can take WS_SEND_TIMEOUT_SECONDS
+            await asyncio.gather(*(self._close(connection, "idle_timeout") for connection in idle))
+
+    async def _close(self, connection: _Connection, reason: str):
+        """Drops the connection, closes its socket and ends the router task still receiving from it.
+
+        The router's finally block then releases everything held for the session.
+        """
+        if self._begin_close(connection, reason):
+            await self._finish_close(connection, reason)
+
+    def _begin_close(self, connection: _Connection, reason: str) -> bool:
+        """Marks the connection closing and drops it; False if it was already closing."""
+        if connection.closing:
+            return False
+        connection.closing = True
+        WS_REAPED.labels(reason).inc()
+        logger.warning("Closing WebSocket for session %s: %s", connection.session_id, reason)
+        if self.active_connections.get(connection.session_id) is connection:
+            self.disconnect(connection.session_id, connection.websocket)
+        return True
+
+    async def _finish_close(self, connection: _Connection, reason: str):
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=1011, reason=reason), settings.ws_send_timeout_seconds)
+        except Exception:
+            pass # Already closed or unresponsive
+        # A half-open socket never delivers the close handshake, so don't wait for receive() to notice
+        if connection.reader is not None and not connection.reader.done() and connection.reader is not asyncio.current_task():
+            connection.reader.cancel()
 
     async def broadcast(self, message: dict): # Optional: If broadcasting is needed
-        message_json = json.dumps(message)
-        # Use asyncio.gather for concurrent sends
-        results = await asyncio.gather(
-            *[conn.send_text(message_json) for conn in self.active_connections.values()],
-            return_exceptions=True
-        )
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"Error broadcasting message: {result}")
+        # Goes through each connection's queue, so one slow client cannot delay the others
+        for connection in list(self.active_connections.values()):
+            self._enqueue(connection, _Outbound(message))
 
 # Singleton instance
 manager = WebSocketManager()
@@ -0,0 +1,114 @@
+import json
+from typing import Any, List, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from app.config import settings
+from app.metrics import WS_BYTES
+
+try:
+    import msgpack
+except ImportError: # Optional dependency; without it every client gets JSON
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Subprotocol a client offers in Sec-WebSocket-Protocol to opt into binary frames.
+# Clients that offer nothing (or only unknown protocols) get JSON text frames.
+MSGPACK_SUBPROTOCOL = "codeeval.msgpack.v1"
+
+# First byte of every binary frame
+FRAME_MSGPACK = 0x00
+FRAME_MSGPACK_ZSTD = 0x01
+
+
+class JsonCodec:
+    """Default protocol: one JSON document per text frame (permessage-deflate is left to the server)."""
+
+    name = "json"
+    subprotocol: Optional[str] = None
+
+    def encode(self, message: dict) -> str:
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, frame: str) -> Any:
+        return json.loads(frame)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        frame = self.encode(message)
+        WS_BYTES.labels("out", self.name).inc(len(frame))
+        await websocket.send_text(frame)
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        event = await websocket.receive()
+        if event["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(event.get("code", 1000))
+        if event.get("text") is None:
+            raise ValueError("Binary frame received on a JSON connection")
+        WS_BYTES.labels("in", self.name).inc(len(event["text"]))
+        return self.decode(event["text"])
+
+
+class MsgpackCodec(JsonCodec):
+    """Binary protocol: a one-byte frame type, then MessagePack, zstd-compressed above a size threshold.
+
+    Text frames are still accepted and parsed as JSON, so a client can switch encoders mid-connection.
+    """
+
+    name = "msgpack"
+    subprotocol = MSGPACK_SUBPROTOCOL
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=settings.ws_compression_level) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def encode(self, message: dict) -> bytes:
+        payload = msgpack.packb(message, use_bin_type=True)
+        if self._compressor is not None and len(payload) >= settings.ws_compression_threshold_bytes:
+            return bytes((FRAME_MSGPACK_ZSTD,)) + self._compressor.compress(payload)
+        return bytes((FRAME_MSGPACK,)) + payload
+
+    def decode(self, frame: bytes) -> Any:
+        if not frame:
+            raise ValueError("Empty binary frame")
+        frame_type, payload = frame[0], frame[1:]
+        if frame_type == FRAME_MSGPACK_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("zstd frame received but the 'zstandard' package is not installed")
+            # Streamed with a bounded read: decompress() trusts the size declared in the frame
+            # header and would allocate it up front, so a tiny frame could claim gigabytes
+            with self._decompressor.stream_reader(payload) as reader:
+                payload = reader.read(settings.ws_max_message_bytes + 1)
+        elif frame_type != FRAME_MSGPACK:
+            raise ValueError(f"Unknown binary frame type {frame_type}")
+        if len(payload) > settings.ws_max_message_bytes:
+            raise ValueError("Binary frame exceeds WS_MAX_MESSAGE_BYTES")
+        return msgpack.unpackb(payload, raw=False)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        frame = self.encode(message)
+        WS_BYTES.labels("out", self.name).inc(len(frame))
+        await websocket.send_bytes(frame)
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        event = await websocket.receive()
+        if event["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(event.get("code", 1000))
+        if event.get("bytes") is not None:
+            WS_BYTES.labels("in", self.name).inc(len(event["bytes"]))
+            return self.decode(event["bytes"])
+        WS_BYTES.labels("in", "json").inc(len(event["text"]))
+        return json.loads(event["text"])
+
+
+# Codecs are stateless between frames, so all connections share them
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec() if msgpack is not None else None
+
+
+def negotiate(requested: List[str]) -> JsonCodec:
+    """Picks the codec for a connection from the subprotocols the client offered."""
+    if settings.ws_binary_protocol_enabled and MSGPACK_CODEC is not None and MSGPACK_SUBPROTOCOL in requested:
+        return MSGPACK_CODEC
+    return JSON_CODEC
@@ -0,0 +1,126 @@
+"""Benchmark: throughput of batched vs one-call-per-response evaluation (simulated LLM).
+
+No API calls are made. Each LLM call sleeps for a latency modelled as
+    overhead + prompt_tokens * prefill + output_tokens * decode
+with prompt tokens estimated (chars / 4) from the real evaluation prompts, and at
+most --provider-concurrency calls run at once (the provider's rate limit, also used
+as EVALUATION_MAX_IN_FLIGHT). Responses
+arrive as a Poisson process from sessions spread over a few problems and go through
+BatchEvaluator, once with batching off (window 0) and once with the given window.
+
+All simulated durations are multiplied by --time-scale to keep the run short;
+reported numbers are converted back to unscaled seconds.
+
+Run from coding_assessment_agent/:
+    python -m benchmarks.bench_batch_evaluator --responses 300 --rate 6 --window-ms 150
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import time
+
+from app.config import settings
+from app.prompts import batch_evaluation_prompt, evaluation_prompt
+from app.services.batch_evaluator import BatchEvaluator
+
+CODE_LINE = "  const need = target - nums[i]; if (seen.has(need)) return [seen.get(need), i]; seen.set(nums[i], i);\n"
+
+
+def prompt_tokens(prompt, context: dict) -> int:
+    return sum(len(message.content) for message in prompt.format_messages(**context)) // 4
+
+
+class SimulatedLLM:
+    def __init__(self, args):
+        self.args = args
+        self.semaphore = asyncio.Semaphore(args.provider_concurrency)
+        self.calls = 0
+        self.tokens = 0
+
+    async def invoke(self, chain, context: dict, stage: str) -> str:
+        batch = chain == "batch"
+        tokens_in = prompt_tokens(batch_evaluation_prompt if batch else evaluation_prompt, context)
+        items = context["count"] if batch else 1
+        tokens_out = items * self.args.output_tokens
+        seconds = (self.args.overhead_ms + tokens_in * self.args.prefill_ms_per_token + tokens_out * self.args.decode_ms_per_token) / 1000
+        async with self.semaphore:
+            await asyncio.sleep(seconds * self.args.time_scale)
+        self.calls += 1
+        self.tokens += tokens_in + tokens_out
+        if batch:
+            ids = [int(i) for i in re.findall(r"^### Item (\d+) \[", context["items"], re.M)]
+            return json.dumps([{"id": i, "evaluation_text": "ok", "score": 0.5} for i in ids])
+        return json.dumps({"evaluation_text": "ok", "score": 0.5})
+
+
+def make_context(rng: random.Random, problems: int) -> tuple[int, dict]:
+    session_id = rng.randint(1, 200)
+    return session_id, {
+        "problem_statement": f"Problem {session_id % problems}: return the indices of the two numbers that add up to target. " * 3,
+        "code": "function twoSum(nums, target) {\n" + CODE_LINE * rng.randint(10, 40) + "}\n",
+        "history": "\n".join(f"AI: question {i}?\nUser: answer {i}." for i in range(rng.randint(1, 6))),
+        "relevant_context": "",
+        "question": "What happens when the same number appears twice in the input?",
+        "response": "The map stores the latest index, and since we check before inserting, duplicates still pair correctly.",
+    }
+
+
+async def run(args, window_ms: float) -> dict:
+    settings.evaluation_batch_window_ms = window_ms * args.time_scale
+    settings.evaluation_batch_max_size = args.max_batch
+    settings.evaluation_max_in_flight = args.provider_concurrency
+    llm = SimulatedLLM(args)
+    evaluator = BatchEvaluator(llm.invoke, "single", "batch")
+    rng = random.Random(0)
+    latencies = []
+
+    async def one(session_id: int, context: dict):
+        start = time.perf_counter()
+        await evaluator.evaluate(session_id, context)
+        latencies.append((time.perf_counter() - start) / args.time_scale)
+
+    tasks = []
+    start = time.perf_counter()
+    for _ in range(args.responses):
+        tasks.append(asyncio.create_task(one(*make_context(rng, args.problems))))
+        await asyncio.sleep(rng.expovariate(args.rate) * args.time_scale)
+    await asyncio.gather(*tasks)
+    elapsed = (time.perf_counter() - start) / args.time_scale
+    latencies.sort()
+    return {
+        "window_ms": window_ms,
+        "calls": llm.calls,
+        "tokens": llm.tokens,
+        "throughput": args.responses / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=6.0, help="Responses per second")
+    parser.add_argument("--problems", type=int, default=3)
+    parser.add_argument("--window-ms", type=float, default=150.0)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--provider-concurrency", type=int, default=8)
+    parser.add_argument("--overhead-ms", type=float, default=400.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.15)
+    parser.add_argument("--decode-ms-per-token", type=float, default=12.0)
+    parser.add_argument("--output-tokens", type=int, default=50, help="Output tokens per evaluation")
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{args.responses} responses at {args.rate}/s over {args.problems} problems, provider concurrency {args.provider_concurrency}")
+    print(f"{'window ms':>10}{'LLM calls':>11}{'tokens':>10}{'resp/s':>9}{'p50 s':>8}{'p95 s':>8}")
+    for window_ms in (0.0, args.window_ms):
+        r = asyncio.run(run(args, window_ms))
+        print(f"{r['window_ms']:>10.0f}{r['calls']:>11}{r['tokens']:>10}{r['throughput']:>9.2f}{r['p50_s']:>8.2f}{r['p95_s']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
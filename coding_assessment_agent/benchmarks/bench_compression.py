@@ -0,0 +1,85 @@
+"""Benchmark: storage ratio and encode/decode cost of CompressedText.
+
+Uses real code snapshots from the configured database (--from-db) or source
+files matching a glob (--files), and compares zlib and zstd at a few levels.
+
+Run from coding_assessment_agent/:
+    python -m benchmarks.bench_compression --from-db --limit 2000
+    python -m benchmarks.bench_compression --files "../frontend/src/**/*.jsx"
+"""
+import argparse
+import asyncio
+import glob
+import statistics
+import time
+
+from app.db_types import compress_bytes, decompress_bytes, zstandard
+
+CONFIGS = [("zlib", 1), ("zlib", 6), ("zstd", 1), ("zstd", 3), ("zstd", 9)]
+
+
+async def load_snapshots_from_db(limit: int) -> list[bytes]:
+    from sqlalchemy.future import select
+    from app import models
+    from app.database import AsyncSessionFactory
+    async with AsyncSessionFactory() as db:
+        result = await db.execute(
+            select(models.CodeSnapshot.code_content)
+            .where(models.CodeSnapshot.code_content.is_not(None))
+            .order_by(models.CodeSnapshot.id.desc())
+            .limit(limit)
+        )
+        return [code.encode("utf-8") for code in result.scalars()]
+
+
+def load_files(pattern: str) -> list[bytes]:
+    samples = []
+    for path in glob.glob(pattern, recursive=True):
+        with open(path, "rb") as f:
+            samples.append(f.read())
+    return samples
+
+
+def bench(samples: list[bytes], algorithm: str, level: int) -> dict:
+    encode_times, decode_times = [], []
+    raw_total = stored_total = 0
+    for data in samples:
+        start = time.perf_counter()
+        blob = compress_bytes(data, algorithm, level)
+        encode_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert decompress_bytes(blob) == data
+        decode_times.append(time.perf_counter() - start)
+        raw_total += len(data)
+        stored_total += len(blob)
+    return {
+        "ratio": raw_total / stored_total if stored_total else 0.0,
+        "encode_us": statistics.median(encode_times) * 1e6,
+        "decode_us": statistics.median(decode_times) * 1e6,
+        "encode_mb_s": raw_total / sum(encode_times) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-db", action="store_true", help="Use code snapshots from DATABASE_URL")
+    source.add_argument("--files", help="Glob of source files to use as samples")
+    parser.add_argument("--limit", type=int, default=2000, help="Max snapshots to load from the database")
+    args = parser.parse_args()
+
+    samples = asyncio.run(load_snapshots_from_db(args.limit)) if args.from_db else load_files(args.files)
+    if not samples:
+        raise SystemExit("No samples found.")
+    sizes = sorted(len(s) for s in samples)
+    print(f"{len(samples)} samples, median {sizes[len(sizes) // 2]} bytes, total {sum(sizes) / 1e6:.2f} MB")
+    print(f"{'algorithm':<10}{'level':>6}{'ratio':>8}{'enc us':>10}{'dec us':>10}{'enc MB/s':>10}")
+    for algorithm, level in CONFIGS:
+        if algorithm == "zstd" and zstandard is None:
+            continue
+        r = bench(samples, algorithm, level)
+        print(f"{algorithm:<10}{level:>6}{r['ratio']:>8.2f}{r['encode_us']:>10.1f}{r['decode_us']:>10.1f}{r['encode_mb_s']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark: CPU cost of hot-path logging in trigger_logic.calculate_diff_lines.
+
+Compares the previous implementation (f-string DEBUG logging of every diff line
+and of the raw diff list, root logger forced to DEBUG) against the current one
+(lazy %-formatting, INFO by default). Log output goes to os.devnull so only
+formatting/dispatch cost is measured.
+
+Run from coding_assessment_agent/:
+    python -m benchmarks.bench_logging --lines 2000 --repeat 20
+"""
+import argparse
+import difflib
+import logging
+import os
+import random
+import time
+
+from app.services import trigger_logic
+
+legacy_logger = logging.getLogger("benchmarks.legacy_trigger_logic")
+
+
+def legacy_calculate_diff_lines(old_code: str, new_code: str) -> int:
+    """Verbatim copy of the pre-change implementation."""
+    old_lines = old_code.splitlines()
+    new_lines = new_code.splitlines()
+    legacy_logger.debug(f"Calculating diff. Old lines count: {len(old_lines)}, New lines count: {len(new_lines)}")
+    diff_generator = difflib.unified_diff(old_lines, new_lines, lineterm='')
+    diff = list(diff_generator)
+    legacy_logger.debug(f"Raw diff output (length {len(diff)}): {diff}")
+    change_count = 0
+    for i, line in enumerate(diff):
+        is_add = line.startswith('+')
+        is_remove = line.startswith('-')
+        is_header = line.startswith('+++') or line.startswith('---')
+        is_change = (is_add or is_remove) and not is_header
+        legacy_logger.debug(f"  Diff line {i}: '{line}' | Add: {is_add} | Remove: {is_remove} | Header: {is_header} | Counted: {is_change}")
+        if is_change:
+            change_count += 1
+    legacy_logger.debug(f"Final calculated change_count: {change_count}")
+    return change_count
+
+
+def make_code(n_lines: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return "\n".join(
+        f"    const value{i} = compute(value{i - 1}, {rng.randint(0, 1000)}); // step {i}" for i in range(n_lines)
+    )
+
+
+def mutate(code: str, fraction: float, seed: int) -> str:
+    rng = random.Random(seed)
+    lines = code.splitlines()
+    for idx in rng.sample(range(len(lines)), int(len(lines) * fraction)):
+        lines[idx] = lines[idx] + " // edited"
+    return "\n".join(lines)
+
+
+def cpu_time(fn, old: str, new: str, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(old, new)
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--changed", type=float, default=0.2, help="Fraction of lines edited between snapshots")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    old = make_code(args.lines, seed=1)
+    new = mutate(old, args.changed, seed=2)
+
+    devnull = open(os.devnull, "w")
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+
+    # Before: DEBUG forced globally, as main.py used to do
+    root.setLevel(logging.DEBUG)
+    legacy = cpu_time(legacy_calculate_diff_lines, old, new, args.repeat)
+    # After: default INFO level from settings
+    root.setLevel(logging.INFO)
+    current = cpu_time(trigger_logic.calculate_diff_lines, old, new, args.repeat)
+    # For reference: current code with DEBUG explicitly enabled for the module
+    root.setLevel(logging.DEBUG)
+    current_debug = cpu_time(trigger_logic.calculate_diff_lines, old, new, args.repeat)
+
+    print(f"{args.lines} lines, {args.changed:.0%} changed, {args.repeat} runs (CPU ms per call)")
+    print(f"  legacy, DEBUG      : {legacy * 1000:8.2f}")
+    print(f"  current, INFO      : {current * 1000:8.2f}  ({legacy / current:.1f}x less CPU)")
+    print(f"  current, DEBUG     : {current_debug * 1000:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark: recall and latency of the Chroma and NumPy vector backends.
+
+Builds a synthetic corpus of clustered vectors split across problems (no
+embedding API calls: texts map to precomputed vectors), loads it into both
+backends in temporary directories, and runs problem-filtered top-k queries.
+Recall is measured against exact brute-force cosine search.
+
+Run from coding_assessment_agent/:
+    python -m benchmarks.bench_vector_backends --vectors 20000 --problems 4 --dim 1536
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+
+from app.services.vector_backends import ChromaBackend, NumpyBackend
+
+
+class LookupEmbeddings(Embeddings):
+    """Maps each text to a precomputed vector, so the benchmark measures only the index."""
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def make_corpus(n: int, problems: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(problems * 20, dim)).astype(np.float32)
+    assignments = rng.integers(0, len(centers), size=n)
+    vectors = centers[assignments] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    metadatas = [{"problem_hash": f"p{a % problems}", "session_id": int(i % 500), "kind": "code"} for i, a in enumerate(assignments)]
+    return vectors, metadatas
+
+
+def exact_top_k(unit_vectors: np.ndarray, problem_of_row: np.ndarray, query: np.ndarray, problem: str, k: int) -> set:
+    scores = unit_vectors @ (query / np.linalg.norm(query))
+    scores[problem_of_row != problem] = -np.inf
+    return set(np.argsort(-scores)[:k].tolist())
+
+
+def bench(name: str, backend, texts, metadatas, queries, truths, k: int) -> dict:
+    start = time.perf_counter()
+    for offset in range(0, len(texts), 1000):
+        backend.add_texts(texts[offset:offset + 1000], metadatas[offset:offset + 1000], ids=texts[offset:offset + 1000])
+    load_seconds = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for (query_text, problem), truth in zip(queries, truths):
+        start = time.perf_counter()
+        docs = backend.similarity_search(query_text, k=k, filter={"problem_hash": problem})
+        latencies.append(time.perf_counter() - start)
+        found = {int(doc.page_content.split(":")[1]) for doc in docs}
+        recalls.append(len(found & truth) / k)
+    latencies.sort()
+    return {
+        "name": name,
+        "load_s": load_seconds,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1e3,
+        "recall": statistics.mean(recalls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--problems", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    vectors, metadatas = make_corpus(args.vectors, args.problems, args.dim)
+    texts = [f"doc:{i}" for i in range(args.vectors)]
+    rng = np.random.default_rng(1)
+    lookup = {text: vector.tolist() for text, vector in zip(texts, vectors)}
+    queries = []
+    for i in range(args.queries):
+        source = int(rng.integers(0, args.vectors))
+        query_text = f"query:{i}"
+        lookup[query_text] = (vectors[source] + 0.5 * rng.normal(size=args.dim)).astype(np.float32).tolist()
+        queries.append((query_text, metadatas[source]["problem_hash"]))
+    embeddings = LookupEmbeddings(lookup)
+    unit_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    problem_of_row = np.array([m["problem_hash"] for m in metadatas])
+    truths = [exact_top_k(unit_vectors, problem_of_row, np.asarray(lookup[q]), p, args.k) for q, p in queries]
+
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.problems} problems, {args.queries} queries, k={args.k}")
+    print(f"{'backend':<10}{'load s':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall':>9}")
+    with tempfile.TemporaryDirectory() as chroma_dir, tempfile.TemporaryDirectory() as numpy_dir:
+        chroma_client = chromadb.PersistentClient(path=chroma_dir)
+        chroma = ChromaBackend(Chroma(
+            client=chroma_client, collection_name="bench", embedding_function=embeddings,
+            collection_metadata={"hnsw:space": "cosine"},
+        ), chroma_client.get_collection("bench", embedding_function=None))
+        backends = [("chroma", chroma), ("numpy", NumpyBackend(numpy_dir, embeddings))]
+        for name, backend in backends:
+            r = bench(name, backend, texts, metadatas, queries, truths, args.k)
+            print(f"{r['name']:<10}{r['load_s']:>9.2f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['recall']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
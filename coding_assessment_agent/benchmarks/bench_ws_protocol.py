@@ -0,0 +1,103 @@
+"""Benchmark: bytes on the wire and encode/decode CPU of the WebSocket wire protocols.
+
+Compares, per message:
+  json          - stdlib JSON text frame, uncompressed
+  json+deflate  - the same frame through per-message raw deflate, as permessage-deflate
+                  without context takeover would send it
+  msgpack       - the codeeval.msgpack.v1 binary frame (zstd above WS_COMPRESSION_THRESHOLD_BYTES)
+
+Messages are code_update frames carrying synthetic JavaScript solutions of
+realistic sizes, plus the small server frames (question, evaluation_result).
+
+Run from coding_assessment_agent/:
+    python -m benchmarks.bench_ws_protocol --sizes 500 2000 8000 32000
+"""
+import argparse
+import random
+import time
+import zlib
+
+from app.ws_protocol import JSON_CODEC, MSGPACK_CODEC
+
+FUNCTION_TEMPLATE = """
+// {comment}
+function {name}(nums, target) {{
+  const seen = new Map();
+  for (let i = 0; i < nums.length; i++) {{
+    const need = target - nums[i] * {factor};
+    if (seen.has(need)) {{
+      return [seen.get(need), i];
+    }}
+    seen.set(nums[i], i);
+  }}
+  return {default};
+}}
+"""
+WORDS = ["track", "complement", "index", "window", "left", "right", "memo", "visited", "queue", "result"]
+
+
+def make_code(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    while sum(len(p) for p in parts) < size:
+        parts.append(FUNCTION_TEMPLATE.format(
+            comment=" ".join(rng.choice(WORDS) for _ in range(6)),
+            name="_".join(rng.choice(WORDS) for _ in range(2)) + str(len(parts)),
+            factor=rng.randint(1, 9),
+            default=rng.choice(["[]", "null", "-1", "undefined"]),
+        ))
+    return "".join(parts)[:size]
+
+
+def deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-15) # Raw deflate, fresh context per message
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def time_per_call(fn, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_message(label: str, message: dict, iterations: int):
+    json_frame = JSON_CODEC.encode(message)
+    json_bytes = json_frame.encode("utf-8")
+    deflated = deflate(json_bytes)
+    inflater = lambda data: zlib.decompressobj(wbits=-15).decompress(data)
+    msgpack_frame = MSGPACK_CODEC.encode(message)
+    rows = [
+        ("json", len(json_bytes), time_per_call(JSON_CODEC.encode, message, iterations), time_per_call(JSON_CODEC.decode, json_frame, iterations)),
+        ("json+deflate", len(deflated),
+         time_per_call(lambda m: deflate(JSON_CODEC.encode(m).encode("utf-8")), message, iterations),
+         time_per_call(lambda d: JSON_CODEC.decode(inflater(d).decode("utf-8")), deflated, iterations)),
+        ("msgpack", len(msgpack_frame), time_per_call(MSGPACK_CODEC.encode, message, iterations), time_per_call(MSGPACK_CODEC.decode, msgpack_frame, iterations)),
+    ]
+    for protocol, size, encode_us, decode_us in rows:
+        print(f"{label:<22}{protocol:<14}{size:>9}{encode_us:>12.1f}{decode_us:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000, 32000], help="Code sizes in characters")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    if MSGPACK_CODEC is None:
+        raise SystemExit("msgpack is not installed")
+
+    print(f"{'message':<22}{'protocol':<14}{'bytes':>9}{'encode us':>12}{'decode us':>12}")
+    for size in args.sizes:
+        bench_message(f"code_update {size}", {"message_type": "code_update", "code": make_code(size)}, args.iterations)
+    bench_message("question", {
+        "message_type": "question", "interaction_id": 1234,
+        "question": "Why did you choose a Map over a plain object for the lookups, and what is the complexity?",
+    }, args.iterations)
+    bench_message("evaluation_result", {
+        "message_type": "evaluation_result", "interaction_id": 1234, "score": 7,
+        "evaluation": "Correct reasoning about O(1) average lookups; could mention hash collisions.",
+    }, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import fakeredis
+import pytest
+import pytest_asyncio
+
+# Settings are read when app modules are imported. Tests that need a database
+# create their own SQLite engines, and Redis is replaced by fakeredis, so these
+# only have to be well-formed.
+_tmp_dir = tempfile.mkdtemp(prefix="codeeval-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp_dir}/app.db")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("CHROMA_PERSIST_DIRECTORY", os.path.join(_tmp_dir, "chroma"))
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """An in-memory Redis returned by every module's get_redis()."""
+    from app import database
+    from app.services import idempotency, message_journal, question_pool, response_cache
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def get_redis():
+        return client
+
+    for module in (database, idempotency, message_journal, question_pool, response_cache):
+        monkeypatch.setattr(module, "get_redis", get_redis)
+    return client
+
+
+@pytest_asyncio.fixture
+async def make_database(tmp_path):
+    """Creates migrated SQLite databases; returns (engine, session factory) per call."""
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+
+    engines = []
+
+    async def make(name: str = "test", **engine_options):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db", **engine_options)
+        engines.append(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        return engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    yield make
+    for engine in engines:
+        await engine.dispose()
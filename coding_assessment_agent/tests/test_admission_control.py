@@ -0,0 +1,105 @@
+import datetime
+from contextlib import ExitStack
+
+import pytest
+
+from app.config import settings
+from app.services import admission_control, trigger_logic
+from app.services.admission_control import AdmissionController
+
+CODE = "def f(nums):\n    total = 0\n    for n in nums:\n        total += n\n    return total\n"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission_control, "time", clock)
+    monkeypatch.setattr(settings, "llm_target_in_flight", 4)
+    monkeypatch.setattr(settings, "llm_target_latency_seconds", 5.0)
+    monkeypatch.setattr(settings, "llm_latency_ewma_alpha", 0.5)
+    monkeypatch.setattr(settings, "llm_latency_half_life_seconds", 30.0)
+    monkeypatch.setattr(settings, "llm_max_in_flight", 6)
+    monkeypatch.setattr(settings, "trigger_min_interval_seconds", 60.0)
+    monkeypatch.setattr(settings, "trigger_min_changed_statements", 2)
+    monkeypatch.setattr(settings, "trigger_max_interval_seconds", 300.0)
+    monkeypatch.setattr(settings, "trigger_max_load_scale", 5.0)
+    return clock
+
+
+def _call(controller: AdmissionController, clock: FakeClock, seconds: float):
+    with controller.track_llm():
+        clock.now += seconds
+
+
+def test_load_from_in_flight_calls(clock):
+    controller = AdmissionController()
+    assert controller.load_factor() == 0.0
+    with ExitStack() as calls:
+        for _ in range(6):
+            calls.enter_context(controller.track_llm())
+        assert controller.load_factor() == 1.5
+    assert controller.load_factor() == 0.0
+
+
+def test_load_from_latency_average_and_decay(clock):
+    controller = AdmissionController()
+    _call(controller, clock, 10.0) # First call seeds the average
+    assert controller.load_factor() == pytest.approx(2.0)
+    _call(controller, clock, 0.0) # alpha 0.5
+    assert controller.load_factor() == pytest.approx(1.0)
+    clock.now += 30.0 # One half-life without calls
+    assert controller.load_factor() == pytest.approx(0.5)
+
+
+def test_thresholds_scale_with_load(clock):
+    controller = AdmissionController()
+    base = controller.thresholds(datetime.timedelta(seconds=10))
+    assert (base.min_interval, base.min_statements, base.starved) == (datetime.timedelta(seconds=60), 2, False)
+
+    _call(controller, clock, 12.5) # Load 2.5
+    scaled = controller.thresholds(datetime.timedelta(seconds=10))
+    assert scaled.min_interval == datetime.timedelta(seconds=150)
+    assert scaled.min_statements == 5
+
+    _call(controller, clock, 100.0) # Far past TRIGGER_MAX_LOAD_SCALE and the max interval
+    capped = controller.thresholds(datetime.timedelta(seconds=10))
+    assert capped.min_interval == datetime.timedelta(seconds=300)
+    assert capped.min_statements == 10
+
+
+def test_shedding_at_max_in_flight(clock):
+    controller = AdmissionController()
+    thresholds = controller.thresholds(datetime.timedelta(seconds=10))
+    with ExitStack() as calls:
+        for _ in range(settings.llm_max_in_flight - 1):
+            calls.enter_context(controller.track_llm())
+        assert controller.admit(1, thresholds)
+        calls.enter_context(controller.track_llm())
+        assert not controller.admit(1, thresholds)
+        # A session that waited TRIGGER_MAX_INTERVAL_SECONDS gets base thresholds and is admitted anyway
+        starved = controller.thresholds(datetime.timedelta(seconds=300))
+        assert starved.starved
+        assert (starved.min_interval, starved.min_statements) == (datetime.timedelta(seconds=60), 2)
+        assert controller.admit(1, starved)
+
+
+@pytest.mark.parametrize("started_seconds_ago, fires", [(30, False), (301, True)])
+@pytest.mark.asyncio
+async def test_first_question_starvation_counts_from_session_start(clock, monkeypatch, started_seconds_ago, fires):
+    controller = AdmissionController()
+    monkeypatch.setattr(trigger_logic, "admission_controller", controller)
+    with ExitStack() as calls:
+        for _ in range(settings.llm_max_in_flight):
+            calls.enter_context(controller.track_llm())
+        # Naive, as SQLite returns it
+        started_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(seconds=started_seconds_ago)
+        decision = await trigger_logic.should_trigger_interaction(1, CODE, None, session_started_at=started_at)
+    assert decision.fire is fires
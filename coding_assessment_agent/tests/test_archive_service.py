@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.future import select
+
+from app import models
+from app.services import archive_service, session_service
+
+PROBLEM = "Return the indices of the two numbers in nums that add up to target."
+START = datetime.datetime(2026, 1, 1, 10, 0)
+
+
+@pytest_asyncio.fixture
+async def db(make_database, fake_redis):
+    _, session_factory = await make_database()
+    async with session_factory() as db:
+        yield db
+
+
+async def _session_with_history(db) -> int:
+    """Five code updates a minute apart, and a question between the third and the fourth."""
+    session_id = (await session_service.create_session(db, PROBLEM)).id
+    for minute in range(5):
+        interaction = models.Interaction(
+            session_id=session_id, interaction_type="code_snapshot", timestamp=START + datetime.timedelta(minutes=minute),
+        )
+        # The snapshot row is written a moment after its interaction
+        interaction.code_snapshot = models.CodeSnapshot(
+            code_content=f"def two_sum(nums, target):\n    return {minute}\n",
+            timestamp=START + datetime.timedelta(minutes=minute, seconds=5),
+        )
+        db.add(interaction)
+    db.add(models.Interaction(
+        session_id=session_id, interaction_type="question_asked", timestamp=START + datetime.timedelta(minutes=2, seconds=30),
+        data={"question": "Why return a constant?"},
+    ))
+    await db.commit()
+    return session_id
+
+
+async def _hot_snapshots(db, session_id):
+    result = await db.execute(
+        select(models.CodeSnapshot.id, models.CodeSnapshot.timestamp, models.CodeSnapshot.code_content)
+        .join(models.Interaction, models.Interaction.id == models.CodeSnapshot.interaction_id)
+        .where(models.Interaction.session_id == session_id)
+        .order_by(models.CodeSnapshot.id)
+    )
+    return [tuple(row) for row in result]
+
+
+@pytest.mark.asyncio
+async def test_archive_and_restore_round_trip(db):
+    session_id = await _session_with_history(db)
+    original = await _hot_snapshots(db, session_id)
+    live_replay = await archive_service.get_replay(db, session_id)
+    assert [s.timestamp for s in live_replay.snapshots] == [timestamp for _, timestamp, _ in original]
+
+    archive = await archive_service.archive_session(db, session_id)
+    assert (archive.snapshot_count, archive.pruned_count) == (5, 2)
+    # Kept: the first, the last, and the code the question was asked about
+    kept = await _hot_snapshots(db, session_id)
+    assert kept == [original[0], original[2], original[4]]
+
+    archived_replay = await archive_service.get_replay(db, session_id)
+    assert archived_replay.archived
+    assert archived_replay.snapshots == live_replay.snapshots
+
+    assert await archive_service.restore_session(db, session_id) == 2
+    db.expire_all()
+    assert await _hot_snapshots(db, session_id) == original
+    restored_replay = await archive_service.get_replay(db, session_id)
+    assert not restored_replay.archived
+    assert restored_replay.snapshots == live_replay.snapshots
+
+
+@pytest.mark.asyncio
+async def test_nothing_to_restore(db):
+    session_id = await _session_with_history(db)
+    assert await archive_service.restore_session(db, session_id) == 0
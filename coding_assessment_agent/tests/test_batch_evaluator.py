@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config import settings
+from app.services.batch_evaluator import BatchEvaluator
+
+SINGLE, BATCH = "single-chain", "batch-chain"
+
+
+class FakeInvoker:
+    """Stands in for AgentOrchestrator._invoke_chain.
+
+    Single calls echo the response back; batch calls answer the ids in `answer`
+    (all of them by default). Calls wait for `release` while it is set.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.answer = None
+        self.release = None
+
+    async def __call__(self, chain, context, stage):
+        self.calls.append((chain, context.get("count", 1)))
+        if self.release is not None:
+            await self.release.wait()
+        if chain == SINGLE:
+            return json.dumps({"evaluation_text": context["response"], "score": 1.0})
+        ids = self.answer or range(1, context["count"] + 1)
+        return json.dumps([{"id": item_id, "evaluation_text": f"batch item {item_id}", "score": 0.5} for item_id in ids])
+
+
+@pytest.fixture
+def invoker(monkeypatch):
+    monkeypatch.setattr(settings, "evaluation_batch_window_ms", 20.0)
+    monkeypatch.setattr(settings, "evaluation_batch_max_size", 8)
+    monkeypatch.setattr(settings, "evaluation_max_in_flight", 8)
+    monkeypatch.setattr(settings, "evaluation_batch_across_sessions", False)
+    return FakeInvoker()
+
+
+def _context(response, problem="Two sum"):
+    return {"problem_statement": problem, "code": "pass", "question": "Why?", "response": response}
+
+
+def _text(result: str) -> str:
+    return json.loads(result)["evaluation_text"]
+
+
+@pytest.mark.asyncio
+async def test_window_flush(invoker):
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    results = await asyncio.gather(*(evaluator.evaluate(1, _context(f"answer {i}")) for i in range(3)))
+    assert invoker.calls == [(BATCH, 3)]
+    assert [_text(r) for r in results] == ["batch item 1", "batch item 2", "batch item 3"]
+
+
+@pytest.mark.asyncio
+async def test_single_request_uses_single_chain(invoker):
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    assert _text(await evaluator.evaluate(1, _context("alone"))) == "alone"
+    assert invoker.calls == [(SINGLE, 1)]
+
+
+@pytest.mark.asyncio
+async def test_max_size_flushes_before_the_window(invoker, monkeypatch):
+    monkeypatch.setattr(settings, "evaluation_batch_window_ms", 60_000.0)
+    monkeypatch.setattr(settings, "evaluation_batch_max_size", 3)
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    results = await asyncio.wait_for(
+        asyncio.gather(*(evaluator.evaluate(1, _context(f"answer {i}")) for i in range(3))), timeout=1,
+    )
+    assert invoker.calls == [(BATCH, 3)]
+    assert len(results) == 3
+
+
+@pytest.mark.asyncio
+async def test_batches_grow_while_calls_are_in_flight(invoker, monkeypatch):
+    monkeypatch.setattr(settings, "evaluation_max_in_flight", 1)
+    invoker.release = asyncio.Event()
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    first = asyncio.ensure_future(evaluator.evaluate(1, _context("first")))
+    await asyncio.sleep(0.1) # Window passed; its call holds the only slot
+    assert invoker.calls == [(SINGLE, 1)]
+
+    rest = [asyncio.ensure_future(evaluator.evaluate(1, _context(f"answer {i}"))) for i in range(4)]
+    await asyncio.sleep(0.1) # Due, but waiting for the slot; later requests keep joining
+    assert invoker.calls == [(SINGLE, 1)]
+    invoker.release.set()
+    await asyncio.gather(first, *rest)
+    assert invoker.calls == [(SINGLE, 1), (BATCH, 4)]
+
+
+@pytest.mark.asyncio
+async def test_missing_items_are_evaluated_singly(invoker):
+    invoker.answer = [2]
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    results = await asyncio.gather(*(evaluator.evaluate(1, _context(f"answer {i}")) for i in range(1, 4)))
+    assert [_text(r) for r in results] == ["answer 1", "batch item 2", "answer 3"]
+    assert invoker.calls == [(BATCH, 3), (SINGLE, 1), (SINGLE, 1)]
+
+
+@pytest.mark.asyncio
+async def test_unparseable_batch_output_falls_back(invoker):
+    async def broken(chain, context, stage):
+        if chain == BATCH:
+            return "Sorry, I can't help with that."
+        return await invoker(chain, context, stage)
+
+    evaluator = BatchEvaluator(broken, SINGLE, BATCH)
+    results = await asyncio.gather(*(evaluator.evaluate(1, _context(f"answer {i}")) for i in range(2)))
+    assert [_text(r) for r in results] == ["answer 0", "answer 1"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_is_left_out(invoker):
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    tasks = [asyncio.ensure_future(evaluator.evaluate(1, _context(f"answer {i}"))) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks[1].cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert invoker.calls == [(BATCH, 2)]
+    assert [_text(results[0]), _text(results[2])] == ["batch item 1", "batch item 2"]
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_batched_separately_by_default(invoker, monkeypatch):
+    evaluator = BatchEvaluator(invoker, SINGLE, BATCH)
+    await asyncio.gather(evaluator.evaluate(1, _context("a")), evaluator.evaluate(2, _context("b")))
+    assert invoker.calls == [(SINGLE, 1), (SINGLE, 1)]
+
+    invoker.calls.clear()
+    monkeypatch.setattr(settings, "evaluation_batch_across_sessions", True)
+    await asyncio.gather(evaluator.evaluate(1, _context("a")), evaluator.evaluate(2, _context("b")))
+    assert invoker.calls == [(BATCH, 2)]
+
+
+def test_across_sessions_is_off_by_default():
+    assert type(settings).model_fields["evaluation_batch_across_sessions"].default is False
@@ -0,0 +1,77 @@
+import pytest
+
+from app.services.change_classifier import MODULE_SCOPE, classify_change
+
+JS_BASE = """function twoSum(nums, target) {
+  const seen = new Map();
+  for (let i = 0; i < nums.length; i++) {
+    const need = target - nums[i];
+    if (seen.has(need)) return [seen.get(need), i];
+    seen.set(nums[i], i);
+  }
+  return [];
+}
+"""
+
+PY_BASE = """def two_sum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+    return []
+"""
+
+
+@pytest.mark.parametrize("old, new", [
+    # Prettier-style reformat: spacing, line breaks and added semicolons
+    ("function f(a){return a+1}", "function f(a) {\n  return a + 1;\n}\n"),
+    # Semicolons removed (ASI style)
+    (JS_BASE, JS_BASE.replace(";\n", "\n")),
+    # Two statements on one line split onto two
+    ("let a = 1; let b = 2;", "let a = 1;\nlet b = 2;\n"),
+    # Comments only
+    (JS_BASE, JS_BASE.replace("  return [];", "  // nothing found\n  return []; /* empty */")),
+])
+def test_js_reformat_is_cosmetic(old, new):
+    change = classify_change(old, new, "js")
+    assert change.cosmetic_only
+    assert change.statements_changed == 0
+
+
+@pytest.mark.parametrize("old, new, statements", [
+    ("function f(a){return a+1}", "function f(a) {\n  return a + 2;\n}\n", 1),
+    (JS_BASE, JS_BASE.replace("return [];", "return [-1, -1];"), 1),
+    (JS_BASE, JS_BASE.replace("    seen.set(nums[i], i);\n", "    seen.set(nums[i], i);\n    count++;\n    last = i;\n"), 2),
+])
+def test_js_edit_is_counted(old, new, statements):
+    change = classify_change(old, new, "js")
+    assert not change.cosmetic_only
+    assert change.statements_changed == statements
+
+
+def test_js_for_header_semicolons_are_significant():
+    old = "for (let i = 0; i < n; i++) {}"
+    new = "for (let i = 0, i < n, i++) {}"
+    assert not classify_change(old, new, "js").cosmetic_only
+
+
+def test_js_functions_touched():
+    new = JS_BASE.replace("return [];", "return null;") + "\nconst helper = () => {\n  return 1;\n};\n"
+    change = classify_change(JS_BASE, new, "js")
+    assert change.functions_touched == {"twoSum", "helper", MODULE_SCOPE}
+
+
+def test_python_reformat_is_cosmetic():
+    new = PY_BASE.replace("seen = {}", "seen = {}  # value -> index").replace("[seen[target - n], i]", "[ seen[target-n], i ]")
+    change = classify_change(PY_BASE, new)
+    assert change.language == "python"
+    assert change.cosmetic_only
+
+
+def test_python_reindent_is_a_change():
+    new = PY_BASE.replace("        seen[n] = i\n", "    seen[n] = i\n")
+    change = classify_change(PY_BASE, new)
+    assert not change.cosmetic_only
+    assert change.statements_changed >= 1
+    assert change.functions_touched == {"two_sum"}
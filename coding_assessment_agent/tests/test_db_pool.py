@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app import schemas
+from app.config import settings
+from app.services import agent_orchestrator, event_processor, session_service
+
+POOL_SIZE, MAX_OVERFLOW = 2, 1
+CLIENTS = 200
+PROBLEM = "Return the indices of the two numbers in nums that add up to target."
+
+
+class PoolTracker:
+    """Current and peak connections checked out of an engine's pool."""
+
+    def __init__(self, pool):
+        self.checked_out = 0
+        self.peak = 0
+        event.listen(pool, "checkout", self._checkout)
+        event.listen(pool, "checkin", self._checkin)
+
+    def _checkout(self, *args):
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def _checkin(self, *args):
+        self.checked_out -= 1
+
+
+@pytest.fixture
+def quiet_triggers(monkeypatch):
+    # No LLM calls: nothing triggers or speculates
+    monkeypatch.setattr(settings, "trigger_min_changed_statements", 1_000_000)
+    monkeypatch.setattr(settings, "trigger_min_interval_seconds", 1_000_000.0)
+    monkeypatch.setattr(settings, "trigger_max_interval_seconds", 1_000_000.0)
+    monkeypatch.setattr(settings, "speculative_questions_enabled", False)
+
+
+@pytest.mark.asyncio
+async def test_pool_stays_bounded_with_many_clients(make_database, monkeypatch, fake_redis, quiet_triggers):
+    engine, session_factory = await make_database(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=30)
+    for module in (event_processor, agent_orchestrator):
+        monkeypatch.setattr(module, "AsyncSessionFactory", session_factory)
+    sent = []
+
+    async def send(session_id, message, journal=True):
+        sent.append(message)
+        return message
+
+    monkeypatch.setattr(event_processor.manager, "send_personal_message", send)
+    monkeypatch.setattr(agent_orchestrator.websocket_manager, "send_personal_message", send)
+
+    async with session_factory() as db:
+        session_ids = [(await session_service.create_session(db, PROBLEM)).id for _ in range(CLIENTS)]
+    tracker = PoolTracker(engine.sync_engine.pool)
+
+    async def client(session_id: int):
+        # What one open socket sends: a code update, then a response to an unknown
+        # question (answered with an error frame after its DB lookups)
+        await event_processor.process_websocket_message(
+            str(session_id), "code_update", schemas.CodeUpdatePayload(session_id=session_id, code="def two_sum(nums, target):\n    return []\n"),
+        )
+        await event_processor.process_websocket_message(
+            str(session_id), "response_submitted", schemas.ResponseSubmittedPayload(session_id=session_id, interaction_id=0, response="n/a"),
+        )
+
+    await asyncio.gather(*(client(session_id) for session_id in session_ids))
+    assert len([message for message in sent if "error" in message]) == CLIENTS
+    assert 1 <= tracker.peak <= POOL_SIZE + MAX_OVERFLOW
+    assert tracker.checked_out == 0, "finished clients are holding pooled connections"
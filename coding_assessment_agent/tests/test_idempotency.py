@@ -0,0 +1,94 @@
+import pytest
+
+from app import schemas
+from app.services import event_processor
+from app.services.idempotency import idempotency_store
+
+EVALUATION = {"message_type": "evaluation_result", "interaction_id": 7, "evaluation": "Correct.", "seq": 3}
+
+
+@pytest.mark.asyncio
+async def test_claim_complete_duplicate(fake_redis):
+    assert not (await idempotency_store.claim(1, "response_submitted", "m1")).duplicate
+    # Redelivered while the first is still running
+    assert await idempotency_store.claim(1, "response_submitted", "m1") == (True, None)
+    await idempotency_store.complete(1, "m1", EVALUATION)
+    assert await idempotency_store.claim(1, "response_submitted", "m1") == (True, EVALUATION)
+    # Ids are per session
+    assert not (await idempotency_store.claim(2, "response_submitted", "m1")).duplicate
+
+
+@pytest.mark.asyncio
+async def test_release_lets_a_retry_through(fake_redis):
+    await idempotency_store.claim(1, "response_submitted", "m1")
+    await idempotency_store.release(1, "m1")
+    assert not (await idempotency_store.claim(1, "response_submitted", "m1")).duplicate
+
+
+@pytest.mark.asyncio
+async def test_without_id_nothing_is_claimed(fake_redis):
+    assert not (await idempotency_store.claim(1, "response_submitted", None)).duplicate
+    assert not (await idempotency_store.claim(1, "response_submitted", None)).duplicate
+    assert await fake_redis.dbsize() == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_fails_open(monkeypatch):
+    async def broken_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.services.idempotency.get_redis", broken_redis)
+    assert not (await idempotency_store.claim(1, "response_submitted", "m1")).duplicate
+    assert not (await idempotency_store.claim(1, "response_submitted", "m1")).duplicate
+
+
+@pytest.fixture
+def processor(monkeypatch, fake_redis):
+    """Records dispatched messages and sent frames; dispatch returns `results` in order."""
+    dispatched, sent, results = [], [], []
+
+    async def dispatch(session_id, session_id_str, message_type, payload):
+        dispatched.append(message_type)
+        return results.pop(0)
+
+    async def send(session_id, message, journal=True):
+        sent.append((message, journal))
+
+    monkeypatch.setattr(event_processor, "_dispatch_message", dispatch)
+    monkeypatch.setattr(event_processor.manager, "send_personal_message", send)
+    return dispatched, sent, results
+
+
+def _response(client_message_id):
+    return schemas.ResponseSubmittedPayload(session_id=1, interaction_id=7, response="Use a hash map.", client_message_id=client_message_id)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_response_resends_first_result(processor):
+    dispatched, sent, results = processor
+    results.append(EVALUATION)
+    await event_processor.process_websocket_message("1", "response_submitted", _response("m1"))
+    await event_processor.process_websocket_message("1", "response_submitted", _response("m1"))
+    assert dispatched == ["response_submitted"]
+    # Resent as-is, without journaling it (and taking a new seq) again
+    assert sent == [(EVALUATION, False)]
+
+
+@pytest.mark.asyncio
+async def test_unhandled_response_is_released(processor):
+    dispatched, sent, results = processor
+    results.extend([None, EVALUATION])
+    await event_processor.process_websocket_message("1", "response_submitted", _response("m1"))
+    await event_processor.process_websocket_message("1", "response_submitted", _response("m1"))
+    assert dispatched == ["response_submitted", "response_submitted"]
+
+
+@pytest.mark.asyncio
+async def test_code_updates_are_not_deduplicated(processor, fake_redis):
+    dispatched, sent, results = processor
+    results.extend([{}, {}])
+    for _ in range(2):
+        payload = schemas.CodeUpdatePayload(session_id=1, code="x = 1", client_message_id="c1")
+        await event_processor.process_websocket_message("1", "code_update", payload)
+    assert dispatched == ["code_update", "code_update"]
+    assert await fake_redis.dbsize() == 0
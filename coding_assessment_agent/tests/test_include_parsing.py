@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import sessions
+
+
+@pytest.mark.parametrize("include, expected", [
+    ("", set()),
+    ("interactions", {"interactions"}),
+    (" interactions , report ,", {"interactions", "report"}),
+    ("snapshots", {"snapshots"}),
+    ("snapshot_bodies", {"snapshots", "snapshot_bodies"}),
+    ("interactions,snapshot_bodies", {"interactions", "snapshots", "snapshot_bodies"}),
+])
+def test_parse_include(include, expected):
+    assert sessions._parse_include(include) == expected
+
+
+def test_unknown_part_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        sessions._parse_include("interactions,code")
+    assert error.value.status_code == 422
+    assert "code" in error.value.detail
+
+
+def test_interactions_endpoint_only_accepts_snapshot_parts():
+    assert sessions._parse_include("snapshot_bodies", sessions.INTERACTION_PARTS) == {"snapshots", "snapshot_bodies"}
+    with pytest.raises(HTTPException):
+        sessions._parse_include("report", sessions.INTERACTION_PARTS)
+
+
+class _Recorder:
+    def __init__(self, result):
+        self.result = result
+        self.kwargs = None
+
+    async def __call__(self, *args, **kwargs):
+        self.kwargs = kwargs
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_snapshot_bodies_imply_snapshots_in_both_endpoints(monkeypatch):
+    async def not_cached(*args):
+        return None
+
+    view = _Recorder(sessions.schemas.SessionView(id=1, start_time=datetime.datetime(2026, 1, 1), problem_statement="p"))
+    monkeypatch.setattr(sessions.response_cache, "get_session", not_cached)
+    monkeypatch.setattr(sessions.session_service, "get_session_view", view)
+    await sessions.read_session(1, include="interactions,snapshot_bodies", if_none_match=None, db=None)
+    assert view.kwargs["include_snapshots"] and view.kwargs["include_snapshot_bodies"]
+
+    page = _Recorder([])
+    monkeypatch.setattr(sessions.session_service, "get_problem_statement", _Recorder("p"))
+    monkeypatch.setattr(sessions.interaction_service, "list_interactions", page)
+    await sessions.read_session_interactions(1, cursor=None, limit=10, include="snapshot_bodies", interaction_type=None, db=None)
+    assert page.kwargs["include_snapshots"] and page.kwargs["include_snapshot_bodies"]
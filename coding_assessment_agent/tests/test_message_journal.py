@@ -0,0 +1,68 @@
+import pytest
+
+from app.config import settings
+from app.services.message_journal import message_journal, parse_last_seq
+
+SESSION = "1"
+
+
+def _question(text):
+    return {"message_type": "question", "interaction_id": 1, "question": text}
+
+
+@pytest.fixture(autouse=True)
+def journal_on(monkeypatch):
+    monkeypatch.setattr(settings, "ws_journal_enabled", True)
+
+
+@pytest.mark.asyncio
+async def test_append_numbers_journaled_frames(fake_redis):
+    first = await message_journal.append(SESSION, _question("q1"))
+    second = await message_journal.append(SESSION, {"message_type": "evaluation_result", "evaluation": "ok"})
+    assert (first["seq"], second["seq"]) == (1, 2)
+    assert first["epoch"] == second["epoch"]
+    # Not journaled: returned as-is
+    assert await message_journal.append(SESSION, {"message_type": "ping"}) == {"message_type": "ping"}
+    assert await message_journal.append(SESSION, {"error": "bad"}) == {"error": "bad"}
+    # Numbered per session
+    assert (await message_journal.append("2", _question("other session")))["seq"] == 1
+
+
+@pytest.mark.asyncio
+async def test_resume_after_seq(fake_redis):
+    frames = [await message_journal.append(SESSION, _question(f"q{n}")) for n in range(1, 4)]
+    epoch = frames[0]["epoch"]
+    replay = await message_journal.read_after(SESSION, 1, epoch)
+    assert replay.messages == frames[1:]
+    assert replay.after_seq == 1
+    assert (await message_journal.read_after(SESSION, 3, epoch)).messages == []
+    # Without an epoch (older clients) last_seq is taken as-is
+    assert (await message_journal.read_after(SESSION, 2)).messages == frames[2:]
+
+
+@pytest.mark.asyncio
+async def test_epoch_mismatch_replays_everything(fake_redis):
+    old = [await message_journal.append(SESSION, _question(f"q{n}")) for n in range(1, 6)]
+    await fake_redis.flushall() # Journal lost; numbering restarts under a new epoch
+    new = [await message_journal.append(SESSION, _question(f"r{n}")) for n in range(1, 3)]
+    assert [frame["seq"] for frame in new] == [1, 2]
+    assert new[0]["epoch"] != old[0]["epoch"]
+
+    replay = await message_journal.read_after(SESSION, 5, old[0]["epoch"])
+    assert replay.messages == new
+    assert replay.after_seq == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_replays_nothing(monkeypatch):
+    async def broken_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.services.message_journal.get_redis", broken_redis)
+    assert await message_journal.append(SESSION, _question("q1")) == _question("q1")
+    assert (await message_journal.read_after(SESSION, 0)).messages == []
+
+
+@pytest.mark.parametrize("value, expected", [(None, None), ("", None), ("-1", None), ("abc", None), ("0", 0), ("42", 42)])
+def test_parse_last_seq(value, expected):
+    assert parse_last_seq(value) == expected
@@ -0,0 +1,97 @@
+import pytest
+import pytest_asyncio
+
+from app import database
+from app.config import settings
+from app.services import session_service
+
+PROBLEM = "Return the indices of the two numbers in nums that add up to target."
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest_asyncio.fixture
+async def replicated(make_database, monkeypatch, fake_redis):
+    """Separate primary and replica databases; the replica never receives writes, so it is always stale."""
+    _, primary = await make_database("primary")
+    _, replica = await make_database("replica")
+    clock = FakeClock()
+    monkeypatch.setattr(database, "AsyncSessionFactory", primary)
+    monkeypatch.setattr(database, "ReplicaSessionFactory", replica)
+    monkeypatch.setattr(database, "_pinned_until", {})
+    monkeypatch.setattr(database, "time", clock)
+    monkeypatch.setattr(settings, "replica_pin_seconds", 10)
+    async with primary() as db:
+        session_id = (await session_service.create_session(db, PROBLEM)).id
+    return session_id, primary, replica, clock
+
+
+async def _read_problem(session_id):
+    """Reads through the get_read_db dependency, like GET /sessions/{id}."""
+    dependency = database.get_read_db(session_id)
+    db = await dependency.__anext__()
+    try:
+        return await session_service.get_problem_statement(db, session_id)
+    finally:
+        await dependency.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pinned_session_reads_from_primary(replicated, fake_redis):
+    session_id, primary, _, _ = replicated
+    assert await fake_redis.exists(f"primary_pin:{session_id}")
+    assert await database.get_read_session_factory(session_id) is primary
+    assert await _read_problem(session_id) == PROBLEM
+
+
+@pytest.mark.asyncio
+async def test_unpinned_session_reads_from_replica(replicated, fake_redis):
+    session_id, _, replica, _ = replicated
+    await fake_redis.delete(f"primary_pin:{session_id}") # Pin expired
+    assert await database.get_read_session_factory(session_id) is replica
+    assert await _read_problem(session_id) is None # Not replicated in this test
+    assert await database.get_read_session_factory(session_id + 1) is replica
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_reads_from_primary(replicated, monkeypatch):
+    session_id, primary, _, _ = replicated
+
+    async def broken_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(database, "get_redis", broken_redis)
+    assert await database.get_read_session_factory(session_id) is primary
+    assert await _read_problem(session_id) == PROBLEM
+    await database.pin_to_primary(session_id) # Logged, not raised
+
+
+@pytest.mark.asyncio
+async def test_pin_is_refreshed_at_most_every_half_window(replicated, fake_redis, monkeypatch):
+    session_id, _, _, clock = replicated
+    key = f"primary_pin:{session_id}"
+    sets = []
+    original_set = fake_redis.set
+
+    async def counting_set(*args, **kwargs):
+        sets.append(args[0])
+        return await original_set(*args, **kwargs)
+
+    monkeypatch.setattr(fake_redis, "set", counting_set)
+    # Several writes within the window: the pin set at creation covers them all
+    for _ in range(3):
+        clock.now += 1
+        await database.pin_to_primary(session_id)
+    assert sets == []
+    # Set for 1.5 x REPLICA_PIN_SECONDS, so it outlasts the latest of them by REPLICA_PIN_SECONDS
+    assert await fake_redis.pttl(key) > 14_000
+
+    clock.now += 2.5 # Past half of REPLICA_PIN_SECONDS since the pin was set
+    await database.pin_to_primary(session_id)
+    assert sets == [key]
@@ -0,0 +1,68 @@
+import datetime
+import json
+
+import pytest
+
+from app import schemas
+from app.routers import sessions
+from app.services import response_cache
+
+ENDED = datetime.datetime(2026, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_set_and_get(fake_redis):
+    generation = await response_cache.generation(1)
+    etag = await response_cache.set_session(1, "report", '{"id": 1}', generation)
+    assert await response_cache.get_session(1, "report") == ('{"id": 1}', etag)
+    await response_cache.invalidate_session(1)
+    assert await response_cache.get_session(1, "report") is None
+
+
+@pytest.mark.asyncio
+async def test_rendering_from_before_an_invalidation_is_not_cached(fake_redis):
+    generation = await response_cache.generation(1)
+    await response_cache.invalidate_session(1) # E.g. the report was created meanwhile
+    await response_cache.set_session(1, "report", '{"report": null}', generation)
+    await response_cache.set_report(1, '{"old": true}', generation)
+    assert await response_cache.get_session(1, "report") is None
+    assert await response_cache.get_report(1) is None
+
+    generation = await response_cache.generation(1)
+    await response_cache.set_session(1, "report", '{"report": {}}', generation)
+    assert await response_cache.get_session(1, "report") is not None
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_cached_without_redis(monkeypatch):
+    async def broken_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(response_cache, "get_redis", broken_redis)
+    generation = await response_cache.generation(1)
+    assert generation is None
+    assert (await response_cache.set_session(1, "report", "{}", generation)).startswith('"')
+
+
+@pytest.mark.asyncio
+async def test_read_session_racing_report_creation(fake_redis, monkeypatch):
+    """GET /sessions/{id} reads the ended session just before its report is stored."""
+    reports = []
+
+    async def get_session_view(db, session_id, **include):
+        view = schemas.SessionView(id=session_id, start_time=ENDED, end_time=ENDED, problem_statement="p", report=reports[0] if reports else None)
+        if not reports:
+            # create_report commits and invalidates while this request is still rendering
+            reports.append(schemas.ReportRead(id=1, session_id=session_id, report_content="Good.", scores={}, generation_time=ENDED))
+            await response_cache.invalidate_session(session_id)
+        return view
+
+    monkeypatch.setattr(sessions.session_service, "get_session_view", get_session_view)
+    stale = await sessions.read_session(1, include="report", if_none_match=None, db=None)
+    assert json.loads(stale.body)["report"] is None
+    assert await response_cache.get_session(1, "report") is None
+
+    fresh = await sessions.read_session(1, include="report", if_none_match=None, db=None)
+    assert json.loads(fresh.body)["report"]["report_content"] == "Good."
+    cached_body, _ = await response_cache.get_session(1, "report")
+    assert cached_body == fresh.body.decode()
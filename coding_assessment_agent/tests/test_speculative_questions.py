@@ -0,0 +1,124 @@
+import asyncio
+import datetime
+
+import pytest
+
+from app import models
+from app.config import settings
+from app.services import speculative_questions as speculative_module
+from app.services import trigger_logic
+from app.services.admission_control import AdmissionController
+from app.services.speculative_questions import SpeculativeQuestions
+
+C0 = "def f(nums):\n    total = 0\n    return total\n"
+C1 = C0.replace("    return", "    total += nums[0]\n    return") # 1 statement after C0
+C2 = C1.replace("    return", "    total *= 2\n    total -= 1\n    return") # 2 after C1
+C3 = C2.replace("    return", "    a = 1\n    b = 2\n    c = 3\n    d = 4\n    return") # 4 after C2
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    """A fresh SpeculativeQuestions and idle admission controller, with the feature on."""
+    controller = AdmissionController()
+    monkeypatch.setattr(trigger_logic, "admission_controller", controller)
+    monkeypatch.setattr(speculative_module, "admission_controller", controller)
+    monkeypatch.setattr(settings, "speculative_questions_enabled", True)
+    monkeypatch.setattr(settings, "trigger_min_changed_statements", 2)
+    monkeypatch.setattr(settings, "trigger_min_interval_seconds", 60.0)
+    monkeypatch.setattr(settings, "speculative_max_divergence_statements", 1)
+    return SpeculativeQuestions()
+
+
+class Generator:
+    def __init__(self, question="What is the invariant of total?"):
+        self.question = question
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.question
+
+
+def _last(code: str, seconds_ago: float) -> models.Interaction:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return models.Interaction(
+        id=1, timestamp=now - datetime.timedelta(seconds=seconds_ago), code_snapshot=models.CodeSnapshot(code_content=code),
+    )
+
+
+@pytest.mark.asyncio
+async def test_speculation_is_served_by_the_update_that_fires(speculation):
+    decision = await trigger_logic.should_trigger_interaction(1, C1, _last(C0, 5))
+    assert decision == (False, True)
+    generate = Generator()
+    assert speculation.start(1, C1, generate)
+
+    decision = await trigger_logic.should_trigger_interaction(1, C2, _last(C1, 5))
+    assert decision.fire
+    assert await speculation.take(1, C2) == generate.question
+    assert generate.calls == 1
+    # Consumed
+    assert await speculation.take(1, C2) is None
+
+
+@pytest.mark.asyncio
+async def test_time_based_speculation_is_served(speculation, monkeypatch):
+    monkeypatch.setattr(settings, "trigger_min_changed_statements", 5)
+    decision = await trigger_logic.should_trigger_interaction(1, C1, _last(C0, 50))
+    assert decision == (False, True)
+    generate = Generator()
+    speculation.start(1, C1, generate)
+    await asyncio.sleep(0) # Let it finish before the trigger fires
+
+    decision = await trigger_logic.should_trigger_interaction(1, C2, _last(C1, 61))
+    assert decision.fire
+    assert await speculation.take(1, C2) == generate.question
+
+
+@pytest.mark.asyncio
+async def test_far_below_threshold_does_not_speculate(speculation, monkeypatch):
+    monkeypatch.setattr(settings, "trigger_min_changed_statements", 5)
+    assert await trigger_logic.should_trigger_interaction(1, C1, _last(C0, 5)) == (False, False)
+
+
+@pytest.mark.asyncio
+async def test_diverged_speculation_is_discarded(speculation):
+    speculation.start(1, C1, Generator())
+    # C1 -> C3 is 6 statements, past the threshold (2) plus the allowed divergence (1)
+    assert await speculation.take(1, C3) is None
+    assert speculation._wasted == 1
+
+
+@pytest.mark.asyncio
+async def test_new_interaction_invalidates(speculation):
+    speculation.start(1, C1, Generator())
+    speculation.invalidate(1)
+    assert await speculation.take(1, C1) is None
+
+
+@pytest.mark.asyncio
+async def test_no_speculation_under_load(speculation, monkeypatch):
+    monkeypatch.setattr(speculative_module.admission_controller, "load_factor", lambda: settings.speculative_max_load)
+    generate = Generator()
+    assert not speculation.start(1, C1, generate)
+    assert generate.calls == 0
+
+
+def test_disabled_by_default():
+    assert type(settings).model_fields["speculative_questions_enabled"].default is False
+
+
+@pytest.mark.asyncio
+async def test_speculative_calls_are_not_admission_load(monkeypatch):
+    from app.services import agent_orchestrator as orchestrator_module
+
+    controller = AdmissionController()
+    monkeypatch.setattr(orchestrator_module, "admission_controller", controller)
+
+    class Chain:
+        async def ainvoke(self, context, config=None):
+            return controller._in_flight
+
+    orchestrator = orchestrator_module.agent_orchestrator
+    assert await orchestrator._invoke_chain(Chain(), {}, "llm_question") == 1
+    assert await orchestrator._invoke_chain(Chain(), {}, "llm_question", admission_load=False) == 0
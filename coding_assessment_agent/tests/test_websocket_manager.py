@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.config import settings
+from app import websocket_manager as manager_module
+from app.websocket_manager import WebSocketManager
+
+SESSION = "1"
+
+
+class FakeWebSocket:
+    """Accepts everything; each send blocks until `unblock` is set, so the queue backs up."""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.sent = []
+        self.closes = []
+        self.unblock = asyncio.Event()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame):
+        self.sent.append(json.loads(frame))
+        await self.unblock.wait()
+
+    async def close(self, code=1000, reason=None):
+        self.closes.append(reason)
+
+
+@pytest_asyncio.fixture
+async def connected(monkeypatch):
+    """A manager with one connected session whose first send never completes on its own."""
+    monkeypatch.setattr(settings, "ws_send_queue_size", 3)
+    manager = WebSocketManager()
+    websocket = FakeWebSocket()
+    ready = asyncio.Event()
+
+    async def receive_loop(): # Plays the router task, which a close cancels
+        await manager.connect(SESSION, websocket)
+        ready.set()
+        await asyncio.Event().wait()
+
+    reader = asyncio.create_task(receive_loop())
+    await ready.wait()
+    # Taken by the writer at once; everything after it waits in the queue
+    await _send(manager, {"message_type": "evaluation_result", "evaluation": "first"})
+    await asyncio.sleep(0)
+    yield manager, websocket, reader
+    manager.disconnect(SESSION)
+    reader.cancel()
+
+
+async def _send(manager, message):
+    await manager.send_personal_message(SESSION, message, journal=False)
+
+
+def _queued(manager):
+    return [item.message for item in manager.active_connections[SESSION].queue]
+
+
+def _evaluation(n):
+    return {"message_type": "evaluation_result", "evaluation": n}
+
+
+@pytest.mark.asyncio
+async def test_replace_moves_the_latest_to_the_back(connected):
+    manager, websocket, _ = connected
+    await _send(manager, {"message_type": "question", "question": "q1"})
+    await _send(manager, _evaluation(1))
+    await _send(manager, {"message_type": "question", "question": "q2"})
+    assert _queued(manager) == [_evaluation(1), {"message_type": "question", "question": "q2"}]
+
+    websocket.unblock.set()
+    await asyncio.sleep(0.01)
+    assert [m.get("question", m.get("evaluation")) for m in websocket.sent] == ["first", 1, "q2"]
+    assert manager._queued == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_merges_and_is_discarded_first(connected):
+    manager, websocket, _ = connected
+    error = {"error": "Invalid message format"}
+    await _send(manager, error)
+    await _send(manager, error)
+    assert _queued(manager) == [error]
+
+    await _send(manager, _evaluation(1))
+    await _send(manager, _evaluation(2))
+    await _send(manager, _evaluation(3)) # Full: the error makes room
+    assert _queued(manager) == [_evaluation(1), _evaluation(2), _evaluation(3)]
+    await _send(manager, {"error": "another"}) # Full of keeps: the error itself is dropped
+    assert _queued(manager) == [_evaluation(1), _evaluation(2), _evaluation(3)]
+    assert SESSION in manager.active_connections
+
+
+@pytest.mark.asyncio
+async def test_overflow_closes_the_slow_consumer_once(connected):
+    manager, websocket, reader = connected
+    connection = manager.active_connections[SESSION]
+    for n in range(1, 4):
+        await _send(manager, _evaluation(n))
+    await _send(manager, _evaluation(4))
+    await _send(manager, _evaluation(5))
+    assert connection.closing
+    assert SESSION not in manager.active_connections
+    assert manager._queued == 0
+
+    await asyncio.sleep(0.01)
+    assert websocket.closes == ["slow_consumer"]
+    assert reader.cancelled()
+    assert not manager._tasks
+
+
+@pytest.mark.asyncio
+async def test_live_frame_during_replay_is_not_sent_twice(connected, fake_redis, monkeypatch):
+    manager, websocket, _ = connected
+    journal = manager_module.message_journal
+    q1 = await journal.append(SESSION, {"message_type": "question", "question": "q1"})
+    await journal.append(SESSION, _evaluation(1))
+    read_after = journal.read_after
+
+    async def read_with_live_frame(session_id, last_seq, epoch=None):
+        # A new question is produced while the reconnect is reading the journal
+        await manager.send_personal_message(SESSION, {"message_type": "question", "question": "q2"})
+        return await read_after(session_id, last_seq, epoch)
+
+    monkeypatch.setattr(journal, "read_after", read_with_live_frame)
+    await manager.replay(SESSION, q1["seq"], q1["epoch"])
+    # e1 is superseded by q2, which was replayed from the journal and not again from the held frames
+    assert [(m["seq"], m["question"]) for m in _queued(manager)] == [(3, "q2")]
+
+
+@pytest.mark.asyncio
+async def test_live_frame_after_replay_read_is_queued_in_order(connected, fake_redis, monkeypatch):
+    manager, websocket, _ = connected
+    journal = manager_module.message_journal
+    q1 = await journal.append(SESSION, {"message_type": "question", "question": "q1"})
+    read_after = journal.read_after
+
+    async def read_then_live_frame(session_id, last_seq, epoch=None):
+        replay = await read_after(session_id, last_seq, epoch)
+        await manager.send_personal_message(SESSION, _evaluation(2))
+        return replay
+
+    await journal.append(SESSION, _evaluation(1))
+    monkeypatch.setattr(journal, "read_after", read_then_live_frame)
+    await manager.replay(SESSION, q1["seq"], q1["epoch"])
+    assert [(m["seq"], m["evaluation"]) for m in _queued(manager)] == [(2, 1), (3, 2)]
+
+
+@pytest.mark.asyncio
+async def test_replay_with_stale_epoch_resends_the_journal(connected, fake_redis):
+    manager, websocket, _ = connected
+    journal = manager_module.message_journal
+    await journal.append(SESSION, {"message_type": "question", "question": "q1"})
+    await journal.append(SESSION, _evaluation(1))
+    await manager.replay(SESSION, 7, "stale-epoch")
+    assert [m["seq"] for m in _queued(manager)] == [1, 2]
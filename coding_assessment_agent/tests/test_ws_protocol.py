@@ -0,0 +1,59 @@
+import struct
+
+import pytest
+
+from app.config import settings
+from app.ws_protocol import FRAME_MSGPACK, FRAME_MSGPACK_ZSTD, MSGPACK_CODEC
+
+msgpack = pytest.importorskip("msgpack")
+zstandard = pytest.importorskip("zstandard")
+
+
+def test_round_trip_plain_and_compressed(monkeypatch):
+    monkeypatch.setattr(settings, "ws_compression_threshold_bytes", 64)
+    small = {"message_type": "code_update", "code": "x = 1"}
+    large = {"message_type": "code_update", "code": "x = 1\n" * 100}
+    assert MSGPACK_CODEC.encode(small)[0] == FRAME_MSGPACK
+    assert MSGPACK_CODEC.encode(large)[0] == FRAME_MSGPACK_ZSTD
+    assert MSGPACK_CODEC.decode(MSGPACK_CODEC.encode(small)) == small
+    assert MSGPACK_CODEC.decode(MSGPACK_CODEC.encode(large)) == large
+
+
+def _declare_content_size(frame: bytes, size: int) -> bytes:
+    """Rewrites a zstd frame header to declare `size` decompressed bytes in an 8-byte field."""
+    descriptor = frame[4]
+    single_segment = descriptor >> 5 & 1
+    field_size = {0: single_segment, 1: 2, 2: 4, 3: 8}[descriptor >> 6]
+    header_end = 5 + (0 if single_segment else 1) # Window descriptor; no dictionary ID
+    return frame[:4] + bytes(((descriptor & 0x3F) | 0xC0,)) + frame[5:header_end] + struct.pack("<Q", size) + frame[header_end + field_size:]
+
+
+def test_decompression_bomb_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "ws_max_message_bytes", 1024 * 1024)
+    # A few KB on the wire, 8 MB of data, and a header claiming 32 TB
+    payload = msgpack.packb({"message_type": "code_update", "code": "\0" * (8 * 1024 * 1024)})
+    compressed = _declare_content_size(zstandard.ZstdCompressor().compress(payload), 2**45)
+    assert zstandard.frame_content_size(compressed) == 2**45
+    frame = bytes((FRAME_MSGPACK_ZSTD,)) + compressed
+    assert len(frame) < 64 * 1024
+    with pytest.raises(ValueError, match="WS_MAX_MESSAGE_BYTES"):
+        MSGPACK_CODEC.decode(frame)
+
+
+def test_compressed_frame_without_declared_size(monkeypatch):
+    monkeypatch.setattr(settings, "ws_max_message_bytes", 1024)
+    compressor = zstandard.ZstdCompressor().compressobj()
+    small = msgpack.packb({"code": "y" * 100})
+    frame = bytes((FRAME_MSGPACK_ZSTD,)) + compressor.compress(small) + compressor.flush()
+    assert MSGPACK_CODEC.decode(frame) == {"code": "y" * 100}
+
+    compressor = zstandard.ZstdCompressor().compressobj()
+    frame = bytes((FRAME_MSGPACK_ZSTD,)) + compressor.compress(msgpack.packb({"code": "y" * 4096})) + compressor.flush()
+    with pytest.raises(ValueError, match="WS_MAX_MESSAGE_BYTES"):
+        MSGPACK_CODEC.decode(frame)
+
+
+def test_plain_frame_size_limit(monkeypatch):
+    monkeypatch.setattr(settings, "ws_max_message_bytes", 16)
+    with pytest.raises(ValueError):
+        MSGPACK_CODEC.decode(bytes((FRAME_MSGPACK,)) + msgpack.packb({"code": "z" * 64}))
@@ -18,6 +18,24 @@ function debounce(func, wait) {
   };
 }
 
+// Id for client_message_id. crypto.randomUUID only exists in secure contexts (HTTPS,
+// localhost); on plain HTTP build a v4 UUID from getRandomValues, or timestamp + counter
+let messageIdCounter = 0;
+function newMessageId() {
+  if (typeof crypto !== "undefined" && typeof crypto.randomUUID === "function") {
+    return crypto.randomUUID();
+  }
+  if (typeof crypto !== "undefined" && typeof crypto.getRandomValues === "function") {
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = (bytes[6] & 0x0f) | 0x40; // Version 4
+    bytes[8] = (bytes[8] & 0x3f) | 0x80; // Variant 10
+    const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+  }
+  messageIdCounter += 1;
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${messageIdCounter}`;
+}
+
 const WS_BASE_URL = import.meta.env.VITE_WS_BASE_URL || "ws://localhost:8000"; // Use env var or default
 const RECONNECT_DELAY_BASE = 2000; // Initial reconnect delay (ms)
 const MAX_RECONNECT_ATTEMPTS = 5;
@@ -43,6 +61,17 @@ function CodingSession() {
   const reconnectAttempts = useRef(0);
   const reconnectTimeoutId = useRef(null); // Store reconnect timeout ID
   const codeUpdateQueue = useRef(null); // To store the latest code for debounced sending
+  // Submitted responses awaiting their evaluation, by client_message_id; resent after a reconnect
+  // (the server ignores ids it has already processed)
+  const pendingResponses = useRef(new Map());
+  // Highest journaled frame seq processed; sent on reconnect so the server replays what we missed
+  const lastSeq = useRef(
+    Number(sessionStorage.getItem(`lastSeq:${sessionId}`)) || 0
+  );
+  // Journal epoch lastSeq belongs to; a new epoch means the server restarted its numbering
+  const journalEpoch = useRef(
+    sessionStorage.getItem(`journalEpoch:${sessionId}`) || ""
+  );
 
   // Determine if connected based on status
   const isConnected = connectionStatus === "Connected";
@@ -95,7 +124,9 @@ function CodingSession() {
       ws.current.close();
     }
 
-    const wsUrl = `${WS_BASE_URL}/ws/session/${sessionId}`;
+    const wsUrl = `${WS_BASE_URL}/ws/session/${sessionId}?last_seq=${
+      lastSeq.current
+    }&epoch=${encodeURIComponent(journalEpoch.current)}`;
     console.log(
       `Attempting to connect WebSocket (Attempt: ${
         reconnectAttempts.current + 1
@@ -111,11 +142,30 @@ function CodingSession() {
       setConnectionStatus("Connected");
       setError(null);
       reconnectAttempts.current = 0; // Reset attempts on successful connection
+      pendingResponses.current.forEach((frame) => {
+        ws.current.send(JSON.stringify(frame));
+      });
     };
 
     ws.current.onmessage = (event) => {
       try {
         const message = JSON.parse(event.data);
+        if (message.message_type === "ping") {
+          // Server heartbeat: reply so the connection isn't reaped as idle
+          ws.current.send(JSON.stringify({ message_type: "pong" }));
+          return;
+        }
+        if (typeof message.seq === "number") {
+          if (message.epoch && message.epoch !== journalEpoch.current) {
+            // Numbering restarted (journal expired or Redis flushed): earlier seqs no longer apply
+            journalEpoch.current = message.epoch;
+            sessionStorage.setItem(`journalEpoch:${sessionId}`, message.epoch);
+            lastSeq.current = 0;
+          }
+          if (message.seq <= lastSeq.current) return; // Already seen (replay overlap)
+          lastSeq.current = message.seq;
+          sessionStorage.setItem(`lastSeq:${sessionId}`, String(message.seq));
+        }
         console.log("Message from server ", message);
         if (message.message_type === "question") {
           // set interaction_id
@@ -127,6 +177,11 @@ function CodingSession() {
           // Switch to "feedback" tab when a question comes in
           setActiveTab("feedback");
         } else if (message.message_type === "evaluation_result") {
+          pendingResponses.current.forEach((frame, id) => {
+            if (frame.interaction_id === message.interaction_id) {
+              pendingResponses.current.delete(id);
+            }
+          });
           // Handle the new evaluation result message
           setLastEvaluation(
             message.evaluation || "No evaluation text provided."
@@ -238,13 +293,14 @@ function CodingSession() {
     setError(null); // Clear previous errors
     if (ws.current && ws.current.readyState === WebSocket.OPEN) {
       console.log("Sending response submission...");
-      ws.current.send(
-        JSON.stringify({
-          message_type: "response_submitted",
-          interaction_id: interactionId,
-          response: response,
-        })
-      );
+      const frame = {
+        message_type: "response_submitted",
+        interaction_id: interactionId,
+        response: response,
+        client_message_id: newMessageId(),
+      };
+      pendingResponses.current.set(frame.client_message_id, frame);
+      ws.current.send(JSON.stringify(frame));
       setResponse(""); // Clear response input
       setQuestion(""); // Clear question immediately on submission
       // Note: Evaluation feedback will arrive separately via WebSocket